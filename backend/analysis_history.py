@@ -0,0 +1,136 @@
+"""
+Append-only NDJSON log of analysis results, one line per analyzed image
+
+Lines are written in timestamp order, so a time-range read binary-searches
+the file by byte offset and then streams forward, holding one line at a
+time regardless of how large the log grows. Several server workers can
+share one log: each append holds an exclusive flock on the file and stamps
+its record no earlier than the last line already written.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Columns of analysis exports, with their Parquet kinds (see export.py)
+EXPORT_FIELDS = (
+    ('timestamp_ms', 'int'),
+    ('endpoint', 'str'),
+    ('outcome', 'str'),
+    ('prediction', 'str'),
+    ('is_healthy', 'bool'),
+    ('confidence', 'float'),
+    ('raw_prediction', 'float'),
+    ('model_version', 'str'),
+    ('image_sha256', 'str'),
+)
+
+# Below this many bytes the binary search stops and the rest is scanned line by line
+SEARCH_WINDOW_BYTES = 64 * 1024
+# Bytes read back from the end of the log to find the newest timestamp written by another process
+TAIL_BYTES = 64 * 1024
+
+
+def _line_timestamp(line):
+    try:
+        return json.loads(line)['timestamp_ms']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class AnalysisHistory:
+    """Durable record of every /analyze and /analyze/batch result, readable by time range"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._last_ms = 0
+        # File size after this process's last append; any other size means another process wrote since
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _read_tail(self):
+        """(timestamp_ms of the newest complete line, whether the file ends mid-line) from the end of the log"""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(max(0, size - TAIL_BYTES))
+            tail = f.read()
+        lines = tail.split(b'\n')
+        for line in reversed(lines[:-1]):
+            timestamp = _line_timestamp(line)
+            if timestamp is not None:
+                return timestamp, tail[-1:] not in (b'', b'\n')
+        return 0, tail[-1:] not in (b'', b'\n')
+
+    def append(self, record):
+        """Write one record, stamped with a timestamp_ms that never goes backwards, even across processes"""
+        with self._lock:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                prefix = ''
+                if os.fstat(self._file.fileno()).st_size != self._size:
+                    last_ms, cut_off = self._read_tail()
+                    self._last_ms = max(self._last_ms, last_ms)
+                    # Finish a line left by a crashed writer so it is skipped on read instead of merged with ours
+                    prefix = '\n' if cut_off else ''
+                self._last_ms = max(int(time.time() * 1000), self._last_ms)
+                line = json.dumps({'timestamp_ms': self._last_ms, **record}, separators=(',', ':'))
+                self._file.write(prefix + line + '\n')
+                self._file.flush()
+                self._size = os.fstat(self._file.fileno()).st_size
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _seek(self, f, start_ms):
+        """Position ``f`` at a line boundary at or before the first record with timestamp_ms >= start_ms"""
+        lo, hi = 0, os.fstat(f.fileno()).st_size
+        while hi - lo > SEARCH_WINDOW_BYTES:
+            mid = (lo + hi) // 2
+            f.seek(mid)
+            f.readline()  # skip the partial line
+            timestamp = _line_timestamp(f.readline())
+            if timestamp is not None and timestamp < start_ms:
+                lo = mid
+            else:
+                hi = mid
+        f.seek(lo)
+        if lo:
+            f.readline()
+
+    def iter_records(self, start_ms, end_ms):
+        """Yield records with start_ms <= timestamp_ms <= end_ms, oldest first"""
+        with open(self.path, 'rb') as f:
+            self._seek(f, start_ms)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # being written right now
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.error(f"Skipping unreadable line in {self.path}")
+                    continue
+                timestamp = record.get('timestamp_ms', 0)
+                if timestamp > end_ms:
+                    break
+                if timestamp >= start_ms:
+                    yield record
+
+    def iter_batches(self, start_ms, end_ms, batch_rows=4096):
+        """Columnar export batches of the records in the range"""
+        names = [name for name, _ in EXPORT_FIELDS]
+        batch = {name: [] for name in names}
+        for record in self.iter_records(start_ms, end_ms):
+            for name in names:
+                batch[name].append(record.get(name))
+            if len(batch['timestamp_ms']) >= batch_rows:
+                yield batch
+                batch = {name: [] for name in names}
+        if batch['timestamp_ms']:
+            yield batch
@@ -1,145 +1,623 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import io
-from PIL import Image
 import base64
 import logging
+import struct
+import hashlib
+import hmac
+import json
+import threading
+import time
+from batching import InferenceBatcher
+from imaging import (
+    DecodedImage, MODEL_INPUT_SIZE, PIXEL_TENSOR_BYTES, PixelTensorError, compute_image_stats, decode_image,
+    open_image_header, sniff_image_format, wrap_pixel_tensor
+)
+from result_cache import ResultCache
+from model_watch import ModelFileWatcher
+from analysis_history import EXPORT_FIELDS as ANALYSIS_EXPORT_FIELDS, AnalysisHistory
+from export import CONTENT_TYPES, ExportFormatError, check_format, encode, gzip_chunks
+from sensor_alerts import DEFAULT_ALERT_RULES, AlertEngine
+from sensor_history import HistoryLockedError, SensorHistory
+from sensors import (
+    EXPORT_FIELDS as SENSOR_EXPORT_FIELDS, DEFAULT_DEVICE_ID, SensorRecordError, SensorStore,
+    export_batch, metric_column, parse_ndjson, parse_timestamp_ms, records_from_columns
+)
+from sensor_stream import DROPPED_FRAME, KEEPALIVE_FRAME, SensorEventHub
+from request_logging import RequestLogger, configure_logging, current_request_log
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: one summary line per request, sampled; optionally written by a background thread
+LOG_BACKGROUND = os.environ.get('LOG_BACKGROUND', '0') == '1'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+
+log_handler = configure_logging(logging.INFO, background=LOG_BACKGROUND, queue_size=LOG_QUEUE_SIZE)
 logger = logging.getLogger(__name__)
+request_logs = RequestLogger(logger, sample_rate=LOG_SAMPLE_RATE)
 
 # Load the model
 MODEL_PATH = "../plant_health_classifier.h5"
 model = None
+# Content hash of the loaded model files; also the result cache namespace
+model_version = None
+
+# Inference engine: 'keras' (TensorFlow) or 'numpy' (pure NumPy, no TensorFlow needed)
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'keras')
+# Weights for the NumPy engine: TF.js model.json from manual_tfjs_conversion.py or an equivalent .npz
+NUMPY_MODEL_PATH = os.environ.get('NUMPY_MODEL_PATH', '../public/models/plant_health_classifier/model.json')
+
+# Keras forward pass: 'predict' (model.predict) or 'compiled' (tf.function/XLA per batch-size bucket)
+KERAS_INFERENCE = os.environ.get('KERAS_INFERENCE', 'predict')
+
+# Micro-batching of concurrent /analyze requests into a single forward pass
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '16'))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', '10'))
+
+# Batch sizes traced by the compiled Keras path; batches are zero-padded up to the nearest one
+COMPILED_BATCH_BUCKETS = [
+    int(size) for size in os.environ.get('COMPILED_BATCH_BUCKETS', '').split(',') if size.strip()
+] or [size for size in (1, 2, 4, 8, 16, 32, 64) if size < BATCH_MAX_SIZE] + [BATCH_MAX_SIZE]
+
+# Maximum number of images accepted by a single /analyze/batch request
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', '64'))
+
+# Batch sizes run through the model during warm-up (default: every size the batcher can produce)
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.environ.get('WARMUP_BATCH_SIZES', '').split(',') if size.strip()
+] or list(range(1, BATCH_MAX_SIZE + 1))
+
+# Readiness of this process: loading -> warming_up -> ready (or failed)
+readiness = {'state': 'loading', 'model_load_seconds': None, 'warmup_seconds': None}
+_initialization_lock = threading.Lock()
+_initialization_pid = None
+
+# Upload limits; everything here is checked before any pixels are decoded
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+# Decompression-bomb guard: larger images are rejected from their header
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(50 * 1000 * 1000)))
+# Formats the upload UI accepts (MPO is the multi-picture JPEG some phone cameras write)
+ALLOWED_IMAGE_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP')
+# Request bodies are refused with 413 as soon as they grow past these sizes (base64 of 8MB is ~10.7MB)
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', str(12 * 1024 * 1024)))
+BATCH_MAX_REQUEST_BYTES = int(os.environ.get('BATCH_MAX_REQUEST_BYTES', str(64 * 1024 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_REQUEST_BYTES, BATCH_MAX_REQUEST_BYTES)
+# /analyze/tensor bodies: one pre-resized image plus room for a .npy header
+TENSOR_MAX_REQUEST_BYTES = PIXEL_TENSOR_BYTES + 4096
+
+REQUEST_TOO_LARGE_RESPONSE = {
+    'error': 'Request too large',
+    'message': 'Please upload an image smaller than 8MB.'
+}
+TENSOR_TOO_LARGE_RESPONSE = {
+    'error': 'Request too large',
+    'message': f'Send one 224x224x3 uint8 image ({PIXEL_TENSOR_BYTES} bytes raw, or as a .npy file).'
+}
+
+# Hot reload: POST /admin/reload-model (enabled when ADMIN_TOKEN is set) and/or polling the model file
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get('MODEL_WATCH_INTERVAL_SECONDS', '0'))
+reload_status = {'state': 'idle', 'reloads': 0, 'last_error': None, 'last_reload_seconds': None}
+_reload_lock = threading.Lock()
+
+# Sensor telemetry from the hydroponic controllers, kept in per-device ring buffers
+SENSOR_BUFFER_CAPACITY = int(os.environ.get('SENSOR_BUFFER_CAPACITY', '17280'))  # 24h at one reading per 5s
+SENSOR_MAX_DEVICES = int(os.environ.get('SENSOR_MAX_DEVICES', '1000'))
+SENSOR_MAX_INGEST_BYTES = int(os.environ.get('SENSOR_MAX_INGEST_BYTES', str(4 * 1024 * 1024)))
+# When set, POST /data/ingest requires this token (Authorization: Bearer or X-Admin-Token)
+SENSOR_INGEST_TOKEN = os.environ.get('SENSOR_INGEST_TOKEN', '')
+
+# Rollup buckets kept per device at each resolution
+SENSOR_ROLLUP_CAPACITIES = {
+    '1m': int(os.environ.get('SENSOR_ROLLUP_MINUTES', '2880')),  # 2 days
+    '1h': int(os.environ.get('SENSOR_ROLLUP_HOURS', '2160')),  # 90 days
+    '1d': int(os.environ.get('SENSOR_ROLLUP_DAYS', '1095')),  # 3 years
+}
+# Point budget of GET /data/range
+SENSOR_RANGE_DEFAULT_POINTS = 300
+SENSOR_RANGE_MAX_POINTS = int(os.environ.get('SENSOR_RANGE_MAX_POINTS', '5000'))
+
+# When set, every reading is also appended to memory-mapped column files here and replayed on boot
+SENSOR_HISTORY_DIR = os.environ.get('SENSOR_HISTORY_DIR', '')
+# Days of history folded back into the rollups on boot; older ranges are scanned from disk
+SENSOR_HISTORY_REPLAY_DAYS = float(os.environ.get('SENSOR_HISTORY_REPLAY_DAYS', '90'))
+
+sensor_store = SensorStore(capacity_per_device=SENSOR_BUFFER_CAPACITY, max_devices=SENSOR_MAX_DEVICES,
+                           rollup_capacities=SENSOR_ROLLUP_CAPACITIES,
+                           history=SensorHistory(SENSOR_HISTORY_DIR) if SENSOR_HISTORY_DIR else None)
+if sensor_store.history is not None:
+    _restore_started = time.perf_counter()
+    _restored = sensor_store.restore(int(SENSOR_HISTORY_REPLAY_DAYS * 24 * 60 * 60 * 1000))
+    logger.info(f"Restored sensor history of {_restored} devices from {SENSOR_HISTORY_DIR} "
+                f"in {time.perf_counter() - _restore_started:.2f}s")
+
+# Alert rules checked on every ingested reading: a JSON list of
+# {"name", "metric", "type": above|below|zscore|swing, "value"[, "min_std"]}
+ALERT_RULES = json.loads(os.environ['ALERT_RULES']) if os.environ.get('ALERT_RULES') else DEFAULT_ALERT_RULES
+# Sliding window of "swing" rules (max - min of a metric)
+ALERT_WINDOW_SECONDS = float(os.environ.get('ALERT_WINDOW_SECONDS', '600'))
+# Smoothing of the baseline that "zscore" rules compare each reading with
+ALERT_EWMA_ALPHA = float(os.environ.get('ALERT_EWMA_ALPHA', '0.05'))
+# Readings of a metric needed before its "zscore" rules are checked
+ALERT_MIN_SAMPLES = int(os.environ.get('ALERT_MIN_SAMPLES', '30'))
+
+alert_engine = AlertEngine(rules=ALERT_RULES, window_seconds=ALERT_WINDOW_SECONDS,
+                           ewma_alpha=ALERT_EWMA_ALPHA, min_samples=ALERT_MIN_SAMPLES)
+
+# Server-sent events for GET /data/stream
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', '1000'))
+# Frames a client may fall behind before it is dropped (it then reconnects with Last-Event-ID)
+SSE_CLIENT_QUEUE = int(os.environ.get('SSE_CLIENT_QUEUE', '256'))
+# Recent readings kept for Last-Event-ID resume, across all devices
+SSE_REPLAY_EVENTS = int(os.environ.get('SSE_REPLAY_EVENTS', '5000'))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+SSE_RETRY_MS = 3000
+
+sensor_events = SensorEventHub(replay_size=SSE_REPLAY_EVENTS, max_queue=SSE_CLIENT_QUEUE, max_subscribers=SSE_MAX_CLIENTS)
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# When set, every analyzed image's result is appended to this NDJSON file (GET /export/analyses)
+ANALYSIS_HISTORY_PATH = os.environ.get('ANALYSIS_HISTORY_PATH', '')
+analysis_history = AnalysisHistory(ANALYSIS_HISTORY_PATH) if ANALYSIS_HISTORY_PATH else None
+
+# Exports streaming at once; each holds a server thread while it runs
+EXPORT_MAX_CONCURRENT = int(os.environ.get('EXPORT_MAX_CONCURRENT', '2'))
+export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+# Cache of analysis results keyed by a hash of the uploaded image bytes
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '1024'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', '600'))
+
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+    size_fn=lambda outcome: len(json.dumps(outcome[0]))
+)
+
+# Messages returned by validate_plant_image, keyed by the reason label used in /metrics
+REJECTION_MESSAGES = {
+    'resolution_too_low': "Image resolution too low. Please upload a higher quality image (minimum 100x100 pixels).",
+    'file_too_large': "Image file too large. Please upload an image smaller than 8MB.",
+    'unsupported_format': "Unsupported image format. Please upload a JPEG, PNG or WebP image.",
+    'too_many_pixels': f"Image resolution too high. Please upload an image under {MAX_IMAGE_PIXELS // 1000000} megapixels.",
+    'too_dark': "Image is too dark. Please ensure good lighting when taking the photo.",
+    'overexposed': "Image is overexposed. Please reduce lighting or adjust camera settings.",
+    'no_plant_content': "No significant plant content detected. Please upload a clear image of a plant leaf.",
+    'lacks_detail': "Image appears to lack detail. Please upload a clear, detailed image of a plant leaf.",
+    'skin_detected': "Hands or skin detected in image. Please upload an image showing only the plant leaf.",
+    'extreme_aspect_ratio': "Image aspect ratio is too extreme. Please upload a more square-shaped image of the leaf.",
+    'undecodable': "Error processing image. Please try uploading a different image."
+}
+REJECTION_REASONS = {message: reason for reason, message in REJECTION_MESSAGES.items()}
+
+# Prometheus metrics served by GET /metrics
+metrics_registry = metrics.Registry()
+STAGE_SECONDS = metrics_registry.histogram(
+    'plant_analysis_stage_seconds', 'Latency of each /analyze pipeline stage', labelnames=('stage',))
+REQUEST_SECONDS = metrics_registry.histogram(
+    'plant_request_seconds', 'End-to-end latency of analysis endpoints', labelnames=('endpoint',))
+MODEL_BATCH_SECONDS = metrics_registry.histogram(
+    'plant_model_forward_seconds', 'Latency of one batched model forward pass')
+MODEL_BATCH_SIZE = metrics_registry.histogram(
+    'plant_model_batch_size', 'Number of images per model forward pass', buckets=(1, 2, 4, 8, 16, 32, 64))
+ANALYSIS_OUTCOMES = metrics_registry.counter(
+    'plant_analysis_outcomes_total', 'Analyzed images by outcome (accepted, rejected_<reason>, failures)',
+    labelnames=('outcome',))
+REQUEST_BYTES = metrics_registry.histogram(
+    'plant_request_body_bytes', 'Size of /analyze request bodies',
+    buckets=(64 * 1024, 256 * 1024, 1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024, 16 * 1024 * 1024))
+IMAGE_MEGAPIXELS = metrics_registry.histogram(
+    'plant_image_megapixels', 'Resolution of uploaded images in megapixels', buckets=(0.1, 0.3, 1, 2, 5, 8, 12, 20, 50))
+MODEL_LOAD_SECONDS = metrics_registry.gauge('plant_model_load_seconds', 'Time taken to load the model')
+MODEL_WARMUP_SECONDS = metrics_registry.gauge('plant_model_warmup_seconds', 'Time taken to warm up the model')
+MODEL_RELOADS = metrics_registry.counter(
+    'plant_model_reloads_total', 'Model hot reloads by result (success, failed, unchanged)', labelnames=('result',))
+MODEL_READY = metrics_registry.gauge('plant_model_ready', '1 once the model is loaded and warmed up')
+QUEUE_DEPTH = metrics_registry.gauge('plant_inference_queue_depth', 'Images waiting for a batched forward pass')
+CACHE_EVENTS = metrics_registry.counter(
+    'plant_result_cache_events_total', 'Result cache events since start', labelnames=('event',))
+CACHE_ENTRIES = metrics_registry.gauge('plant_result_cache_entries', 'Results currently cached')
+SENSOR_ALERTS = metrics_registry.counter('plant_sensor_alerts_total', 'Sensor alerts fired, by rule', labelnames=('rule',))
+SENSOR_ALERTS_ACTIVE = metrics_registry.gauge('plant_sensor_alerts_active', 'Sensor alert rules currently violating')
+SSE_SUBSCRIBERS = metrics_registry.gauge('plant_sse_subscribers', 'Open /data/stream connections')
+SSE_DROPPED = metrics_registry.counter('plant_sse_dropped_consumers_total', 'Stream clients dropped for falling behind')
+LOG_RECORDS_DROPPED = metrics_registry.counter(
+    'plant_log_records_dropped_total', 'Log records discarded because the background log queue was full')
+
+def collect_runtime_metrics():
+    MODEL_LOAD_SECONDS.set(readiness['model_load_seconds'] or 0)
+    MODEL_WARMUP_SECONDS.set(readiness['warmup_seconds'] or 0)
+    MODEL_READY.set(1 if readiness['state'] == 'ready' else 0)
+    QUEUE_DEPTH.set(inference_batcher.stats()['queue_depth'])
+    cache_stats = result_cache.stats()
+    for event in ('hits', 'misses', 'coalesced', 'evictions', 'expirations', 'invalidations'):
+        CACHE_EVENTS.labels(event).set_total(cache_stats[event])
+    CACHE_ENTRIES.set(cache_stats['entries'])
+    LOG_RECORDS_DROPPED.set_total(log_handler.dropped if log_handler is not None else 0)
+    SENSOR_ALERTS_ACTIVE.set(len(alert_engine.active_alerts()))
+    stream_stats = sensor_events.stats()
+    SSE_SUBSCRIBERS.set(stream_stats['subscribers'])
+    SSE_DROPPED.set_total(stream_stats['dropped_total'])
+
+metrics_registry.add_collector(collect_runtime_metrics)
+
+def observe_stage(stage, started):
+    """Record the time since ``started`` for a pipeline stage in /metrics and the request log"""
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.labels(stage).observe(elapsed)
+    current_request_log().note(**{f"{stage}_ms": round(elapsed * 1000, 2)})
+
+def record_outcome(result, status_code):
+    """Count one analyzed image by outcome: accepted, rejected_<reason> or a failure kind"""
+    if status_code == 200:
+        outcome = 'accepted'
+    elif result.get('inappropriate_image'):
+        outcome = 'rejected_' + REJECTION_REASONS.get(result.get('message'), 'other')
+    elif result.get('error') == 'Model prediction failed':
+        outcome = 'prediction_failed'
+    elif result.get('error') == 'Error processing image for analysis':
+        outcome = 'preprocess_failed'
+    else:
+        outcome = 'error'
+    ANALYSIS_OUTCOMES.labels(outcome).inc()
+    return outcome
+
+def record_analysis(endpoint, image_key, result, outcome):
+    """Append one analyzed image to the analysis history, if it is enabled"""
+    if analysis_history is None:
+        return
+    try:
+        analysis_history.append({
+            'endpoint': endpoint,
+            'outcome': outcome,
+            'prediction': result.get('prediction'),
+            'is_healthy': result.get('is_healthy'),
+            'confidence': result.get('confidence'),
+            'raw_prediction': result.get('model_info', {}).get('raw_prediction_value'),
+            'model_version': model_version,
+            'image_sha256': image_key,
+        })
+    except OSError as e:
+        logger.error(f"Could not write analysis history: {str(e)}")
+
+def active_model_path():
+    """Path of the file the selected inference engine loads its weights from"""
+    return NUMPY_MODEL_PATH if MODEL_BACKEND == 'numpy' else MODEL_PATH
+
+def compute_model_version(model_path):
+    """Short SHA-256 over the model file and, for a TF.js model.json, the weight files it lists"""
+    paths = [model_path]
+    if model_path.endswith('.json'):
+        with open(model_path, 'r') as f:
+            manifest = json.load(f).get('weightsManifest', [])
+        base_dir = os.path.dirname(model_path)
+        paths += [os.path.join(base_dir, path) for group in manifest for path in group['paths']]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def build_model(model_path):
+    """Load the selected inference engine from ``model_path``"""
+    # Inference engines are imported lazily so liveness answers right after process start
+    if MODEL_BACKEND == 'numpy':
+        from numpy_model import NumpyPlantHealthModel
+        return NumpyPlantHealthModel.load(model_path)
+    from tensorflow.keras.models import load_model
+    loaded = load_model(model_path)
+    if KERAS_INFERENCE == 'compiled':
+        from compiled_model import CompiledKerasModel
+        loaded = CompiledKerasModel(loaded, buckets=COMPILED_BATCH_BUCKETS)
+        logger.info(f"Compiled Keras inference for batch sizes {loaded.buckets} (XLA: {loaded.jit_compile})")
+    return loaded
 
 def load_ml_model():
-    global model
+    global model, model_version
     try:
-        if os.path.exists(MODEL_PATH):
-            model = load_model(MODEL_PATH)
-            logger.info(f"Model loaded successfully from {MODEL_PATH}")
+        model_path = active_model_path()
+        started = time.perf_counter()
+        if os.path.exists(model_path):
+            version = compute_model_version(model_path)
+            model = build_model(model_path)
+            model_version = version
+            readiness['model_load_seconds'] = round(time.perf_counter() - started, 3)
+            logger.info(f"Model {model_version} loaded successfully from {model_path} ({MODEL_BACKEND} backend) in {readiness['model_load_seconds']:.2f}s")
             logger.info(f"Model input shape: {model.input_shape}")
             logger.info(f"Model output shape: {model.output_shape}")
         else:
-            logger.error(f"Model file not found at {MODEL_PATH}")
+            logger.error(f"Model file not found at {model_path}")
             logger.info(f"Current working directory: {os.getcwd()}")
             logger.info(f"Files in parent directory: {os.listdir('..')}")
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
 
+def warm_up_model(predict_fn=None):
+    """Run representative forward passes at every served batch size before reporting ready.
+
+    The first predict at each batch size pays for graph tracing and allocator
+    warm-up; doing it here keeps that latency out of the first real requests.
+    ``predict_fn`` defaults to the serving model; reloads pass the new model's.
+    """
+    predict_fn = predict_fn or predict_batch
+    rng = np.random.default_rng(0)
+    for batch_size in WARMUP_BATCH_SIZES:
+        # Leaf-like inputs: mid-range values with a stronger green channel
+        batch = rng.random((batch_size, *MODEL_INPUT_SIZE, 3), dtype=np.float32) * 0.3 + 0.2
+        batch[..., 1] += 0.3
+        started = time.perf_counter()
+        predict_fn(batch)
+        logger.info(f"Warm-up pass with batch size {batch_size} took {(time.perf_counter() - started) * 1000:.1f} ms")
+
+def reload_model():
+    """Load, validate and warm up the model on disk, then swap it in; returns (ok, message).
+
+    Runs entirely off the request path: requests keep using the current model
+    until the single assignment that replaces it, and a batch already running
+    finishes on the model it started with. The new model must have the same
+    input and output shapes as the one it replaces.
+    """
+    global model, model_version
+    if not _reload_lock.acquire(blocking=False):
+        return False, "A model reload is already in progress"
+    try:
+        reload_status['state'] = 'loading'
+        model_path = active_model_path()
+        started = time.perf_counter()
+        version = compute_model_version(model_path)
+        if version == model_version and model is not None:
+            MODEL_RELOADS.labels('unchanged').inc()
+            return True, f"Model {version} is already loaded"
+        
+        candidate = build_model(model_path)
+        if model is not None:
+            for attribute in ('input_shape', 'output_shape'):
+                current_shape, new_shape = tuple(getattr(model, attribute)), tuple(getattr(candidate, attribute))
+                if current_shape != new_shape:
+                    raise ValueError(f"New model {attribute} {new_shape} does not match the serving model's {current_shape}")
+        
+        reload_status['state'] = 'warming_up'
+        warm_up_model(lambda batch: candidate.predict(batch, verbose=0))
+        
+        previous_version = model_version
+        model, model_version = candidate, version
+        readiness['state'] = 'ready'
+        reload_status.update(last_error=None, last_reload_seconds=round(time.perf_counter() - started, 3))
+        reload_status['reloads'] += 1
+        MODEL_RELOADS.labels('success').inc()
+        logger.info(f"Model reloaded from {model_path}: {previous_version} -> {version} in {reload_status['last_reload_seconds']:.2f}s")
+        return True, f"Model {version} loaded"
+    except Exception as e:
+        reload_status['last_error'] = str(e)
+        MODEL_RELOADS.labels('failed').inc()
+        logger.error(f"Model reload failed, keeping model {model_version}: {str(e)}")
+        return False, f"Model reload failed: {str(e)}"
+    finally:
+        reload_status['state'] = 'idle'
+        _reload_lock.release()
+
+def admin_token_from_headers(headers):
+    """Token from an `X-Admin-Token` header or an `Authorization: Bearer` header"""
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):]
+    return headers.get('X-Admin-Token', '')
+
+def request_model_reload(token):
+    """Admin reload trigger shared by the WSGI and ASGI apps; returns (result, status_code)"""
+    if not ADMIN_TOKEN:
+        return {'error': 'Not found'}, 404
+    if not hmac.compare_digest(token or '', ADMIN_TOKEN):
+        return {'error': 'Unauthorized'}, 401
+    if _reload_lock.locked():
+        return {'error': 'A model reload is already in progress', 'model_version': model_version}, 409
+    threading.Thread(target=reload_model, name='model-reload', daemon=True).start()
+    return {'status': 'reload started', 'model_version': model_version}, 202
+
+model_watcher = ModelFileWatcher(active_model_path, reload_model, interval_seconds=MODEL_WATCH_INTERVAL_SECONDS or 5.0)
+
+def initialize_model():
+    """Load (if needed) and warm up the model, updating the readiness state"""
+    try:
+        if model is None:
+            readiness['state'] = 'loading'
+            load_ml_model()
+        if model is None:
+            readiness['state'] = 'failed'
+            return
+        readiness['state'] = 'warming_up'
+        started = time.perf_counter()
+        warm_up_model()
+        readiness['warmup_seconds'] = round(time.perf_counter() - started, 3)
+        readiness['state'] = 'ready'
+        logger.info(f"Model ready after {readiness['warmup_seconds']:.2f}s warm-up")
+        if MODEL_WATCH_INTERVAL_SECONDS > 0:
+            model_watcher.start()
+    except Exception as e:
+        readiness['state'] = 'failed'
+        logger.error(f"Model initialization failed: {str(e)}")
+
+def start_model_initialization():
+    """Initialize the model on a background thread, once per process (safe to call after fork)"""
+    global _initialization_pid
+    with _initialization_lock:
+        if _initialization_pid == os.getpid():
+            return
+        _initialization_pid = os.getpid()
+        readiness.update(state='loading', warmup_seconds=None)
+    threading.Thread(target=initialize_model, name='model-initialization', daemon=True).start()
+
+def predict_batch(batch):
+    """Run one forward pass of the loaded model over a stacked (N, 224, 224, 3) batch"""
+    # One read of the global: a concurrent reload cannot switch models mid-batch
+    serving_model = model
+    if serving_model is None:
+        raise Exception("Model not loaded")
+    started = time.perf_counter()
+    predictions = serving_model.predict(batch, verbose=0)
+    MODEL_BATCH_SECONDS.observe(time.perf_counter() - started)
+    MODEL_BATCH_SIZE.observe(len(batch))
+    return predictions
+
+inference_batcher = InferenceBatcher(predict_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+
+def header_rejection(byte_count, image_format, size):
+    """Checks that need only the byte count and the image header, cheapest first; returns a rejection reason or None"""
+    # Check maximum file size (already handled by frontend, but double-check)
+    if byte_count > MAX_IMAGE_BYTES:
+        return 'file_too_large'
+    if image_format not in ALLOWED_IMAGE_FORMATS:
+        return 'unsupported_format'
+    
+    # Basic checks for image quality use the resolution stored in the file
+    return dimension_rejection(size)
+
+def dimension_rejection(size):
+    """Resolution and aspect-ratio checks on the original (width, height); returns a rejection reason or None"""
+    width, height = size
+    
+    # Check minimum resolution
+    if width < 100 or height < 100:
+        return 'resolution_too_low'
+    
+    if width * height > MAX_IMAGE_PIXELS:
+        return 'too_many_pixels'
+    
+    # Check aspect ratio (avoid very thin or very wide images)
+    if max(width, height) / min(width, height) > 4:
+        return 'extreme_aspect_ratio'
+    return None
+
+def check_image_header(img_data):
+    """Reject an upload from its size, magic bytes and header before any pixel decode.
+
+    Returns (is_valid, message, header); header is the opened but not yet
+    decoded image, or None if it could not be parsed.
+    """
+    if len(img_data) > MAX_IMAGE_BYTES:
+        return False, REJECTION_MESSAGES['file_too_large'], None
+    if sniff_image_format(img_data) is None:
+        return False, REJECTION_MESSAGES['unsupported_format'], None
+    try:
+        header = open_image_header(img_data)
+    except Exception as e:
+        logger.error(f"Error reading image header: {str(e)}")
+        return False, REJECTION_MESSAGES['undecodable'], None
+    
+    reason = header_rejection(len(img_data), header.format, header.size)
+    if reason is not None:
+        return False, REJECTION_MESSAGES[reason], header
+    return True, "Image header check passed", header
+
+def rejection_result(message):
+    """Response body for an image rejected by validation"""
+    return {
+        'error': 'Inappropriate image',
+        'message': message,
+        'inappropriate_image': True
+    }
+
+def decode_plant_image(img_data, header=None):
+    """Decode uploaded bytes once for validation and preprocessing; fall back to raw bytes if undecodable"""
+    try:
+        return decode_image(img_data, MODEL_INPUT_SIZE, header=header)
+    except Exception as e:
+        logger.error(f"Error decoding image: {str(e)}")
+        # Validation reports undecodable images to the user with its usual message
+        return img_data
+
 def preprocess_image_for_model(img_data):
     """Preprocess image exactly as required by the plant health classifier model"""
     try:
-        # Convert base64 to PIL Image
-        img = Image.open(io.BytesIO(img_data))
-        
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        # Reuse the shared decode when validation already produced one
+        if not isinstance(img_data, DecodedImage):
+            img_data = decode_image(img_data)
+        img = img_data.image
         
         # Resize to model input size (224, 224) as specified in the model requirements
-        img = img.resize((224, 224))
+        img = img.resize(MODEL_INPUT_SIZE)
         
         # Convert to array and normalize pixel values to 0-1 range
-        img_array = image.img_to_array(img) / 255.0
+        img_array = np.asarray(img, dtype=np.float32) / 255.0
         
         # Add batch dimension (model expects batch input)
         img_array = np.expand_dims(img_array, axis=0)
         
-        logger.info(f"Preprocessed image shape: {img_array.shape}")
-        logger.info(f"Image value range: {img_array.min():.3f} to {img_array.max():.3f}")
+        # Full-tensor scans only run for requests that are actually logged
+        current_request_log().lazy('value_range', lambda: [round(float(img_array.min()), 3), round(float(img_array.max()), 3)])
         
         return img_array
     except Exception as e:
         logger.error(f"Error preprocessing image: {str(e)}")
         return None
 
+def preprocess_pixel_tensor(pixels):
+    """Model input for a pre-resized (224, 224, 3) uint8 upload, scaled to 0-1 exactly like preprocess_image_for_model"""
+    # The uint8 view cannot hold the scaled values, so they are written straight into the batch buffer
+    img_array = np.empty((1, *pixels.shape), dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=img_array[0])
+    return img_array
+
 def validate_plant_image(img_data):
     """Validate if image is appropriate for plant health analysis"""
     try:
-        img = Image.open(io.BytesIO(img_data))
-        
-        # Convert to RGB
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Basic checks for image quality
-        width, height = img.size
-        
-        # Check minimum resolution
-        if width < 100 or height < 100:
-            return False, "Image resolution too low. Please upload a higher quality image (minimum 100x100 pixels)."
-        
-        # Check maximum file size (already handled by frontend, but double-check)
-        if len(img_data) > 8 * 1024 * 1024:  # 8MB
-            return False, "Image file too large. Please upload an image smaller than 8MB."
-        
-        # Convert to numpy array for analysis
-        img_array = np.array(img)
-        mean_brightness = np.mean(img_array)
-        
-        # Check if image is too dark or too bright
-        if mean_brightness < 20:
-            return False, "Image is too dark. Please ensure good lighting when taking the photo."
-        elif mean_brightness > 235:
-            return False, "Image is overexposed. Please reduce lighting or adjust camera settings."
-        
-        # Check for plant/leaf content
-        green_channel = img_array[:, :, 1]
-        red_channel = img_array[:, :, 0]
-        blue_channel = img_array[:, :, 2]
-        
-        # Calculate color ratios
-        green_ratio = np.mean(green_channel) / 255.0
-        red_ratio = np.mean(red_channel) / 255.0
-        blue_ratio = np.mean(blue_channel) / 255.0
-        
-        # Check for sufficient green content (indicating plant material)
-        if green_ratio < 0.1:
-            return False, "No significant plant content detected. Please upload a clear image of a plant leaf."
-        
-        # Check for color variation (avoid pure color images)
-        color_std = np.std(img_array)
-        if color_std < 15:
-            return False, "Image appears to lack detail. Please upload a clear, detailed image of a plant leaf."
-        
-        # Check for skin tones (to detect hands in image)
-        skin_pixels = np.sum(
-            (red_channel > green_channel) & 
-            (red_channel > blue_channel) & 
-            (red_channel > 95) & 
-            (green_channel > 40) & 
-            (blue_channel > 20) &
-            (red_channel - green_channel > 15) &
-            (np.abs(red_channel - green_channel) > np.abs(red_channel - blue_channel))
-        )
-        skin_ratio = skin_pixels / (width * height)
+        if not isinstance(img_data, DecodedImage):
+            img_data = decode_image(img_data)
+        img = img_data.image
+        width, height = img_data.size
         
-        if skin_ratio > 0.15:  # More than 15% skin-like pixels
-            return False, "Hands or skin detected in image. Please upload an image showing only the plant leaf."
+        # Size, format, resolution and aspect ratio (normally already checked before decoding)
+        reason = header_rejection(len(img_data.data), img_data.format, img_data.size)
+        if reason is not None:
+            return False, REJECTION_MESSAGES[reason]
         
-        # Check aspect ratio (avoid very thin or very wide images)
-        aspect_ratio = max(width, height) / min(width, height)
-        if aspect_ratio > 4:
-            return False, "Image aspect ratio is too extreme. Please upload a more square-shaped image of the leaf."
+        # Brightness, color ratios, detail and skin tones in one bounded-memory pass
+        stats = compute_image_stats(img)
+        reason = stats_rejection(stats)
+        if reason is not None:
+            return False, REJECTION_MESSAGES[reason]
         
-        logger.info(f"Image validation passed - Size: {width}x{height}, Brightness: {mean_brightness:.1f}, Green ratio: {green_ratio:.3f}")
+        current_request_log().note(
+            size=f"{width}x{height}", brightness=round(stats.mean_brightness, 1), green_ratio=round(stats.green_ratio, 3)
+        )
         return True, "Image validation passed"
         
     except Exception as e:
         logger.error(f"Error validating image: {str(e)}")
-        return False, "Error processing image. Please try uploading a different image."
+        return False, REJECTION_MESSAGES['undecodable']
 
-@app.route('/health', methods=['GET'])
-def health_check():
+def stats_rejection(stats):
+    """Content checks on the pixel statistics from compute_image_stats; returns a rejection reason or None"""
+    # Check if image is too dark or too bright
+    if stats.mean_brightness < 20:
+        return 'too_dark'
+    elif stats.mean_brightness > 235:
+        return 'overexposed'
+    
+    # Check for sufficient green content (indicating plant material)
+    if stats.green_ratio < 0.1:
+        return 'no_plant_content'
+    
+    # Check for color variation (avoid pure color images)
+    if stats.color_std < 15:
+        return 'lacks_detail'
+    
+    # Check for skin tones (to detect hands in image)
+    if stats.skin_ratio > 0.15:  # More than 15% skin-like pixels
+        return 'skin_detected'
+    return None
+
+def health_status():
+    """Liveness payload shared by the WSGI and ASGI apps"""
     model_info = {}
     if model is not None:
         try:
@@ -152,17 +630,51 @@ def health_check():
         except Exception as e:
             model_info = {'error': str(e)}
     
-    return jsonify({
+    return {
         'status': 'healthy',
         'model_loaded': model is not None,
-        'model_info': model_info
-    })
+        'model_version': model_version,
+        'model_info': model_info,
+        'model_reload': reload_status,
+        'inference_queue': inference_batcher.stats(),
+        'result_cache': result_cache.stats()
+    }
 
-@app.route('/test-prediction', methods=['GET'])
-def test_prediction():
-    """Test endpoint to verify model is working with sample data"""
-    if model is None:
-        return jsonify({'error': 'Model not loaded'}), 500
+@app.route('/admin/reload-model', methods=['POST'])
+def admin_reload_model():
+    """Load, validate and warm up the model file in the background, then swap it in"""
+    result, status_code = request_model_reload(admin_token_from_headers(request.headers))
+    return jsonify(result), status_code
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Liveness probe: answers as soon as the process is up, whether or not the model is ready"""
+    return jsonify(health_status())
+
+def readiness_status():
+    """Readiness payload and status code shared by the WSGI and ASGI apps"""
+    ready = readiness['state'] == 'ready' and model is not None
+    return {
+        'ready': ready,
+        **readiness
+    }, 200 if ready else 503
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 only once the model is loaded and warmed up, 503 before that"""
+    result, status_code = readiness_status()
+    return jsonify(result), status_code
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Pipeline stage latencies, outcomes and size distributions in Prometheus text format"""
+    return Response(metrics_registry.render(), content_type=metrics.CONTENT_TYPE)
+
+def run_test_prediction():
+    """Run the model on synthetic healthy/affected samples; returns (result, status_code)"""
+    serving_model = model
+    if serving_model is None:
+        return {'error': 'Model not loaded'}, 500
     
     try:
         # Create two test images: one "healthy" looking and one "affected" looking
@@ -177,13 +689,13 @@ def test_prediction():
         affected_image[:, :, :, 1] += 0.1  # Slight green
         
         # Test both images
-        healthy_pred = model.predict(healthy_image, verbose=0)
-        affected_pred = model.predict(affected_image, verbose=0)
+        healthy_pred = serving_model.predict(healthy_image, verbose=0)
+        affected_pred = serving_model.predict(affected_image, verbose=0)
         
-        return jsonify({
+        return {
             'model_status': 'working',
-            'model_input_shape': model.input_shape,
-            'model_output_shape': model.output_shape,
+            'model_input_shape': serving_model.input_shape,
+            'model_output_shape': serving_model.output_shape,
             'test_results': {
                 'healthy_sample': {
                     'prediction': healthy_pred.tolist(),
@@ -195,9 +707,327 @@ def test_prediction():
                 }
             },
             'threshold_info': 'Values > 0.5 = Healthy, Values ≤ 0.5 = Affected'
-        })
+        }, 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
+
+def ingest_sensor_body(body):
+    """Store a batch of NDJSON readings, check alert rules and push both to stream subscribers; returns (result, status_code)"""
+    by_device, errors = parse_ndjson(body)
+    try:
+        appended, duplicates, device_errors = sensor_store.ingest(by_device)
+    except HistoryLockedError as e:
+        return {'error': 'Sensor history unavailable', 'message': str(e)}, 503
+    errors += device_errors
+    records = [record for device_id, timestamps, rows in appended
+               for record in records_from_columns(device_id, timestamps, rows.T)]
+    sensor_events.publish(records)
+    alerts = alert_engine.evaluate(appended)
+    if alerts:
+        for alert in alerts:
+            if alert['state'] == 'firing':
+                SENSOR_ALERTS.labels(alert['rule']).inc()
+                logger.info(f"Sensor alert {alert['rule']} for {alert['device_id']}: {alert['metric']} {alert['observed']}")
+        sensor_events.publish(alerts, event='alert')
+    return {
+        'accepted': len(records),
+        'duplicates': duplicates,
+        'rejected': len(errors),
+        'errors': errors[:20],
+        'alerts': alerts,
+    }, 400 if errors and not records and not duplicates else 200
+
+def sensor_ingest_authorized(headers):
+    return not SENSOR_INGEST_TOKEN or hmac.compare_digest(admin_token_from_headers(headers), SENSOR_INGEST_TOKEN)
+
+def no_sensor_data_payload(device_id):
+    return {'data': None, 'error': f'No sensor data for device {device_id}'}, 404
+
+def latest_sensor_payload(device_id):
+    records = sensor_store.last(device_id, 1)
+    if not records:
+        return no_sensor_data_payload(device_id)
+    return {'data': records[0]}, 200
+
+def last_sensor_payload(device_id, n_text):
+    try:
+        n = int(n_text)
+    except ValueError:
+        return {'error': 'n must be an integer'}, 400
+    if n < 1:
+        return {'error': 'n must be at least 1'}, 400
+    records = sensor_store.last(device_id, min(n, SENSOR_BUFFER_CAPACITY))
+    if records is None:
+        return no_sensor_data_payload(device_id)
+    return {'data': records}, 200
+
+def parse_time_range(params, latest_ms, default_span_ms=24 * 60 * 60 * 1000):
+    """(start_ms, end_ms) from ?start=&end= (any timestamp format ingest accepts).
+
+    Defaults to the ``default_span_ms`` up to ``latest_ms``, or to everything
+    up to it when ``default_span_ms`` is None.
+    """
+    def timestamp(name, default_ms):
+        value = params.get(name)
+        # Query strings carry epoch seconds/milliseconds as text
+        return parse_timestamp_ms(int(value) if value and value.isdigit() else value, default_ms)
+    end_ms = timestamp('end', latest_ms)
+    start_ms = timestamp('start', 0 if default_span_ms is None else end_ms - default_span_ms)
+    if start_ms > end_ms:
+        raise SensorRecordError("start must not be after end")
+    return start_ms, end_ms
+
+def range_sensor_payload(params):
+    """One metric over a time range, downsampled with LTTB to ?points= (for charts)"""
+    device_id = params.get('device_id', DEFAULT_DEVICE_ID)
+    buffer = sensor_store.buffer(device_id)
+    if buffer is None or not buffer.count:
+        return {'error': f'No sensor data for device {device_id}'}, 404
+    try:
+        max_points = int(params.get('points', SENSOR_RANGE_DEFAULT_POINTS))
+    except ValueError:
+        return {'error': 'points must be an integer'}, 400
+    if not 3 <= max_points <= SENSOR_RANGE_MAX_POINTS:
+        return {'error': f'points must be between 3 and {SENSOR_RANGE_MAX_POINTS}'}, 400
+    resolution = params.get('resolution') or None
+    if resolution not in (None, 'raw', *SENSOR_ROLLUP_CAPACITIES):
+        return {'error': f"resolution must be one of raw, {', '.join(SENSOR_ROLLUP_CAPACITIES)}"}, 400
+    try:
+        start_ms, end_ms = parse_time_range(params, buffer.latest_timestamp)
+        metric = params.get('metric', 'pH')
+        resolution, timestamps, values, source_points = sensor_store.series(
+            device_id, metric, start_ms, end_ms, max_points, resolution)
+    except SensorRecordError as e:
+        return {'error': str(e)}, 400
+    return {
+        'device_id': device_id,
+        'metric': metric,
+        'resolution': resolution,
+        'start': start_ms,
+        'end': end_ms,
+        'source_points': source_points,
+        'points': [[timestamp, round(value, 4)] for timestamp, value in zip(timestamps.tolist(), values.tolist())]
+    }, 200
+
+def rollup_sensor_payload(params):
+    """Per-bucket min/max/mean/count of one metric at ?resolution= (1m, 1h or 1d)"""
+    device_id = params.get('device_id', DEFAULT_DEVICE_ID)
+    buffer = sensor_store.buffer(device_id)
+    if buffer is None or not buffer.count:
+        return {'error': f'No sensor data for device {device_id}'}, 404
+    resolution = params.get('resolution', '1h')
+    try:
+        start_ms, end_ms = parse_time_range(params, buffer.latest_timestamp)
+        metric = params.get('metric', 'pH')
+        starts, counts, means, mins, maxs = sensor_store.rollup(device_id, resolution, metric_column(metric), start_ms, end_ms)
+    except SensorRecordError as e:
+        return {'error': str(e)}, 400
+    return {
+        'device_id': device_id,
+        'metric': metric,
+        'resolution': resolution,
+        'buckets': [
+            {'start': start, 'count': count, 'mean': round(mean, 4), 'min': round(low, 4), 'max': round(high, 4)}
+            for start, count, mean, low, high in zip(starts.tolist(), counts.tolist(), means.tolist(), mins.tolist(), maxs.tolist())
+        ]
+    }, 200
+
+def export_stream(kind, params, accept_encoding):
+    """Validate an export of ``kind`` ('sensors' or 'analyses'); returns (byte chunks or error result, status_code, headers).
+
+    On success an export slot is held; the caller releases it with
+    export_slots.release() once the response is closed.
+    """
+    export_format = params.get('format', 'csv')
+    try:
+        check_format(export_format)
+        if kind == 'sensors':
+            device_id = params.get('device_id', DEFAULT_DEVICE_ID)
+            buffer = sensor_store.buffer(device_id)
+            if buffer is None or not buffer.count:
+                return {'error': f'No sensor data for device {device_id}'}, 404, {}
+            start_ms, end_ms = parse_time_range(params, buffer.latest_timestamp, default_span_ms=None)
+            fields = SENSOR_EXPORT_FIELDS
+            batches = (export_batch(device_id, timestamps, values)
+                       for timestamps, values in sensor_store.iter_range(device_id, start_ms, end_ms))
+            name = 'sensors-' + ''.join(c if c.isalnum() or c in '-_' else '_' for c in device_id)
+        else:
+            if analysis_history is None:
+                return {'error': 'Analysis history is not enabled', 'message': 'Set ANALYSIS_HISTORY_PATH to record analyses.'}, 404, {}
+            start_ms, end_ms = parse_time_range(params, int(time.time() * 1000), default_span_ms=None)
+            fields = ANALYSIS_EXPORT_FIELDS
+            batches = analysis_history.iter_batches(start_ms, end_ms)
+            name = 'analyses'
+    except (ExportFormatError, SensorRecordError) as e:
+        return {'error': str(e)}, 400, {}
+    if not export_slots.acquire(blocking=False):
+        return {'error': 'Too many exports in progress', 'message': 'Please retry shortly.'}, 503, {'Retry-After': '10'}
+
+    chunks = encode(export_format, fields, batches)
+    headers = {
+        'Content-Type': CONTENT_TYPES[export_format],
+        'Content-Disposition': f'attachment; filename="{name}-{start_ms}-{end_ms}.{export_format}"',
+        'X-Accel-Buffering': 'no',
+    }
+    # Parquet pages are already compressed
+    if export_format != 'parquet' and 'gzip' in (accept_encoding or ''):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return chunks, 200, headers
+
+def export_response(kind):
+    body, status_code, headers = export_stream(kind, request.args, request.headers.get('Accept-Encoding'))
+    if status_code != 200:
+        return jsonify(body), status_code, headers
+    response = Response(body, headers=headers)
+    response.call_on_close(export_slots.release)
+    return response
+
+def alerts_payload(params):
+    """Rules currently violating and the most recent alert transitions, optionally for one device"""
+    device_id = params.get('device_id')
+    recent = [alert for alert in list(alert_engine.recent) if device_id is None or alert['device_id'] == device_id]
+    return {'active': alert_engine.active_alerts(device_id), 'recent': recent[::-1], 'rules': alert_engine.rules}, 200
+
+def alert_stats_payload(params):
+    """Rolling statistics behind the alert rules for one device"""
+    device_id = params.get('device_id', DEFAULT_DEVICE_ID)
+    stats = alert_engine.stats(device_id)
+    if stats is None:
+        return {'error': f'No sensor data for device {device_id}'}, 404
+    return {'device_id': device_id, 'metrics': stats}, 200
+
+SENSOR_INGEST_TOO_LARGE_RESPONSE = {
+    'error': 'Request too large',
+    'message': f'Send at most {SENSOR_MAX_INGEST_BYTES} bytes of readings per request.'
+}
+
+@app.route('/data/ingest', methods=['POST'])
+def ingest_sensor_data():
+    """Append a batch of NDJSON sensor readings (one JSON object per line) to the device buffers"""
+    if not sensor_ingest_authorized(request.headers):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        body = read_request_body(SENSOR_MAX_INGEST_BYTES)
+    except RequestEntityTooLarge:
+        return jsonify(SENSOR_INGEST_TOO_LARGE_RESPONSE), 413
+    result, status_code = ingest_sensor_body(body)
+    return jsonify(result), status_code
+
+@app.route('/data/latest', methods=['GET'])
+def latest_sensor_data():
+    """Most recent reading of a device, shaped like the dashboard's LatestMetrics"""
+    result, status_code = latest_sensor_payload(request.args.get('device_id', DEFAULT_DEVICE_ID))
+    return jsonify(result), status_code
+
+@app.route('/data/last30', methods=['GET'])
+def last30_sensor_data():
+    """The 30 most recent readings of a device, newest first"""
+    result, status_code = last_sensor_payload(request.args.get('device_id', DEFAULT_DEVICE_ID), '30')
+    return jsonify(result), status_code
+
+@app.route('/data/last', methods=['GET'])
+def last_sensor_data():
+    """The ``n`` most recent readings of a device (up to the buffer capacity), newest first"""
+    result, status_code = last_sensor_payload(request.args.get('device_id', DEFAULT_DEVICE_ID), request.args.get('n', '30'))
+    return jsonify(result), status_code
+
+@app.route('/data/range', methods=['GET'])
+def range_sensor_data():
+    """A metric over ?start=&end=, at most ?points= points, for long-range charts"""
+    result, status_code = range_sensor_payload(request.args)
+    return jsonify(result), status_code
+
+@app.route('/data/rollups', methods=['GET'])
+def rollup_sensor_data():
+    """1-minute, 1-hour or 1-day min/max/mean/count buckets of a metric"""
+    result, status_code = rollup_sensor_payload(request.args)
+    return jsonify(result), status_code
+
+@app.route('/alerts', methods=['GET'])
+def sensor_alerts():
+    """Active alerts and recent firing/resolved transitions; ?device_id= filters"""
+    result, status_code = alerts_payload(request.args)
+    return jsonify(result), status_code
+
+@app.route('/alerts/stats', methods=['GET'])
+def sensor_alert_stats():
+    """Welford, EWMA and sliding-window statistics of a device's watched metrics"""
+    result, status_code = alert_stats_payload(request.args)
+    return jsonify(result), status_code
+
+@app.route('/export/sensors', methods=['GET'])
+def export_sensor_data():
+    """Every reading of a device in ?start=&end= as a streamed CSV, NDJSON or Parquet download"""
+    return export_response('sensors')
+
+@app.route('/export/analyses', methods=['GET'])
+def export_analyses():
+    """Recorded analysis results in ?start=&end= as a streamed CSV, NDJSON or Parquet download"""
+    return export_response('analyses')
+
+@app.route('/data/stream', methods=['GET'])
+def stream_sensor_data():
+    """Server-sent events: one `reading` event per new record, resumable with Last-Event-ID.
+
+    Each open stream holds a worker thread here; use the ASGI app (asgi.py)
+    to serve many dashboards from one process.
+    """
+    device_id = request.args.get('device_id')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    wake = threading.Event()
+    subscriber, initial = sensor_events.subscribe(device_id, last_event_id, notify=wake.set)
+    if subscriber is None:
+        return jsonify({'error': 'Too many stream clients', 'message': 'Please poll /data/latest instead.'}), 503
+    
+    def generate():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n" + initial
+            while True:
+                if not wake.wait(SSE_KEEPALIVE_SECONDS):
+                    yield KEEPALIVE_FRAME
+                    continue
+                wake.clear()
+                chunk = subscriber.drain()
+                if chunk:
+                    yield chunk
+                if subscriber.dropped:
+                    yield DROPPED_FRAME
+                    return
+        finally:
+            sensor_events.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/data/devices', methods=['GET'])
+def sensor_devices():
+    """Devices with buffered readings, their reading counts and latest timestamps"""
+    return jsonify({'devices': sensor_store.devices()})
+
+@app.route('/test-prediction', methods=['GET'])
+def test_prediction():
+    """Test endpoint to verify model is working with sample data"""
+    result, status_code = run_test_prediction()
+    return jsonify(result), status_code
+
+def interpret_prediction(prediction_value):
+    """Turn the model's sigmoid output into (is_healthy, confidence, health_status)"""
+    # Interpret the prediction based on the model's training
+    # According to your code: if prediction > 0.5: Healthy, else: Affected
+    if prediction_value > 0.5:
+        is_healthy = True
+        health_status = "Healthy Plant"
+        confidence = float(prediction_value)
+    else:
+        is_healthy = False
+        health_status = "Affected Plant (Pest/Disease detected)"
+        confidence = float(1 - prediction_value)  # Confidence in the "affected" prediction
+    
+    # Ensure confidence is reasonable (between 0.5 and 1.0)
+    confidence = max(0.5, min(1.0, confidence))
+    
+    return is_healthy, confidence, health_status
 
 def classify_leaf_health(img_array):
     """Use the trained model to classify leaf health - core ML prediction function"""
@@ -205,115 +1035,435 @@ def classify_leaf_health(img_array):
         if model is None:
             raise Exception("Model not loaded")
         
-        # Make prediction using the loaded model
-        prediction = model.predict(img_array, verbose=0)
+        # Queue the tensor so concurrent requests share one batched forward pass
+        prediction_value = inference_batcher.submit(img_array)
         
-        logger.info(f"Raw model prediction: {prediction}")
-        logger.info(f"Prediction shape: {prediction.shape}")
+        is_healthy, confidence, health_status = interpret_prediction(prediction_value)
         
-        # Extract the prediction value
-        if len(prediction.shape) == 2:
-            prediction_value = prediction[0][0]
-        else:
-            prediction_value = prediction[0]
+        current_request_log().note(prediction=float(prediction_value), confidence=round(confidence, 3))
         
-        logger.info(f"Prediction value: {prediction_value}")
+        return is_healthy, confidence, health_status, prediction_value
         
-        # Interpret the prediction based on the model's training
-        # According to your code: if prediction > 0.5: Healthy, else: Affected
-        if prediction_value > 0.5:
-            is_healthy = True
-            health_status = "Healthy Plant"
-            confidence = float(prediction_value)
-        else:
-            is_healthy = False
-            health_status = "Affected Plant (Pest/Disease detected)"
-            confidence = float(1 - prediction_value)  # Confidence in the "affected" prediction
+    except Exception as e:
+        logger.error(f"Error in ML prediction: {str(e)}")
+        raise e
+
+def classify_leaf_health_batch(img_arrays):
+    """Classify several preprocessed images, queueing them together so they share forward passes"""
+    try:
+        if model is None:
+            raise Exception("Model not loaded")
         
-        # Ensure confidence is reasonable (between 0.5 and 1.0)
-        confidence = max(0.5, min(1.0, confidence))
+        prediction_values = inference_batcher.submit_many(img_arrays)
         
-        logger.info(f"Final classification: {health_status}, Confidence: {confidence:.3f}")
+        classifications = []
+        for prediction_value in prediction_values:
+            is_healthy, confidence, health_status = interpret_prediction(prediction_value)
+            classifications.append((is_healthy, confidence, health_status, prediction_value))
         
-        return is_healthy, confidence, health_status, prediction_value
+        return classifications
         
     except Exception as e:
-        logger.error(f"Error in ML prediction: {str(e)}")
+        logger.error(f"Error in batch ML prediction: {str(e)}")
         raise e
 
+def build_analysis_result(is_healthy, confidence, health_status, raw_prediction):
+    """Build the JSON result returned to clients for one analyzed image"""
+    return {
+        'prediction': health_status,
+        'confidence': round(confidence * 100, 1),
+        'is_healthy': is_healthy,
+        'recommendations': get_detailed_recommendations(is_healthy, confidence),
+        'model_info': {
+            'raw_prediction_value': float(raw_prediction),
+            'model_threshold': 0.5,
+            'interpretation': 'Values > 0.5 indicate healthy plant, values ≤ 0.5 indicate affected plant'
+        }
+    }
+
+def analyze_image_data(image_data):
+    """Run decode, validation, preprocessing and prediction for one image; returns (result, status_code)"""
+    # Header-only checks first, so oversized or malformed uploads are never decoded
+    started = time.perf_counter()
+    is_valid, validation_message, header = check_image_header(image_data)
+    observe_stage('header_check', started)
+    if header is not None:
+        IMAGE_MEGAPIXELS.observe(header.size[0] * header.size[1] / 1e6)
+    if not is_valid:
+        return rejection_result(validation_message), 400
+    
+    # Decode once; validation and preprocessing share the decoded pixels
+    started = time.perf_counter()
+    decoded_image = decode_plant_image(image_data, header)
+    observe_stage('image_decode', started)
+    
+    # Validate image content for plant analysis
+    started = time.perf_counter()
+    is_valid, validation_message = validate_plant_image(decoded_image)
+    observe_stage('validate', started)
+    if not is_valid:
+        return rejection_result(validation_message), 400
+    
+    # Preprocess image for the ML model
+    started = time.perf_counter()
+    processed_image = preprocess_image_for_model(decoded_image)
+    observe_stage('preprocess', started)
+    if processed_image is None:
+        return {'error': 'Error processing image for analysis'}, 400
+    
+    return predict_analysis_result(processed_image)
+
+def predict_analysis_result(processed_image):
+    """Classify one preprocessed image and build its response; returns (result, status_code)"""
+    # Perform ML prediction
+    try:
+        started = time.perf_counter()
+        is_healthy, confidence, health_status, raw_prediction = classify_leaf_health(processed_image)
+        # Includes time spent waiting in the batching queue
+        observe_stage('inference', started)
+        
+        # Prepare response with detailed recommendations
+        result = build_analysis_result(is_healthy, confidence, health_status, raw_prediction)
+        return result, 200
+        
+    except Exception as e:
+        logger.error(f"ML model prediction failed: {str(e)}")
+        return {
+            'error': 'Model prediction failed',
+            'message': 'The ML model encountered an error during prediction. Please try with a different image.'
+        }, 500
+
+def analyze_payload(data):
+    """Run /analyze for a parsed JSON body; returns (result, status_code) for the WSGI and ASGI apps"""
+    # Check if model is loaded
+    if model is None:
+        ANALYSIS_OUTCOMES.labels('model_unavailable').inc()
+        return {
+            'error': 'ML Model not available',
+            'message': 'Plant health classifier model could not be loaded. Please check if plant_health_classifier.h5 exists.'
+        }, 500
+    
+    if not data or 'image' not in data:
+        ANALYSIS_OUTCOMES.labels('invalid_input').inc()
+        return {'error': 'No image data provided'}, 400
+    
+    # Decode base64 image
+    try:
+        encoded = data['image'].split(',')[1]
+        # The decoded size is known from the base64 length, so oversized images are never decoded
+        if len(encoded) * 3 // 4 - encoded[-2:].count('=') > MAX_IMAGE_BYTES:
+            result = rejection_result(REJECTION_MESSAGES['file_too_large'])
+            outcome = record_outcome(result, 400)
+            record_analysis('analyze', None, result, outcome)
+            current_request_log().note(outcome=outcome)
+            return result, 400
+        
+        started = time.perf_counter()
+        image_data = base64.b64decode(encoded)
+        observe_stage('base64_decode', started)
+    except Exception as e:
+        logger.error(f"Error decoding image: {str(e)}")
+        ANALYSIS_OUTCOMES.labels('invalid_input').inc()
+        return {'error': 'Invalid image format. Please upload a valid image file.'}, 400
+    
+    # Identical uploads (e.g. retries after a network hiccup) share one cached or in-flight result
+    result_cache.ensure_namespace(model_version)
+    image_key = hashlib.sha256(image_data).hexdigest()
+    result, status_code = result_cache.get_or_compute(
+        image_key,
+        lambda: analyze_image_data(image_data),
+        cacheable=lambda outcome: outcome[1] < 500
+    )
+    outcome = record_outcome(result, status_code)
+    record_analysis('analyze', image_key, result, outcome)
+    current_request_log().note(bytes=len(image_data), outcome=outcome)
+    return result, status_code
+
+def analyze_pixel_tensor(pixels, size):
+    """Validate, preprocess and classify a pre-resized upload whose original photo was ``size``; returns (result, status_code)"""
+    IMAGE_MEGAPIXELS.observe(size[0] * size[1] / 1e6)
+    
+    # The original resolution comes from the client; pixel statistics are computed here from the 224x224 pixels
+    started = time.perf_counter()
+    reason = dimension_rejection(size)
+    if reason is None:
+        stats = compute_image_stats(pixels)
+        reason = stats_rejection(stats)
+    observe_stage('validate', started)
+    if reason is not None:
+        return rejection_result(REJECTION_MESSAGES[reason]), 400
+    current_request_log().note(
+        size=f"{size[0]}x{size[1]}", brightness=round(stats.mean_brightness, 1), green_ratio=round(stats.green_ratio, 3)
+    )
+    
+    started = time.perf_counter()
+    processed_image = preprocess_pixel_tensor(pixels)
+    observe_stage('preprocess', started)
+    return predict_analysis_result(processed_image)
+
+def analyze_tensor_payload(body, params):
+    """Run /analyze/tensor for a raw or .npy pixel body; returns (result, status_code) for the WSGI and ASGI apps"""
+    if model is None:
+        ANALYSIS_OUTCOMES.labels('model_unavailable').inc()
+        return {
+            'error': 'ML Model not available',
+            'message': 'Plant health classifier model could not be loaded. Please check if plant_health_classifier.h5 exists.'
+        }, 500
+    
+    try:
+        size = (int(params.get('width', '')), int(params.get('height', '')))
+        if min(size) <= 0:
+            raise ValueError()
+    except ValueError:
+        ANALYSIS_OUTCOMES.labels('invalid_input').inc()
+        return {
+            'error': 'Missing image dimensions',
+            'message': 'Send the width and height of the original photo as positive integer query parameters.'
+        }, 400
+    
+    try:
+        pixels = wrap_pixel_tensor(body)
+    except PixelTensorError as e:
+        ANALYSIS_OUTCOMES.labels('invalid_input').inc()
+        return {'error': 'Invalid pixel tensor', 'message': str(e)}, 400
+    
+    # Validation depends on the original size too, so it is part of the cache key
+    result_cache.ensure_namespace(model_version)
+    digest = hashlib.sha256(pixels)
+    digest.update(f"tensor:{size[0]}x{size[1]}".encode())
+    image_key = digest.hexdigest()
+    result, status_code = result_cache.get_or_compute(
+        image_key,
+        lambda: analyze_pixel_tensor(pixels, size),
+        cacheable=lambda outcome: outcome[1] < 500
+    )
+    outcome = record_outcome(result, status_code)
+    record_analysis('analyze_tensor', image_key, result, outcome)
+    current_request_log().note(bytes=len(body), outcome=outcome)
+    return result, status_code
+
+def read_request_body(limit, chunk_size=64 * 1024):
+    """Read the request body in chunks, refusing it as soon as it grows past ``limit`` bytes"""
+    if request.content_length is not None and request.content_length > limit:
+        raise RequestEntityTooLarge()
+    chunks = []
+    total = 0
+    while True:
+        chunk = request.stream.read(chunk_size)
+        if not chunk:
+            return b''.join(chunks)
+        total += len(chunk)
+        if total > limit:
+            raise RequestEntityTooLarge()
+        chunks.append(chunk)
+
+ANALYSIS_FAILED_RESPONSE = {
+    'error': 'Analysis failed',
+    'message': 'An unexpected error occurred during analysis. Please try again.'
+}
+
 @app.route('/analyze', methods=['POST'])
+@request_logs.track('analyze')
 def analyze_plant():
     """Main endpoint for plant health analysis using the trained ML model"""
+    request_started = time.perf_counter()
+    try:
+        body = read_request_body(MAX_REQUEST_BYTES)
+        REQUEST_BYTES.observe(len(body))
+        
+        # Get image data from request
+        try:
+            data = json.loads(body)
+        except ValueError:
+            ANALYSIS_OUTCOMES.labels('invalid_input').inc()
+            return jsonify({'error': 'Invalid JSON body'}), 400
+        result, status_code = analyze_payload(data)
+        
+        started = time.perf_counter()
+        response = jsonify(result)
+        observe_stage('serialize', started)
+        return response, status_code
+        
+    except RequestEntityTooLarge:
+        ANALYSIS_OUTCOMES.labels('request_too_large').inc()
+        return jsonify(REQUEST_TOO_LARGE_RESPONSE), 413
+    except Exception as e:
+        logger.error(f"Error in analysis endpoint: {str(e)}")
+        ANALYSIS_OUTCOMES.labels('error').inc()
+        return jsonify(ANALYSIS_FAILED_RESPONSE), 500
+    finally:
+        REQUEST_SECONDS.labels('analyze').observe(time.perf_counter() - request_started)
+
+@app.route('/analyze/tensor', methods=['POST'])
+@request_logs.track('analyze_tensor')
+def analyze_plant_tensor():
+    """Analyze a leaf photo the client already resized to 224x224 RGB, sent as raw uint8 pixels or a .npy file"""
+    request_started = time.perf_counter()
+    try:
+        body = read_request_body(TENSOR_MAX_REQUEST_BYTES)
+        REQUEST_BYTES.observe(len(body))
+        result, status_code = analyze_tensor_payload(body, request.args)
+        return jsonify(result), status_code
+        
+    except RequestEntityTooLarge:
+        ANALYSIS_OUTCOMES.labels('request_too_large').inc()
+        return jsonify(TENSOR_TOO_LARGE_RESPONSE), 413
+    except Exception as e:
+        logger.error(f"Error in tensor analysis endpoint: {str(e)}")
+        ANALYSIS_OUTCOMES.labels('error').inc()
+        return jsonify(ANALYSIS_FAILED_RESPONSE), 500
+    finally:
+        REQUEST_SECONDS.labels('analyze_tensor').observe(time.perf_counter() - request_started)
+
+def read_length_prefixed_images(stream, limit):
+    """Read images from a binary stream of [4-byte big-endian length][image bytes] records.
+
+    Like read_request_body, refuses the stream once it grows past ``limit``
+    bytes, so a chunked upload without Content-Length is capped too.
+    """
+    images = []
+    total = 0
+    while True:
+        header = stream.read(4)
+        if not header:
+            break
+        if len(header) < 4:
+            raise ValueError("Truncated length prefix in image stream")
+        (length,) = struct.unpack('>I', header)
+        if length > MAX_IMAGE_BYTES:
+            raise ValueError(f"Image {len(images)} is {length} bytes; the limit is {MAX_IMAGE_BYTES}")
+        total += 4 + length
+        if total > limit:
+            raise RequestEntityTooLarge()
+        payload = stream.read(length)
+        if len(payload) < length:
+            raise ValueError(f"Truncated image {len(images)}: expected {length} bytes, got {len(payload)}")
+        images.append((f"image_{len(images)}", payload))
+        if len(images) > BATCH_MAX_IMAGES:
+            break
+    return images
+
+@app.route('/analyze/batch', methods=['POST'])
+@request_logs.track('analyze_batch')
+def analyze_plant_batch():
+    """Analyze many raw JPEG/PNG leaf images in one request and return per-image results"""
+    request_started = time.perf_counter()
     try:
-        # Check if model is loaded
         if model is None:
             return jsonify({
                 'error': 'ML Model not available',
                 'message': 'Plant health classifier model could not be loaded. Please check if plant_health_classifier.h5 exists.'
             }), 500
         
-        # Get image data from request
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({'error': 'No image data provided'}), 400
-        
-        # Decode base64 image
-        try:
-            image_data = base64.b64decode(data['image'].split(',')[1])
-        except Exception as e:
-            logger.error(f"Error decoding image: {str(e)}")
-            return jsonify({'error': 'Invalid image format. Please upload a valid image file.'}), 400
+        if request.content_length is not None and request.content_length > BATCH_MAX_REQUEST_BYTES:
+            return jsonify(REQUEST_TOO_LARGE_RESPONSE), 413
         
-        # Validate image content for plant analysis
-        is_valid, validation_message = validate_plant_image(image_data)
-        if not is_valid:
+        # Collect raw image parts, either multipart/form-data files or a length-prefixed binary stream
+        if request.mimetype == 'multipart/form-data':
+            images = [(f.filename or name, f.read()) for name, f in request.files.items(multi=True)]
+        elif request.mimetype == 'application/octet-stream':
+            try:
+                images = read_length_prefixed_images(request.stream, BATCH_MAX_REQUEST_BYTES)
+            except ValueError as e:
+                logger.error(f"Error reading image stream: {str(e)}")
+                return jsonify({'error': 'Invalid image stream', 'message': str(e)}), 400
+        else:
             return jsonify({
-                'error': 'Inappropriate image',
-                'message': validation_message,
-                'inappropriate_image': True
-            }), 400
+                'error': 'Unsupported content type',
+                'message': 'Send images as multipart/form-data or as a length-prefixed application/octet-stream.'
+            }), 415
         
-        # Preprocess image for the ML model
-        processed_image = preprocess_image_for_model(image_data)
-        if processed_image is None:
-            return jsonify({'error': 'Error processing image for analysis'}), 400
+        if not images:
+            return jsonify({'error': 'No image data provided'}), 400
+        if len(images) > BATCH_MAX_IMAGES:
+            return jsonify({
+                'error': 'Too many images',
+                'message': f'Please upload at most {BATCH_MAX_IMAGES} images per batch.'
+            }), 413
         
-        # Perform ML prediction
-        try:
-            is_healthy, confidence, health_status, raw_prediction = classify_leaf_health(processed_image)
+        # Validate and preprocess each image, keeping per-image failures in the response
+        result_cache.ensure_namespace(model_version)
+        results = [None] * len(images)
+        image_keys = [hashlib.sha256(image_data).hexdigest() for _, image_data in images]
+        pending_indices = []
+        pending_arrays = []
+        for index, (filename, image_data) in enumerate(images):
+            cached = result_cache.get(image_keys[index])
+            if cached is not None:
+                result, _ = cached
+                results[index] = {'index': index, 'filename': filename, **result}
+                continue
             
-            # Generate detailed recommendations
-            recommendations = get_detailed_recommendations(is_healthy, confidence)
+            with current_request_log().item(index=index, bytes=len(image_data)):
+                is_valid, validation_message, header = check_image_header(image_data)
+                processed_image = None
+                if is_valid:
+                    decoded_image = decode_plant_image(image_data, header)
+                    is_valid, validation_message = validate_plant_image(decoded_image)
+                    processed_image = preprocess_image_for_model(decoded_image) if is_valid else None
+            if not is_valid:
+                rejection = rejection_result(validation_message)
+                result_cache.put(image_keys[index], (rejection, 400))
+                results[index] = {'index': index, 'filename': filename, **rejection}
+                continue
             
-            # Prepare response
-            result = {
-                'prediction': health_status,
-                'confidence': round(confidence * 100, 1),
-                'is_healthy': is_healthy,
-                'recommendations': recommendations,
-                'model_info': {
-                    'raw_prediction_value': float(raw_prediction),
-                    'model_threshold': 0.5,
-                    'interpretation': 'Values > 0.5 indicate healthy plant, values ≤ 0.5 indicate affected plant'
+            if processed_image is None:
+                results[index] = {
+                    'index': index,
+                    'filename': filename,
+                    'error': 'Error processing image for analysis'
                 }
-            }
+                continue
             
-            logger.info(f"Analysis complete: {health_status} (confidence: {confidence:.3f})")
-            return jsonify(result)
-            
-        except Exception as e:
-            logger.error(f"ML model prediction failed: {str(e)}")
-            return jsonify({
-                'error': 'Model prediction failed',
-                'message': 'The ML model encountered an error during prediction. Please try with a different image.'
-            }), 500
+            pending_indices.append(index)
+            pending_arrays.append(processed_image)
         
+        # Classify every valid image through the shared batching queue
+        if pending_arrays:
+            try:
+                classifications = classify_leaf_health_batch(pending_arrays)
+                for index, classification in zip(pending_indices, classifications):
+                    result = build_analysis_result(*classification)
+                    result_cache.put(image_keys[index], (result, 200))
+                    results[index] = {'index': index, 'filename': images[index][0], **result}
+            except Exception as e:
+                logger.error(f"ML model batch prediction failed: {str(e)}")
+                for index in pending_indices:
+                    results[index] = {
+                        'index': index,
+                        'filename': images[index][0],
+                        'error': 'Model prediction failed',
+                        'message': 'The ML model encountered an error during prediction. Please try again.'
+                    }
+        
+        outcomes = {}
+        for result, image_key in zip(results, image_keys):
+            outcome = record_outcome(result, 400 if 'error' in result else 200)
+            record_analysis('analyze_batch', image_key, result, outcome)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        
+        analyzed = sum(1 for result in results if 'error' not in result)
+        current_request_log().note(images=len(results), outcomes=outcomes)
+        return jsonify({
+            'results': results,
+            'summary': {
+                'total': len(results),
+                'analyzed': analyzed,
+                'rejected': sum(1 for result in results if result.get('inappropriate_image')),
+                'failed': sum(1 for result in results if 'error' in result and not result.get('inappropriate_image'))
+            }
+        })
+        
+    except RequestEntityTooLarge:
+        return jsonify(REQUEST_TOO_LARGE_RESPONSE), 413
     except Exception as e:
-        logger.error(f"Error in analysis endpoint: {str(e)}")
+        logger.error(f"Error in batch analysis endpoint: {str(e)}")
         return jsonify({
             'error': 'Analysis failed',
-            'message': 'An unexpected error occurred during analysis. Please try again.'
+            'message': 'An unexpected error occurred during batch analysis. Please try again.'
         }), 500
+    finally:
+        REQUEST_SECONDS.labels('analyze_batch').observe(time.perf_counter() - request_started)
 
 def get_detailed_recommendations(is_healthy, confidence):
     """Generate detailed recommendations based on ML model prediction"""
@@ -336,6 +1486,21 @@ def get_detailed_recommendations(is_healthy, confidence):
         else:
             return "Some concerns detected but with lower confidence. Monitor plant closely and check growing conditions (light, water, soil, temperature)."
 
+def create_app(initialize_in_background=True):
+    """Application factory for WSGI servers.
+
+    By default the model is loaded and warmed up on a background thread so
+    liveness (/health) answers immediately while readiness (/ready) waits.
+    With gunicorn's preload_app (see gunicorn.conf.py) the model is instead
+    loaded synchronously in the master before workers are forked, so all
+    workers share the loaded weights, and each worker warms up after fork.
+    """
+    if initialize_in_background:
+        start_model_initialization()
+    elif model is None:
+        load_ml_model()
+    return app
+
 if __name__ == '__main__':
-    load_ml_model()
+    initialize_model()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,396 @@
+"""
+ASGI entry point for asyncio servers, e.g. `uvicorn asgi:app --host 0.0.0.0 --port 5000`
+
+Request bodies are received on the event loop, so slow uploads only cost an
+open connection rather than a blocked worker thread. Everything CPU-bound
+(JSON parsing, base64 and image decoding, validation, model prediction and
+response encoding) runs on a bounded thread pool. NumPy, Pillow and the
+model release the GIL for the heavy lifting, and requests running on pool
+threads still meet in the shared micro-batching queue.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as backend
+from sensor_stream import DROPPED_FRAME, KEEPALIVE_FRAME
+
+# Threads running CPU-bound request work; at least BATCH_MAX_SIZE so the batcher can fill a batch
+ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', max(backend.BATCH_MAX_SIZE, os.cpu_count() or 1)))
+# Requests allowed to queue for a pool thread at once; the rest wait on the event loop
+ASGI_MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', str(2 * ASGI_WORKER_THREADS)))
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+]
+
+
+class BoundedExecutor:
+    """Thread pool whose backlog is capped by a semaphore, so waiting requests stay on the event loop"""
+
+    def __init__(self, max_workers, max_pending):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi-worker')
+        self.max_pending = max(max_workers, max_pending)
+        self._slots = None
+
+    async def run(self, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+executor = BoundedExecutor(ASGI_WORKER_THREADS, ASGI_MAX_PENDING)
+# Threads encoding /export downloads, kept apart so exports never take a slot from /analyze
+export_pool = ThreadPoolExecutor(max_workers=backend.EXPORT_MAX_CONCURRENT, thread_name_prefix='asgi-export')
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+async def read_body(scope, receive, limit):
+    """Collect the request body without blocking the event loop, refusing it once it passes ``limit`` bytes"""
+    content_length = dict(scope['headers']).get(b'content-length')
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        raise BodyTooLarge()
+    chunks = []
+    total = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        total += len(chunk)
+        if total > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def send_response(send, status_code, body, content_type=b'application/json', extra_headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(body)).encode()),
+            *CORS_HEADERS,
+            *extra_headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, result, status_code=200, extra_headers=()):
+    await send_response(send, status_code, json.dumps(result).encode(), extra_headers=extra_headers)
+
+
+async def start_streaming_response(send, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            *[(name.lower().encode(), value.encode('latin-1')) for name, value in headers.items()],
+            *CORS_HEADERS,
+        ],
+    })
+
+
+async def watch_disconnect(receive):
+    """Completes once the client has gone away"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+@backend.request_logs.track('analyze')
+def analyze_body(body):
+    """Parse, analyze and encode one /analyze body on a pool thread; returns (bytes, status_code)"""
+    try:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            backend.ANALYSIS_OUTCOMES.labels('invalid_input').inc()
+            return json.dumps({'error': 'Invalid JSON body'}).encode(), 400
+        result, status_code = backend.analyze_payload(data)
+        started = time.perf_counter()
+        encoded = json.dumps(result).encode()
+        backend.observe_stage('serialize', started)
+        return encoded, status_code
+    except Exception as e:
+        backend.logger.error(f"Error in analysis endpoint: {str(e)}")
+        backend.ANALYSIS_OUTCOMES.labels('error').inc()
+        return json.dumps(backend.ANALYSIS_FAILED_RESPONSE).encode(), 500
+
+
+async def analyze(scope, receive, send):
+    request_started = time.perf_counter()
+    try:
+        try:
+            body = await read_body(scope, receive, backend.MAX_REQUEST_BYTES)
+        except BodyTooLarge:
+            backend.ANALYSIS_OUTCOMES.labels('request_too_large').inc()
+            await send_json(send, backend.REQUEST_TOO_LARGE_RESPONSE, 413)
+            return
+        if body is None:
+            # Client went away mid-upload
+            return
+        backend.REQUEST_BYTES.observe(len(body))
+        encoded, status_code = await executor.run(analyze_body, body)
+        await send_response(send, status_code, encoded)
+    finally:
+        backend.REQUEST_SECONDS.labels('analyze').observe(time.perf_counter() - request_started)
+
+
+@backend.request_logs.track('analyze_tensor')
+def analyze_tensor_body(body, params):
+    """Analyze and encode one /analyze/tensor body on a pool thread; returns (bytes, status_code)"""
+    try:
+        result, status_code = backend.analyze_tensor_payload(body, params)
+        return json.dumps(result).encode(), status_code
+    except Exception as e:
+        backend.logger.error(f"Error in tensor analysis endpoint: {str(e)}")
+        backend.ANALYSIS_OUTCOMES.labels('error').inc()
+        return json.dumps(backend.ANALYSIS_FAILED_RESPONSE).encode(), 500
+
+
+async def analyze_tensor(scope, receive, send):
+    request_started = time.perf_counter()
+    try:
+        try:
+            body = await read_body(scope, receive, backend.TENSOR_MAX_REQUEST_BYTES)
+        except BodyTooLarge:
+            backend.ANALYSIS_OUTCOMES.labels('request_too_large').inc()
+            await send_json(send, backend.TENSOR_TOO_LARGE_RESPONSE, 413)
+            return
+        if body is None:
+            return
+        backend.REQUEST_BYTES.observe(len(body))
+        encoded, status_code = await executor.run(analyze_tensor_body, body, query_params(scope))
+        await send_response(send, status_code, encoded)
+    finally:
+        backend.REQUEST_SECONDS.labels('analyze_tensor').observe(time.perf_counter() - request_started)
+
+
+def request_headers(scope):
+    return {name.decode('latin-1').title(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def query_params(scope):
+    return {name: values[-1] for name, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+
+
+async def reload_model(scope, receive, send):
+    result, status_code = backend.request_model_reload(backend.admin_token_from_headers(request_headers(scope)))
+    await send_json(send, result, status_code)
+
+
+async def health(scope, receive, send):
+    await send_json(send, backend.health_status())
+
+
+async def ready(scope, receive, send):
+    result, status_code = backend.readiness_status()
+    await send_json(send, result, status_code)
+
+
+async def test_prediction(scope, receive, send):
+    result, status_code = await executor.run(backend.run_test_prediction)
+    await send_json(send, result, status_code)
+
+
+async def prometheus_metrics(scope, receive, send):
+    await send_response(send, 200, backend.metrics_registry.render().encode(), backend.metrics.CONTENT_TYPE.encode())
+
+
+def ingest_sensor_body(body):
+    result, status_code = backend.ingest_sensor_body(body.decode('utf-8', errors='replace'))
+    return json.dumps(result).encode(), status_code
+
+
+async def ingest_sensor_data(scope, receive, send):
+    if not backend.sensor_ingest_authorized(request_headers(scope)):
+        await send_json(send, {'error': 'Unauthorized'}, 401)
+        return
+    try:
+        body = await read_body(scope, receive, backend.SENSOR_MAX_INGEST_BYTES)
+    except BodyTooLarge:
+        await send_json(send, backend.SENSOR_INGEST_TOO_LARGE_RESPONSE, 413)
+        return
+    if body is None:
+        return
+    encoded, status_code = await executor.run(ingest_sensor_body, body)
+    await send_response(send, status_code, encoded)
+
+
+async def latest_sensor_data(scope, receive, send):
+    params = query_params(scope)
+    result, status_code = backend.latest_sensor_payload(params.get('device_id', backend.DEFAULT_DEVICE_ID))
+    await send_json(send, result, status_code)
+
+
+async def last30_sensor_data(scope, receive, send):
+    params = query_params(scope)
+    result, status_code = backend.last_sensor_payload(params.get('device_id', backend.DEFAULT_DEVICE_ID), '30')
+    await send_json(send, result, status_code)
+
+
+async def last_sensor_data(scope, receive, send):
+    params = query_params(scope)
+    result, status_code = backend.last_sensor_payload(params.get('device_id', backend.DEFAULT_DEVICE_ID), params.get('n', '30'))
+    await send_json(send, result, status_code)
+
+
+async def range_sensor_data(scope, receive, send):
+    result, status_code = await executor.run(backend.range_sensor_payload, query_params(scope))
+    await send_json(send, result, status_code)
+
+
+async def rollup_sensor_data(scope, receive, send):
+    result, status_code = await executor.run(backend.rollup_sensor_payload, query_params(scope))
+    await send_json(send, result, status_code)
+
+
+async def sensor_alerts(scope, receive, send):
+    result, status_code = backend.alerts_payload(query_params(scope))
+    await send_json(send, result, status_code)
+
+
+async def sensor_alert_stats(scope, receive, send):
+    result, status_code = backend.alert_stats_payload(query_params(scope))
+    await send_json(send, result, status_code)
+
+
+async def stream_sensor_data(scope, receive, send):
+    """Server-sent events of new readings; an idle stream costs one coroutine, not a thread"""
+    params = query_params(scope)
+    last_event_id = request_headers(scope).get('Last-Event-Id') or params.get('last_event_id')
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    subscriber, initial = backend.sensor_events.subscribe(
+        params.get('device_id'), last_event_id, notify=lambda: loop.call_soon_threadsafe(wake.set))
+    if subscriber is None:
+        await send_json(send, {'error': 'Too many stream clients', 'message': 'Please poll /data/latest instead.'}, 503)
+        return
+
+    disconnected = asyncio.ensure_future(watch_disconnect(receive))
+    try:
+        await start_streaming_response(send, {'Content-Type': 'text/event-stream; charset=utf-8', **backend.SSE_HEADERS})
+        chunk = f"retry: {backend.SSE_RETRY_MS}\n\n" + initial
+        while not disconnected.done():
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            if subscriber.dropped:
+                break
+            woken = asyncio.ensure_future(wake.wait())
+            await asyncio.wait([woken, disconnected], timeout=backend.SSE_KEEPALIVE_SECONDS,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not woken.done():
+                woken.cancel()
+                chunk = KEEPALIVE_FRAME
+                continue
+            wake.clear()
+            chunk = subscriber.drain()
+            if subscriber.dropped:
+                chunk += DROPPED_FRAME
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+        backend.sensor_events.unsubscribe(subscriber)
+
+
+def export_handler(kind):
+    async def export(scope, receive, send):
+        """Stream an export, encoding each chunk on the export pool while the event loop sends the last one"""
+        body, status_code, headers = backend.export_stream(kind, query_params(scope), request_headers(scope).get('Accept-Encoding'))
+        if status_code != 200:
+            await send_json(send, body, status_code, [(name.lower().encode(), value.encode()) for name, value in headers.items()])
+            return
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.ensure_future(watch_disconnect(receive))
+        try:
+            await start_streaming_response(send, headers)
+            while not disconnected.done():
+                chunk = await loop.run_in_executor(export_pool, next, body, None)
+                if chunk is None:
+                    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            disconnected.cancel()
+            body.close()
+            backend.export_slots.release()
+    return export
+
+
+ROUTES = {
+    '/analyze': ('POST', analyze),
+    '/analyze/tensor': ('POST', analyze_tensor),
+    '/health': ('GET', health),
+    '/ready': ('GET', ready),
+    '/test-prediction': ('GET', test_prediction),
+    '/metrics': ('GET', prometheus_metrics),
+    '/admin/reload-model': ('POST', reload_model),
+    '/data/ingest': ('POST', ingest_sensor_data),
+    '/data/latest': ('GET', latest_sensor_data),
+    '/data/last30': ('GET', last30_sensor_data),
+    '/data/last': ('GET', last_sensor_data),
+    '/data/range': ('GET', range_sensor_data),
+    '/data/rollups': ('GET', rollup_sensor_data),
+    '/data/stream': ('GET', stream_sensor_data),
+    '/alerts': ('GET', sensor_alerts),
+    '/alerts/stats': ('GET', sensor_alert_stats),
+    '/export/sensors': ('GET', export_handler('sensors')),
+    '/export/analyses': ('GET', export_handler('analyses')),
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # /health answers at once; /ready turns 200 after load and warm-up
+            backend.start_model_initialization()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown()
+            export_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application serving the routes in ROUTES: analysis, health, metrics, model reload and sensor data"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    route = ROUTES.get(scope['path'])
+    if route is None:
+        await send_json(send, {'error': 'Not found'}, 404)
+        return
+
+    method, handler = route
+    if scope['method'] == 'OPTIONS':
+        # CORS preflight, matching flask_cors' allow-all defaults
+        requested = dict(scope['headers']).get(b'access-control-request-headers', b'')
+        await send_response(send, 200, b'', extra_headers=[
+            (b'access-control-allow-methods', f'{method}, OPTIONS'.encode()),
+            (b'access-control-allow-headers', requested),
+        ])
+        return
+    if scope['method'] != method and not (method == 'GET' and scope['method'] == 'HEAD'):
+        await send_json(send, {'error': 'Method not allowed'}, 405)
+        return
+    await handler(scope, receive, send)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Offline batch scoring of a directory of leaf photos
+
+Runs the same header check, decode, validation, preprocessing and
+prediction interpretation as POST /analyze over every image under a
+directory, without a server. Worker processes read, validate and resize
+images, and send back uint8 pixels (a quarter of the float32 tensor's
+size to pickle across processes). The parent scales them to 0-1 while
+grouping them into batches, which reach the model through a bounded
+prefetch queue, so later batches are decoded while the current one is in
+the forward pass, and memory use does not grow with the directory.
+
+Results are appended to a JSONL or CSV file after every batch. Rerunning
+the same command skips the images already in the output, so an
+interrupted run picks up where it stopped. A batch whose forward pass
+fails is recorded as prediction_failed and the run goes on.
+
+Example:
+    MODEL_BACKEND=numpy python batch_score.py /data/greenhouse --output scores.jsonl --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.mpo')
+OUTPUT_FORMATS = ('jsonl', 'csv')
+# Same fields as the analysis history (see record_analysis in app.py), keyed by path
+OUTPUT_FIELDS = ('path', 'outcome', 'prediction', 'is_healthy', 'confidence', 'raw_prediction', 'model_version', 'message')
+
+# The app module, imported once per worker process by load_app()
+app_module = None
+
+
+def load_app():
+    """Worker initializer: import app (already imported after a fork) and leave Ctrl-C to the parent"""
+    global app_module
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import app
+    app_module = app
+
+
+def prepare_image(path):
+    """Read, check, decode, validate and resize one file in a worker process.
+
+    Returns (pixels, outcome, message); pixels is a (224, 224, 3) uint8
+    array, None unless the image passed validation. Outcomes use the names
+    of plant_analysis_outcomes_total.
+    """
+    try:
+        with open(path, 'rb') as f:
+            # One byte past the limit is enough for the header check to reject oversized files
+            image_data = f.read(app_module.MAX_IMAGE_BYTES + 1)
+    except OSError as e:
+        return None, 'error', str(e)
+
+    is_valid, message, header = app_module.check_image_header(image_data)
+    if is_valid:
+        decoded_image = app_module.decode_plant_image(image_data, header)
+        is_valid, message = app_module.validate_plant_image(decoded_image)
+    if not is_valid:
+        return None, 'rejected_' + app_module.REJECTION_REASONS.get(message, 'other'), message
+
+    # Same resize as preprocess_image_for_model; scaling to 0-1 happens in the parent (see batch_tensor)
+    try:
+        pixels = np.asarray(decoded_image.image.resize(app_module.MODEL_INPUT_SIZE), dtype=np.uint8)
+    except Exception:
+        return None, 'preprocess_failed', 'Error processing image for analysis'
+    return pixels, 'accepted', None
+
+
+def find_images(root):
+    """Paths of image files under ``root``, relative to it, in a stable order"""
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(directory, name), root))
+    return found
+
+
+def completed_paths(output_path, output_format):
+    """Paths already scored by an earlier run, after dropping a last line cut off by an interruption"""
+    if not os.path.exists(output_path):
+        return set()
+    lines = []
+    with open(output_path, 'r+b') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                f.truncate(sum(len(complete) for complete in lines))
+                break
+            lines.append(line)
+    text = [line.decode('utf-8') for line in lines]
+    if output_format == 'csv':
+        return {row['path'] for row in csv.DictReader(text)}
+    return {json.loads(line)['path'] for line in text if line.strip()}
+
+
+class ResultWriter:
+    """Appends result rows to a JSONL or CSV file, flushed after every batch"""
+
+    def __init__(self, path, output_format):
+        self.format = output_format
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        if output_format == 'csv':
+            self._csv = csv.DictWriter(self._file, OUTPUT_FIELDS, lineterminator='\n')
+            if self._file.tell() == 0:
+                self._csv.writeheader()
+
+    def write(self, rows):
+        if self.format == 'csv':
+            self._csv.writerows(rows)
+        else:
+            self._file.write(''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def prepared_images(pool, root, paths, max_in_flight):
+    """(path, pixels, outcome, message) for each path in order, with at most ``max_in_flight`` files in the pool"""
+    pending = deque()
+    for path in paths:
+        pending.append((path, pool.submit(prepare_image, os.path.join(root, path))))
+        if len(pending) >= max_in_flight:
+            done_path, future = pending.popleft()
+            yield (done_path, *future.result())
+    while pending:
+        done_path, future = pending.popleft()
+        yield (done_path, *future.result())
+
+
+def fill_batches(items, batch_size, batches):
+    """Producer thread: put lists of ``batch_size`` items on the bounded queue, then None (or the exception raised)"""
+    try:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                batches.put(batch)
+                batch = []
+        if batch:
+            batches.put(batch)
+        batches.put(None)
+    except BaseException as e:
+        batches.put(e)
+
+
+def batch_tensor(pixel_arrays):
+    """Model input for a list of (224, 224, 3) uint8 arrays, scaled to 0-1 exactly like preprocess_image_for_model"""
+    batch = np.empty((len(pixel_arrays), *pixel_arrays[0].shape), dtype=np.float32)
+    for row, pixels in zip(batch, pixel_arrays):
+        np.divide(pixels, np.float32(255.0), out=row)
+    return batch
+
+
+def score_batch(batch):
+    """Run the accepted images of one batch through a single forward pass; returns output rows.
+
+    If the forward pass raises, the batch's accepted images get the
+    prediction_failed outcome with the error as message.
+    """
+    accepted = [i for i, (_, pixels, _, _) in enumerate(batch) if pixels is not None]
+    prediction_values = {}
+    prediction_error = None
+    if accepted:
+        try:
+            predictions = app_module.predict_batch(batch_tensor([batch[i][1] for i in accepted]))
+            prediction_values = {i: float(prediction[0]) for i, prediction in zip(accepted, predictions)}
+        except Exception as e:
+            prediction_error = f"Prediction failed: {e}"
+            print(f"⚠️  {prediction_error} (batch starting at {batch[accepted[0]][0]})")
+
+    rows = []
+    for i, (path, pixels, outcome, message) in enumerate(batch):
+        row = dict.fromkeys(OUTPUT_FIELDS)
+        row.update(path=path, outcome=outcome, message=message, model_version=app_module.model_version)
+        if prediction_error is not None and pixels is not None:
+            row.update(outcome='prediction_failed', message=prediction_error)
+        elif i in prediction_values:
+            result = app_module.build_analysis_result(*app_module.interpret_prediction(prediction_values[i]), prediction_values[i])
+            row.update(prediction=result['prediction'], is_healthy=result['is_healthy'],
+                       confidence=result['confidence'], raw_prediction=result['model_info']['raw_prediction_value'])
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every leaf image under a directory with the plant health model")
+    parser.add_argument('input', help=f"directory searched recursively for {', '.join(IMAGE_EXTENSIONS[:-1])} "
+                                      f"and {IMAGE_EXTENSIONS[-1]} files")
+    parser.add_argument('--output', default='batch_scores.jsonl', help="results file, appended to (default: %(default)s)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, help="output format (default: from the --output extension)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="decode/validate processes (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=32, help="images per forward pass (default: %(default)s)")
+    parser.add_argument('--prefetch', type=int, default=4, help="prepared batches queued ahead of the model (default: %(default)s)")
+    parser.add_argument('--restart', action='store_true', help="discard an existing output file instead of resuming it")
+    parser.add_argument('--progress-seconds', type=float, default=10.0, help="interval between progress lines")
+    args = parser.parse_args()
+
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    if not os.path.isdir(args.input):
+        print(f"❌ {args.input} is not a directory")
+        return 1
+
+    # Imported here so environment variables (MODEL_BACKEND, MODEL_PATH, ...) apply
+    global app_module
+    import app
+    app_module = app
+
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    paths = find_images(args.input)
+    done = completed_paths(args.output, output_format)
+    todo = [path for path in paths if path not in done]
+    print(f"📂 {len(paths)} images under {args.input}; {len(paths) - len(todo)} already in {args.output}, {len(todo)} to score")
+    if not todo:
+        return 0
+
+    workers = max(1, args.workers)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=load_app)
+    writer = None
+    try:
+        # Start the workers before the model loads: forking a process with TensorFlow's threads running is unsafe
+        pool.submit(int).result()
+        app_module.load_ml_model()
+        if app_module.model is None:
+            print("❌ Model could not be loaded; check MODEL_BACKEND / MODEL_PATH / NUMPY_MODEL_PATH")
+            return 1
+
+        batches = queue.Queue(maxsize=max(1, args.prefetch))
+        items = prepared_images(pool, args.input, todo, max_in_flight=workers * 2)
+        threading.Thread(target=fill_batches, args=(items, max(1, args.batch_size), batches),
+                         name='batch-prefetch', daemon=True).start()
+
+        writer = ResultWriter(args.output, output_format)
+        outcomes = {}
+        scored = 0
+        started = last_report = time.perf_counter()
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            rows = score_batch(batch)
+            writer.write(rows)
+            for row in rows:
+                outcomes[row['outcome']] = outcomes.get(row['outcome'], 0) + 1
+            scored += len(rows)
+
+            now = time.perf_counter()
+            if now - last_report >= args.progress_seconds:
+                last_report = now
+                print(f"  {scored}/{len(todo)} images, {scored / (now - started):.1f} images/s, "
+                      f"prefetch queue {batches.qsize()}/{batches.maxsize}")
+
+        elapsed = time.perf_counter() - started
+        print(f"\n✅ Scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} images/s) with model {app_module.model_version}")
+        for outcome, count in sorted(outcomes.items()):
+            print(f"  {outcome}: {count}")
+        print(f"Results appended to {args.output}")
+        return 0
+    except KeyboardInterrupt:
+        print(f"\n⏹️  Interrupted; rerun the same command to resume from {args.output}")
+        return 130
+    finally:
+        if writer is not None:
+            writer.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Dynamic micro-batching scheduler for plant health classifier inference
+"""
+
+import threading
+import time
+import queue
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingPrediction:
+    """A single caller's tensor waiting for its slice of a batched forward pass"""
+
+    __slots__ = ('tensor', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBatcher:
+    """Collect preprocessed tensors from concurrent requests into one forward pass.
+
+    A single worker thread waits for the first pending tensor, then keeps
+    collecting until either ``max_batch_size`` samples are queued or
+    ``max_wait_ms`` has elapsed, runs ``predict_fn`` once on the stacked batch
+    and hands every caller back its own sigmoid value.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._samples = 0
+        self._last_batch_size = 0
+        self._largest_batch_size = 0
+        self._batch_size_counts = {}
+        self._total_wait = 0.0
+
+    def start(self):
+        """Start the worker thread if it is not already running"""
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+                self._worker.start()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a pre-forked worker restarts its own
+        if self._worker is None or not self._worker.is_alive():
+            self.start()
+
+    def submit(self, tensor):
+        """Queue a (1, H, W, C) tensor and block until its prediction is ready"""
+        self._ensure_worker()
+        pending = _PendingPrediction(tensor)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def submit_many(self, tensors):
+        """Queue several (1, H, W, C) tensors at once and block until all predictions are ready"""
+        self._ensure_worker()
+        pendings = [_PendingPrediction(tensor) for tensor in tensors]
+        for pending in pendings:
+            self._queue.put(pending)
+        for pending in pendings:
+            pending.done.wait()
+        for pending in pendings:
+            if pending.error is not None:
+                raise pending.error
+        return [pending.result for pending in pendings]
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            try:
+                inputs = np.concatenate([pending.tensor for pending in batch], axis=0)
+                predictions = np.asarray(self.predict_fn(inputs)).reshape(len(batch), -1)
+                for pending, prediction in zip(batch, predictions):
+                    pending.result = prediction[0]
+            except Exception as e:
+                logger.error(f"Batched prediction failed for {len(batch)} samples: {str(e)}")
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+            self._record_batch(batch, started)
+
+    def _record_batch(self, batch, started):
+        size = len(batch)
+        with self._stats_lock:
+            self._batches += 1
+            self._samples += size
+            self._last_batch_size = size
+            self._largest_batch_size = max(self._largest_batch_size, size)
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+            self._total_wait += sum(started - pending.enqueued_at for pending in batch)
+
+    def stats(self):
+        """Queue depth and achieved batch sizes for throughput/latency tuning"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches_run': self._batches,
+                'samples_predicted': self._samples,
+                'last_batch_size': self._last_batch_size,
+                'largest_batch_size': self._largest_batch_size,
+                'average_batch_size': round(self._samples / self._batches, 2) if self._batches else 0.0,
+                'average_queue_wait_ms': round(self._total_wait / self._samples * 1000.0, 3) if self._samples else 0.0,
+                'batch_size_counts': dict(sorted(self._batch_size_counts.items())),
+            }
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Load-generation benchmark for the plant health classifier backend
+
+Generates synthetic leaf-like photos at several resolutions and formats,
+drives POST /analyze through Flask's test client at configurable
+concurrency and reports p50/p95/p99 latency, requests per second, RSS
+sampled during each scenario and a per-stage timing breakdown. A scenario
+whose image is rejected or whose requests do not all return 200 is marked
+invalid rather than timed. Results are written as JSON so runs from
+different versions can be compared offline (see --baseline).
+
+Example:
+    MODEL_BACKEND=numpy python benchmark.py --concurrency 1,8 --output bench.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESOLUTIONS = {
+    '640px': (640, 480),
+    '2mp': (1632, 1224),
+    '12mp': (4000, 3000),
+}
+FORMATS = {'jpeg': 'JPEG', 'png': 'PNG'}
+STAGES = ['base64_decode', 'image_decode', 'validate', 'preprocess', 'predict', 'serialize']
+# Texture grain sizes tried, finest first, until the encoded image fits under the upload limit
+TEXTURE_BLOCKS = (1, 2, 4, 8, 16)
+
+
+class ScenarioError(Exception):
+    """The scenario cannot produce meaningful timings (rejected image, non-200 responses)"""
+
+
+def synthetic_leaf_image(width, height, image_format, seed=0, texture_block=1):
+    """Encode a leaf-like photo: smooth green shading, fine texture and a few brown lesions.
+
+    The texture is random per ``texture_block`` x ``texture_block`` pixel
+    square; coarser grain compresses better, which keeps lossless PNGs of
+    large photos under the upload limit at their full resolution.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Low-frequency shading field upsampled to full resolution
+    field = rng.random((height // 64 + 2, width // 64 + 2)).astype(np.float32)
+    shade = np.asarray(Image.fromarray(field, mode='F').resize((width, height), Image.BILINEAR))
+
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    for channel, (base, depth) in enumerate([(50, 40), (120, 70), (40, 30)]):
+        values = (base + depth * shade).astype(np.int16)
+        grain = rng.integers(-18, 18, size=(-(-height // texture_block), -(-width // texture_block)), dtype=np.int16)
+        values += np.repeat(np.repeat(grain, texture_block, axis=0), texture_block, axis=1)[:height, :width]
+        np.clip(values, 0, 255, out=values)
+        pixels[:, :, channel] = values
+
+    # Brown lesions so "affected" features are present
+    for _ in range(6):
+        cy, cx = rng.integers(0, height), rng.integers(0, width)
+        radius = int(min(width, height) * rng.uniform(0.02, 0.06))
+        top, bottom = max(0, cy - radius), min(height, cy + radius)
+        left, right = max(0, cx - radius), min(width, cx + radius)
+        ys, xs = np.ogrid[top:bottom, left:right]
+        mask = (ys - cy) ** 2 + (xs - cx) ** 2 <= radius ** 2
+        pixels[top:bottom, left:right][mask] = (120, 85, 40)
+
+    buffer = io.BytesIO()
+    save_options = {'quality': 90} if image_format == 'JPEG' else {}
+    Image.fromarray(pixels).save(buffer, image_format, **save_options)
+    return buffer.getvalue()
+
+
+def fitting_leaf_image(width, height, image_format, max_bytes):
+    """(image bytes, texture block) of the finest-grained synthetic image within ``max_bytes``.
+
+    Raises ScenarioError when even the coarsest texture is too large.
+    """
+    for texture_block in TEXTURE_BLOCKS:
+        image_bytes = synthetic_leaf_image(width, height, image_format, texture_block=texture_block)
+        if len(image_bytes) <= max_bytes:
+            return image_bytes, texture_block
+    raise ScenarioError(f"{width}x{height} {image_format} is {len(image_bytes)} bytes even with "
+                        f"{TEXTURE_BLOCKS[-1]}px texture; the upload limit is {max_bytes}")
+
+
+def unique_payload(image_bytes, request_id):
+    """JSON body for /analyze with a unique trailer after the image's end marker.
+
+    JPEG and PNG decoders ignore trailing bytes, so every request still runs
+    the full pipeline instead of being answered by the result cache.
+    """
+    data = image_bytes + f"bench-{request_id}".encode()
+    return {'image': 'data:image/octet-stream;base64,' + base64.b64encode(data).decode()}
+
+
+def peak_rss_mb():
+    """Peak RSS over the whole process lifetime"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def current_rss_mb():
+    """Resident set size right now, from /proc (Linux); None elsewhere"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """Samples RSS on a background thread while a scenario runs.
+
+    ru_maxrss only ever grows over the process lifetime, so after the first
+    large scenario it says nothing about later ones. Spikes shorter than
+    ``interval`` seconds can be missed.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_mb = self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def result(self):
+        if self.start_mb is None:
+            return {'rss_start_mb': None, 'rss_peak_mb': None, 'rss_growth_mb': None}
+        return {
+            'rss_start_mb': round(self.start_mb, 1),
+            'rss_peak_mb': round(self.peak_mb, 1),
+            'rss_growth_mb': round(self.peak_mb - self.start_mb, 1),
+        }
+
+
+def percentiles(samples_ms):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'p50': round(float(np.percentile(values, 50)), 2),
+        'p95': round(float(np.percentile(values, 95)), 2),
+        'p99': round(float(np.percentile(values, 99)), 2),
+        'mean': round(float(values.mean()), 2),
+        'max': round(float(values.max()), 2),
+    }
+
+
+def run_load(app_module, name, image_bytes, requests, concurrency):
+    """Fire `requests` POST /analyze calls from `concurrency` threads; returns latencies and status counts"""
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one_request(request_id):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        payload = unique_payload(image_bytes, f"{name}-{request_id}")
+        started = time.perf_counter()
+        response = client.post('/analyze', json=payload)
+        elapsed = (time.perf_counter() - started) * 1000.0
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(requests)))
+    wall_seconds = time.perf_counter() - started
+    return latencies, statuses, wall_seconds
+
+
+def profile_stages(app_module, image_bytes, samples):
+    """Time each pipeline stage in isolation, sequentially, on `samples` runs"""
+    timings = {stage: [] for stage in STAGES}
+    encoded = unique_payload(image_bytes, 'stages')['image']
+    for _ in range(samples):
+        started = time.perf_counter()
+        image_data = base64.b64decode(encoded.split(',')[1])
+        timings['base64_decode'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        decoded = app_module.decode_plant_image(image_data)
+        timings['image_decode'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        is_valid, message = app_module.validate_plant_image(decoded)
+        timings['validate'].append(time.perf_counter() - started)
+        if not is_valid:
+            raise ScenarioError(f"image rejected by validation: {message}")
+
+        started = time.perf_counter()
+        processed = app_module.preprocess_image_for_model(decoded)
+        timings['preprocess'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        prediction = app_module.predict_batch(processed)
+        timings['predict'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        prediction_value = float(prediction[0][0])
+        result = app_module.build_analysis_result(*app_module.interpret_prediction(prediction_value), prediction_value)
+        json.dumps(result)
+        timings['serialize'].append(time.perf_counter() - started)
+
+    return {stage: percentiles([t * 1000.0 for t in values]) for stage, values in timings.items() if values}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    previous = {scenario['name']: scenario for scenario in baseline.get('scenarios', []) if scenario.get('valid', True)}
+    print(f"\n📊 Compared with {baseline_path} ({baseline.get('meta', {}).get('git_revision')})")
+    for scenario in results['scenarios']:
+        before = previous.get(scenario['name'])
+        if before is None or not scenario['valid']:
+            continue
+        print(f"  {scenario['name']}: "
+              f"p50 {before['latency_ms']['p50']:.1f} -> {scenario['latency_ms']['p50']:.1f} ms, "
+              f"p99 {before['latency_ms']['p99']:.1f} -> {scenario['latency_ms']['p99']:.1f} ms, "
+              f"{before['requests_per_second']:.1f} -> {scenario['requests_per_second']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark POST /analyze with synthetic leaf images")
+    parser.add_argument('--requests', type=int, default=40, help="requests per scenario (default: %(default)s)")
+    parser.add_argument('--concurrency', default='1,4,16', help="comma-separated client concurrency levels")
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS), help="comma-separated: " + ', '.join(RESOLUTIONS))
+    parser.add_argument('--formats', default=','.join(FORMATS), help="comma-separated: " + ', '.join(FORMATS))
+    parser.add_argument('--stage-samples', type=int, default=5, help="sequential runs used for the per-stage breakdown")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the JSON results")
+    parser.add_argument('--baseline', help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    # Imported here so environment variables (MODEL_BACKEND, BATCH_MAX_SIZE, ...) apply
+    import app as app_module
+
+    app_module.initialize_model()
+    if app_module.model is None:
+        print("❌ Model could not be loaded; check MODEL_BACKEND / MODEL_PATH / NUMPY_MODEL_PATH")
+        return 1
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model_backend': app_module.MODEL_BACKEND,
+            'batch_max_size': app_module.BATCH_MAX_SIZE,
+            'batch_max_wait_ms': app_module.BATCH_MAX_WAIT_MS,
+            'requests_per_scenario': args.requests,
+        },
+        'scenarios': []
+    }
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    for resolution in args.resolutions.split(','):
+        width, height = RESOLUTIONS[resolution]
+        for format_name in args.formats.split(','):
+            image_bytes, texture_block, stages, image_error = None, None, {}, None
+            try:
+                image_bytes, texture_block = fitting_leaf_image(width, height, FORMATS[format_name], app_module.MAX_IMAGE_BYTES)
+                stages = profile_stages(app_module, image_bytes, args.stage_samples)
+            except ScenarioError as e:
+                image_error = str(e)
+            for concurrency in concurrency_levels:
+                name = f"{resolution}-{format_name}-c{concurrency}"
+                scenario = {
+                    'name': name,
+                    'resolution': [width, height],
+                    'format': format_name,
+                    'image_bytes': len(image_bytes) if image_bytes is not None else None,
+                    'texture_block': texture_block,
+                    'concurrency': concurrency,
+                    'requests': args.requests,
+                    'valid': image_error is None,
+                    'error': image_error,
+                }
+                results['scenarios'].append(scenario)
+                if image_error is not None:
+                    print(f"  ⚠️  {name}: invalid, {image_error}")
+                    continue
+
+                with RssSampler() as rss:
+                    latencies, statuses, wall_seconds = run_load(app_module, name, image_bytes, args.requests, concurrency)
+                scenario['status_counts'] = statuses
+                if statuses != {'200': args.requests}:
+                    # Timings of rejected or failed requests say nothing about the pipeline being measured
+                    scenario.update(valid=False, error=f"not every request returned 200: {statuses}")
+                    print(f"  ⚠️  {name}: invalid, {scenario['error']}")
+                    continue
+                scenario.update(
+                    latency_ms=percentiles(latencies),
+                    requests_per_second=round(args.requests / wall_seconds, 2),
+                    stages_ms=stages,
+                    **rss.result(),
+                )
+                print(f"  {name}: p50 {scenario['latency_ms']['p50']:.1f} ms, "
+                      f"p95 {scenario['latency_ms']['p95']:.1f} ms, p99 {scenario['latency_ms']['p99']:.1f} ms, "
+                      f"{scenario['requests_per_second']:.1f} req/s, peak RSS {scenario['rss_peak_mb']} MB "
+                      f"(+{scenario['rss_growth_mb']} MB)")
+
+    results['meta']['process_peak_rss_mb'] = peak_rss_mb()
+    results['inference_queue'] = app_module.inference_batcher.stats()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.baseline:
+        print_comparison(results, args.baseline)
+    invalid = [scenario['name'] for scenario in results['scenarios'] if not scenario['valid']]
+    if invalid:
+        print(f"\n❌ {len(invalid)} invalid scenario(s): {', '.join(invalid)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of the model forward-pass implementations
+
+Compares Keras ``model.predict`` with the compiled, shape-bucketed path in
+compiled_model.py (with and without XLA) and optionally the pure-NumPy
+engine, at several batch sizes. Sizes that are not a bucket (e.g. 3) show
+the cost of padding. Also reports the largest output difference from
+``model.predict`` so a faster path that is wrong is easy to spot.
+
+Example:
+    python benchmark_inference.py --batch-sizes 1,3,8,16 --iterations 50 --output inference.json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmark import git_revision, percentiles
+from compiled_model import DEFAULT_BATCH_BUCKETS, CompiledKerasModel
+
+
+def time_calls(predict, batch, iterations, warmup=3):
+    for _ in range(warmup):
+        predict(batch)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        predict(batch)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model.predict against compiled bucketed inference")
+    parser.add_argument('--model', default='../plant_health_classifier.h5', help="Keras model file")
+    parser.add_argument('--numpy-weights', help="also time the NumPy engine with this model.json or .npz")
+    parser.add_argument('--batch-sizes', default='1,3,8,16', help="comma-separated batch sizes")
+    parser.add_argument('--buckets', default=','.join(str(size) for size in DEFAULT_BATCH_BUCKETS),
+                        help="comma-separated compiled batch buckets")
+    parser.add_argument('--iterations', type=int, default=50, help="timed calls per engine and batch size")
+    parser.add_argument('--output', default='inference_benchmark.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(args.model)
+    buckets = [int(size) for size in args.buckets.split(',')]
+    engines = {'keras_predict': lambda batch: keras_model.predict(batch, verbose=0)}
+
+    for name, jit_compile in (('compiled', False), ('compiled_xla', True)):
+        started = time.perf_counter()
+        compiled = CompiledKerasModel(keras_model, buckets=buckets, jit_compile=jit_compile)
+        print(f"  {name}: traced {len(buckets)} buckets in {time.perf_counter() - started:.1f}s (XLA: {compiled.jit_compile})")
+        if jit_compile and not compiled.jit_compile:
+            continue
+        engines[name] = compiled.predict
+
+    if args.numpy_weights:
+        from numpy_model import NumpyPlantHealthModel
+        engines['numpy'] = NumpyPlantHealthModel.load(args.numpy_weights).predict
+
+    rng = np.random.default_rng(0)
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_revision': git_revision(),
+            'buckets': buckets,
+            'iterations': args.iterations,
+        },
+        'results': []
+    }
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        batch = rng.random((batch_size, 224, 224, 3), dtype=np.float32)
+        reference = keras_model.predict(batch, verbose=0)
+        baseline_p50 = None
+        for name, predict in engines.items():
+            latency = time_calls(predict, batch, args.iterations)
+            max_diff = float(np.max(np.abs(predict(batch) - reference)))
+            baseline_p50 = baseline_p50 or latency['p50']
+            results['results'].append({
+                'engine': name,
+                'batch_size': batch_size,
+                'latency_ms': latency,
+                'per_image_ms': round(latency['p50'] / batch_size, 3),
+                'max_abs_diff_vs_predict': max_diff,
+            })
+            print(f"  batch {batch_size:>3} {name:<14} p50 {latency['p50']:8.2f} ms  p99 {latency['p99']:8.2f} ms  "
+                  f"speedup {baseline_p50 / latency['p50']:5.2f}x  max|diff| {max_diff:.1e}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Compiled Keras inference over a fixed set of batch-size buckets
+
+Keras' ``model.predict`` builds a data adapter, a callback list and a
+progress bar on every call, which for this small CNN costs more than the
+forward pass itself on single images. CompiledKerasModel traces one
+concrete ``tf.function`` per bucket (XLA-compiled where available) and pads
+every batch with zeros up to the nearest bucket, so serving never retraces.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Batch sizes with a traced function; the micro-batcher produces 1..BATCH_MAX_SIZE
+DEFAULT_BATCH_BUCKETS = (1, 2, 4, 8, 16)
+
+
+def bucket_for(batch_size, buckets):
+    """Smallest bucket that holds ``batch_size`` samples (the largest bucket if none does)"""
+    for bucket in buckets:
+        if bucket >= batch_size:
+            return bucket
+    return buckets[-1]
+
+
+class CompiledKerasModel:
+    """Drop-in replacement for a Keras model's predict() backed by per-bucket concrete functions"""
+
+    def __init__(self, keras_model, buckets=DEFAULT_BATCH_BUCKETS, jit_compile=True):
+        import tensorflow as tf
+
+        self.keras_model = keras_model
+        self.input_shape = keras_model.input_shape
+        self.output_shape = keras_model.output_shape
+        self.layers = keras_model.layers
+        self.buckets = sorted(set(int(bucket) for bucket in buckets if int(bucket) > 0))
+        if not self.buckets:
+            raise ValueError("At least one positive batch bucket is required")
+
+        try:
+            self.jit_compile = jit_compile
+            self._functions = self._trace(tf, jit_compile)
+            # XLA compiles on the first call, so an unsupported platform fails here and not mid-request
+            self._run(np.zeros((self.buckets[0], *self.input_shape[1:]), dtype=np.float32))
+        except Exception as e:
+            if not jit_compile:
+                raise
+            logger.error(f"XLA compilation unavailable, using tf.function without jit_compile: {str(e)}")
+            self.jit_compile = False
+            self._functions = self._trace(tf, False)
+
+    def _trace(self, tf, jit_compile):
+        model = self.keras_model
+        forward = tf.function(lambda x: model(x, training=False), jit_compile=jit_compile)
+        sample_shape = tuple(self.input_shape[1:])
+        return {
+            bucket: forward.get_concrete_function(tf.TensorSpec((bucket, *sample_shape), tf.float32))
+            for bucket in self.buckets
+        }
+
+    def _run(self, padded):
+        return self._functions[len(padded)](padded).numpy()
+
+    def count_params(self):
+        return self.keras_model.count_params()
+
+    def predict(self, x, verbose=0):
+        """Forward pass over an (N, 224, 224, 3) batch, returning (N, 1) sigmoid outputs"""
+        x = np.asarray(x, dtype=np.float32)
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(x), largest):
+            chunk = x[start:start + largest]
+            bucket = bucket_for(len(chunk), self.buckets)
+            if bucket > len(chunk):
+                padding = np.zeros((bucket - len(chunk), *chunk.shape[1:]), dtype=np.float32)
+                chunk = np.concatenate([chunk, padding])
+            outputs.append(self._run(chunk)[:min(largest, len(x) - start)])
+        return np.concatenate(outputs)
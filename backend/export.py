@@ -0,0 +1,127 @@
+"""
+Streaming CSV, NDJSON and Parquet encoders for bulk exports
+
+A source is an iterator of batches: dicts mapping each field name to a list
+of values (None for missing), a few thousand rows each. Encoders turn one
+batch at a time into bytes, so an export holds a single batch in memory
+whether it covers an hour or a year. Parquet needs pyarrow, which is
+optional; without it only CSV and NDJSON are offered.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+# Field kinds used to build a Parquet schema
+FIELD_KINDS = ('int', 'float', 'str', 'bool')
+
+
+class ExportFormatError(ValueError):
+    pass
+
+
+def check_format(export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ExportFormatError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'parquet' and pyarrow is None:
+        raise ExportFormatError("Parquet export needs pyarrow; use csv or ndjson")
+
+
+def encode_csv(fields, batches):
+    names = [name for name, _ in fields]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows(zip(*(batch[name] for name in names)))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(fields, batches):
+    names = [name for name, _ in fields]
+    for batch in batches:
+        lines = [json.dumps(dict(zip(names, row)), separators=(',', ':'))
+                 for row in zip(*(batch[name] for name in names))]
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object collecting what ParquetWriter writes between batches"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def encode_parquet(fields, batches):
+    """One row group per batch, each flushed to the client as soon as it is written"""
+    types = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'str': pyarrow.string(), 'bool': pyarrow.bool_()}
+    schema = pyarrow.schema([(name, types[kind]) for name, kind in fields])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for batch in batches:
+            writer.write_batch(pyarrow.record_batch([batch[name] for name, _ in fields], schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson, 'parquet': encode_parquet}
+
+
+def encode(export_format, fields, batches):
+    """Byte chunks of ``batches`` (see module docstring) in ``export_format``"""
+    return ENCODERS[export_format](fields, batches)
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,30 @@
+"""
+Pre-forking production server configuration: `gunicorn -c gunicorn.conf.py wsgi:app`
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Number of pre-forked worker processes
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# Threads per worker let concurrent /analyze requests meet in the micro-batching queue
+worker_class = 'gthread'
+threads = int(os.environ.get('WORKER_THREADS', '8'))
+
+# Load the app (and the model) in the master before forking so every worker
+# shares the same weight pages. TensorFlow is not fork-safe once it has started
+# its thread pools, so the Keras backend loads the model in each worker instead.
+preload_app = os.environ.get('MODEL_BACKEND', 'keras') == 'numpy'
+os.environ['PRELOAD_MODEL'] = '1' if preload_app else '0'
+
+timeout = int(os.environ.get('WORKER_TIMEOUT', '60'))
+
+
+def post_fork(server, worker):
+    """Warm up the preloaded model in each worker before it reports ready"""
+    if preload_app:
+        from app import start_model_initialization
+        start_model_initialization()
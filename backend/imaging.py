@@ -0,0 +1,184 @@
+"""
+Shared image decoding stage for plant image validation and model preprocessing
+"""
+
+import io
+import math
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# Input resolution expected by the plant health classifier
+MODEL_INPUT_SIZE = (224, 224)
+
+# Leading bytes of the formats the upload UI accepts (JPEG, PNG, WebP)
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+]
+
+# Pre-resized uploads: one MODEL_INPUT_SIZE RGB image as row-major uint8, raw or in a .npy file
+PIXEL_TENSOR_SHAPE = (MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3)
+PIXEL_TENSOR_BYTES = PIXEL_TENSOR_SHAPE[0] * PIXEL_TENSOR_SHAPE[1] * PIXEL_TENSOR_SHAPE[2]
+NPY_MAGIC = b'\x93NUMPY'
+
+
+class DecodedImage:
+    """Uploaded image bytes decoded once and consumed by both validation and preprocessing.
+
+    ``size`` is the resolution stored in the file header, while ``image`` may
+    have been decoded at a reduced JPEG scale that is still at least as large
+    as the requested target size.
+    """
+
+    __slots__ = ('data', 'format', 'size', 'image')
+
+    def __init__(self, data, format, size, image):
+        self.data = data
+        self.format = format
+        self.size = size
+        self.image = image
+
+    @property
+    def decoded_size(self):
+        return self.image.size
+
+
+def sniff_image_format(img_data):
+    """Identify JPEG, PNG or WebP from the leading bytes alone; None for anything else"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if img_data.startswith(signature):
+            return image_format
+    if img_data[:4] == b'RIFF' and img_data[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def open_image_header(img_data):
+    """Parse only the image header; pixels are not decoded until the image is loaded"""
+    return Image.open(io.BytesIO(img_data))
+
+
+def decode_image(img_data, target_size=MODEL_INPUT_SIZE, header=None):
+    """Decode image bytes to RGB exactly once.
+
+    JPEGs are decoded straight to the smallest DCT scale (1/1, 1/2, 1/4 or
+    1/8) that is at or above ``target_size``, so a full-resolution bitmap of
+    a 12-megapixel phone photo is never built just to be thrown away.
+    ``header`` reuses an image already opened by open_image_header.
+    """
+    img = header if header is not None else open_image_header(img_data)
+    original_size = img.size
+    image_format = img.format
+
+    # MPO (multi-picture JPEG from some phone cameras) decodes like JPEG
+    if image_format in ('JPEG', 'MPO') and target_size is not None:
+        img.draft('RGB', target_size)
+
+    # Convert to RGB if necessary
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.load()
+
+    return DecodedImage(img_data, image_format, original_size, img)
+
+
+class PixelTensorError(ValueError):
+    pass
+
+
+def wrap_pixel_tensor(data):
+    """View an uploaded (224, 224, 3) uint8 RGB buffer as an array without copying.
+
+    ``data`` is either exactly PIXEL_TENSOR_BYTES of raw pixels or a version
+    1 or 2 .npy file holding a C-ordered uint8 array of PIXEL_TENSOR_SHAPE.
+    Anything else raises PixelTensorError. The array shares ``data``'s
+    memory, so it is read-only when ``data`` is bytes.
+    """
+    offset = 0
+    if len(data) != PIXEL_TENSOR_BYTES:
+        if not data.startswith(NPY_MAGIC):
+            raise PixelTensorError(f"Expected {PIXEL_TENSOR_BYTES} bytes of raw {PIXEL_TENSOR_SHAPE} uint8 RGB pixels "
+                                   f"or a .npy file, got {len(data)} bytes")
+        stream = io.BytesIO(data)
+        try:
+            version = np.lib.format.read_magic(stream)
+            read_header = {(1, 0): np.lib.format.read_array_header_1_0,
+                           (2, 0): np.lib.format.read_array_header_2_0}.get(version)
+            if read_header is None:
+                raise ValueError(f"version {version[0]}.{version[1]} is not supported")
+            shape, fortran_order, dtype = read_header(stream)
+        except ValueError as e:
+            raise PixelTensorError(f"Unreadable .npy header: {e}") from None
+        # Only plain uint8 is accepted, so object arrays (and pickles) are never loaded
+        if dtype != np.uint8 or fortran_order or tuple(shape) != PIXEL_TENSOR_SHAPE:
+            order = 'Fortran-ordered ' if fortran_order else ''
+            raise PixelTensorError(f".npy array must be C-ordered uint8 with shape {PIXEL_TENSOR_SHAPE}, "
+                                   f"got {order}{dtype} with shape {tuple(shape)}")
+        offset = stream.tell()
+        if len(data) - offset != PIXEL_TENSOR_BYTES:
+            raise PixelTensorError(f".npy data is {len(data) - offset} bytes; {PIXEL_TENSOR_BYTES} expected")
+    return np.frombuffer(data, dtype=np.uint8, count=PIXEL_TENSOR_BYTES, offset=offset).reshape(PIXEL_TENSOR_SHAPE)
+
+
+# Pixels per row chunk examined by compute_image_stats (bounds validation temporaries)
+STATS_CHUNK_PIXELS = 256 * 1024
+
+ImageStats = namedtuple('ImageStats', [
+    'mean_brightness', 'red_ratio', 'green_ratio', 'blue_ratio', 'color_std', 'skin_ratio'
+])
+
+
+def compute_image_stats(img, chunk_pixels=STATS_CHUNK_PIXELS):
+    """Compute the validation statistics of an RGB image in a single pass over row chunks.
+
+    Brightness, per-channel means, the standard deviation over all channel
+    values and the skin-pixel ratio are accumulated together with exact
+    integer arithmetic, so peak temporary memory depends only on
+    ``chunk_pixels`` and never on the image resolution. ``img`` is a PIL
+    image or an (height, width, 3) uint8 array.
+    """
+    if isinstance(img, np.ndarray):
+        height, width = img.shape[:2]
+        rows = lambda top, bottom: img[top:bottom]
+    else:
+        width, height = img.size
+        rows = lambda top, bottom: img.crop((0, top, width, bottom))
+    rows_per_chunk = max(1, chunk_pixels // max(1, width))
+
+    channel_sums = np.zeros(3, dtype=np.int64)
+    sum_of_squares = 0
+    skin_pixels = 0
+
+    for top in range(0, height, rows_per_chunk):
+        bottom = min(height, top + rows_per_chunk)
+        chunk = np.asarray(rows(top, bottom), dtype=np.int16)
+        red = chunk[:, :, 0]
+        green = chunk[:, :, 1]
+        blue = chunk[:, :, 2]
+
+        channel_sums += chunk.sum(axis=(0, 1), dtype=np.int64)
+        sum_of_squares += int(np.einsum('ijk,ijk->', chunk, chunk, dtype=np.int64))
+
+        # Skin-tone rule from the original validator, in signed arithmetic.
+        # red - green > 15 implies red > green, and with red > blue the
+        # |red - green| > |red - blue| condition reduces to blue > green.
+        skin_pixels += int(np.count_nonzero(
+            (red > 95) & (green > 40) & (blue > 20) &
+            (red - green > 15) & (red > blue) & (blue > green)
+        ))
+
+    pixel_count = width * height
+    value_count = pixel_count * 3
+    total = int(channel_sums.sum())
+    variance = (value_count * sum_of_squares - total * total) / (value_count * value_count)
+
+    return ImageStats(
+        mean_brightness=total / value_count,
+        red_ratio=int(channel_sums[0]) / pixel_count / 255.0,
+        green_ratio=int(channel_sums[1]) / pixel_count / 255.0,
+        blue_ratio=int(channel_sums[2]) / pixel_count / 255.0,
+        color_std=math.sqrt(max(0.0, variance)),
+        skin_ratio=skin_pixels / pixel_count
+    )
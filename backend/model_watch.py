@@ -0,0 +1,62 @@
+"""
+Polling watcher that triggers a model reload when the model file changes on disk
+"""
+
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    """(size, mtime_ns) of ``path``, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class ModelFileWatcher:
+    """Call ``on_change`` once a watched file has changed and then stayed unchanged for one poll.
+
+    Waiting for the signature to settle avoids loading a file that is still
+    being copied into place. Polling (rather than inotify) works the same on
+    every platform and on network or container-mounted volumes.
+    """
+
+    def __init__(self, path_fn, on_change, interval_seconds=5.0):
+        self.path_fn = path_fn
+        self.on_change = on_change
+        self.interval = max(0.1, float(interval_seconds))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='model-file-watcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        seen = file_signature(self.path_fn())
+        pending = None
+        while not self._stop.wait(self.interval):
+            current = file_signature(self.path_fn())
+            if current is None or current == seen:
+                pending = None
+                continue
+            if current != pending:
+                # Changed since the last poll; wait until it stops changing
+                pending = current
+                continue
+            seen, pending = current, None
+            logger.info(f"Model file {self.path_fn()} changed, reloading")
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"Model reload after file change failed: {str(e)}")
@@ -0,0 +1,228 @@
+"""
+Pure-NumPy inference engine for the Sequential plant_health_classifier
+
+The architecture is fixed (see manual_tfjs_conversion.py):
+three Conv2D(3x3, valid, relu) + MaxPooling2D(2x2) blocks, Flatten,
+Dense(128, relu), Dropout(0.5) and Dense(1, sigmoid). Weights are loaded
+either from the TF.js layers-model written by create_tfjs_model_manually
+(model.json + weights.bin) or from an .npz keyed by the same weight names,
+so slim workers can serve predictions without TensorFlow installed.
+
+Outputs match Keras (float32, channels_last) within PREDICTION_TOLERANCE.
+"""
+
+import json
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Maximum absolute difference from Keras sigmoid outputs observed to be acceptable
+PREDICTION_TOLERANCE = 1e-5
+
+# Number of samples pushed through the convolution blocks at once (bounds im2col memory)
+CONV_CHUNK_SIZE = 4
+
+CONV_LAYERS = ['conv2d', 'conv2d_1', 'conv2d_2']
+DENSE_LAYERS = ['dense', 'dense_1']
+WEIGHT_NAMES = [f"{layer}/{part}" for layer in CONV_LAYERS + DENSE_LAYERS for part in ('kernel', 'bias')]
+
+DTYPE_SIZES = {'float32': 4, 'int32': 4, 'float16': 2, 'uint16': 2, 'uint8': 1, 'int8': 1}
+
+
+def load_tfjs_weights(model_json_path, mmap=True):
+    """Read the weightsManifest of a TF.js layers-model into a {name: ndarray} dict.
+
+    With ``mmap`` the weight files are memory-mapped read-only and every
+    float32 tensor that lies inside a single file is a zero-copy view, so all
+    worker processes serving from the same file share one copy of the
+    physical pages. Quantized tensors are dequantized into private memory.
+    """
+    with open(model_json_path, 'r') as f:
+        model_json = json.load(f)
+
+    base_dir = os.path.dirname(model_json_path)
+    weights = {}
+    for group in model_json['weightsManifest']:
+        files = [_open_weight_file(os.path.join(base_dir, path), mmap) for path in group['paths']]
+        starts = np.cumsum([0] + [len(data) for data in files])
+        total_bytes = int(starts[-1])
+        offset = 0
+        for spec in group['weights']:
+            quantization = spec.get('quantization')
+            storage_dtype = quantization['dtype'] if quantization else spec['dtype']
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            nbytes = count * DTYPE_SIZES[storage_dtype]
+            if offset + nbytes > total_bytes:
+                raise ValueError(f"Weight file too small for {spec['name']}: need {offset + nbytes} bytes, have {total_bytes}")
+            raw = _byte_range(files, starts, offset, offset + nbytes)
+            values = raw.view(storage_dtype).reshape(spec['shape'])
+            weights[spec['name']] = dequantize_weight(values, quantization) if quantization else values
+            offset += nbytes
+    return weights
+
+
+def dequantize_weight(values, quantization):
+    """Expand quantized weights back to float32 using their weightsManifest metadata.
+
+    Supports the TF.js schemes (float16, and affine uint8/uint16 with a
+    per-tensor ``scale``/``min``) as well as per-channel affine int8 written
+    by manual_tfjs_conversion.py, which stores ``scales`` and ``zeroPoints``
+    for each index along ``axis``.
+    """
+    dtype = quantization['dtype']
+    if dtype == 'float16':
+        return values.astype(np.float32)
+    if dtype == 'int8':
+        axis = quantization.get('axis', values.ndim - 1)
+        shape = [1] * values.ndim
+        shape[axis] = -1
+        scales = np.asarray(quantization['scales'], dtype=np.float32).reshape(shape)
+        zero_points = np.asarray(quantization['zeroPoints'], dtype=np.float32).reshape(shape)
+        weights = values.astype(np.float32)
+        weights -= zero_points
+        weights *= scales
+        return weights
+    if dtype in ('uint8', 'uint16'):
+        weights = values.astype(np.float32)
+        weights *= np.float32(quantization['scale'])
+        weights += np.float32(quantization['min'])
+        return weights
+    raise ValueError(f"Unsupported weight quantization dtype: {dtype}")
+
+
+def _open_weight_file(path, mmap):
+    if mmap and os.path.getsize(path) > 0:
+        return np.memmap(path, dtype=np.uint8, mode='r')
+    return np.fromfile(path, dtype=np.uint8)
+
+
+def _byte_range(files, starts, begin, end):
+    """Bytes [begin, end) of the concatenated files; a view when they lie in one file"""
+    first = int(np.searchsorted(starts, begin, side='right')) - 1
+    if end <= starts[first + 1]:
+        return files[first][begin - starts[first]:end - starts[first]]
+    pieces = []
+    index = first
+    while begin < end:
+        stop = min(end, int(starts[index + 1]))
+        pieces.append(files[index][begin - starts[index]:stop - starts[index]])
+        begin = stop
+        index += 1
+    return np.concatenate(pieces)
+
+
+def _conv2d_relu(x, kernel, bias):
+    """Valid 3x3 stride-1 convolution + ReLU via an im2col view and a single matmul"""
+    kh, kw, cin, cout = kernel.shape
+    # (N, H', W', C, kh, kw) view without copying, then one contiguous im2col buffer
+    windows = sliding_window_view(x, (kh, kw), axis=(1, 2))
+    n, oh, ow = windows.shape[:3]
+    columns = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * oh * ow, kh * kw * cin)
+    out = columns @ kernel.reshape(kh * kw * cin, cout)
+    out += bias
+    np.maximum(out, 0, out=out)
+    return out.reshape(n, oh, ow, cout)
+
+
+def _max_pool_2x2(x):
+    n, h, w, c = x.shape
+    h2, w2 = h // 2, w // 2
+    return x[:, :h2 * 2, :w2 * 2, :].reshape(n, h2, 2, w2, 2, c).max(axis=(2, 4))
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -88.0, 88.0)))
+
+
+class NumpyPlantHealthModel:
+    """Drop-in replacement for the Keras model's predict() used by the backend"""
+
+    input_shape = (None, 224, 224, 3)
+    output_shape = (None, 1)
+
+    def __init__(self, weights):
+        missing = [name for name in WEIGHT_NAMES if name not in weights]
+        if missing:
+            raise ValueError(f"Missing weights: {', '.join(missing)}")
+        # float32 inputs (including memory-mapped ones) are used as-is without a copy
+        self.weights = {name: np.asarray(weights[name], dtype=np.float32) for name in WEIGHT_NAMES}
+        self.layers = [
+            'conv2d', 'max_pooling2d', 'conv2d_1', 'max_pooling2d_1', 'conv2d_2', 'max_pooling2d_2',
+            'flatten', 'dense', 'dropout', 'dense_1'
+        ]
+        self.output_shape = (None, int(self.weights['dense_1/kernel'].shape[-1]))
+        expected_features = self.weights['dense/kernel'].shape[0]
+        if self._feature_size() != expected_features:
+            raise ValueError(f"dense/kernel expects {expected_features} features, convolutions produce {self._feature_size()}")
+
+    @classmethod
+    def from_tfjs(cls, model_json_path, mmap=True):
+        return cls(load_tfjs_weights(model_json_path, mmap=mmap))
+
+    @classmethod
+    def from_npz(cls, npz_path):
+        with np.load(npz_path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    @classmethod
+    def load(cls, path):
+        """Load from a TF.js model.json or an .npz, depending on the file extension"""
+        if path.endswith('.npz'):
+            return cls.from_npz(path)
+        return cls.from_tfjs(path)
+
+    def _feature_size(self):
+        h, w = self.input_shape[1:3]
+        for layer in CONV_LAYERS:
+            kh, kw = self.weights[f"{layer}/kernel"].shape[:2]
+            h, w = (h - kh + 1) // 2, (w - kw + 1) // 2
+        return h * w * self.weights['conv2d_2/kernel'].shape[3]
+
+    def count_params(self):
+        return int(sum(weight.size for weight in self.weights.values()))
+
+    def _features(self, x):
+        for layer in CONV_LAYERS:
+            x = _max_pool_2x2(_conv2d_relu(x, self.weights[f"{layer}/kernel"], self.weights[f"{layer}/bias"]))
+        return x.reshape(x.shape[0], -1)
+
+    def predict(self, x, verbose=0):
+        """Forward pass over a (N, 224, 224, 3) batch, returning (N, 1) sigmoid outputs"""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim != 4 or tuple(x.shape[1:]) != tuple(self.input_shape[1:]):
+            raise ValueError(f"Expected input of shape (N, 224, 224, 3), got {x.shape}")
+
+        features = np.concatenate([
+            self._features(x[start:start + CONV_CHUNK_SIZE])
+            for start in range(0, x.shape[0], CONV_CHUNK_SIZE)
+        ])
+
+        # Dropout is the identity at inference time
+        hidden = features @ self.weights['dense/kernel']
+        hidden += self.weights['dense/bias']
+        np.maximum(hidden, 0, out=hidden)
+        logits = hidden @ self.weights['dense_1/kernel'] + self.weights['dense_1/bias']
+        return _sigmoid(logits).astype(np.float32)
+
+
+def compare_with_keras(keras_model_path, weights_path, samples=8, seed=0):
+    """Return the max absolute output difference between Keras and the NumPy engine"""
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(keras_model_path)
+    numpy_model = NumpyPlantHealthModel.load(weights_path)
+    rng = np.random.default_rng(seed)
+    batch = rng.random((samples, 224, 224, 3), dtype=np.float32)
+    return float(np.max(np.abs(keras_model.predict(batch, verbose=0) - numpy_model.predict(batch))))
+
+
+if __name__ == "__main__":
+    import sys
+
+    keras_path = sys.argv[1] if len(sys.argv) > 1 else "../plant_health_classifier.h5"
+    weights_path = sys.argv[2] if len(sys.argv) > 2 else "../public/models/plant_health_classifier/model.json"
+    max_diff = compare_with_keras(keras_path, weights_path)
+    status = "✅ within" if max_diff <= PREDICTION_TOLERANCE else "❌ outside"
+    print(f"Max |keras - numpy| = {max_diff:.2e} ({status} tolerance {PREDICTION_TOLERANCE:.0e})")
+    sys.exit(0 if max_diff <= PREDICTION_TOLERANCE else 1)
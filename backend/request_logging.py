@@ -0,0 +1,194 @@
+"""
+Request-scoped summary logging with sampling and an optional background writer
+
+Instead of a log line per pipeline step, handlers note fields on the
+current request's RequestLog and a single JSON summary line is written when
+the request finishes. Successful and rejected requests are sampled; server
+errors are always written. Expensive diagnostics are registered as callables
+and only evaluated for requests that are actually logged.
+
+With background logging, records are handed to a QueueListener thread
+through a bounded queue, so formatting and disk writes happen off the
+request thread and a full queue drops records instead of blocking.
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager, nullcontext
+
+_current = contextvars.ContextVar('request_log', default=None)
+
+
+class _Summary:
+    """Defers JSON encoding of the summary fields until a handler formats the record"""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return json.dumps(self.fields, default=str, separators=(',', ':'))
+
+
+class RequestLog:
+    """Fields gathered while serving one request (or one image of a batch)"""
+
+    __slots__ = ('fields', '_lazy', '_items')
+
+    def __init__(self, **fields):
+        self.fields = fields
+        self._lazy = {}
+        self._items = []
+
+    def note(self, **fields):
+        self.fields.update(fields)
+
+    def lazy(self, name, compute):
+        """Record ``compute()`` under ``name`` only if this request ends up being logged"""
+        self._lazy[name] = compute
+
+    @contextmanager
+    def item(self, **fields):
+        """Make a child log current, e.g. for one image of a batch, nested under ``items``"""
+        child = RequestLog(**fields)
+        self._items.append(child)
+        token = _current.set(child)
+        try:
+            yield child
+        finally:
+            _current.reset(token)
+
+    def resolve(self):
+        for name, compute in self._lazy.items():
+            try:
+                self.fields[name] = compute()
+            except Exception as e:
+                self.fields[name] = f"unavailable: {str(e)}"
+        if self._items:
+            self.fields['items'] = [child.resolve() for child in self._items]
+        return self.fields
+
+
+class _NullRequestLog:
+    """Stand-in when no request is being tracked (startup, scripts, benchmarks)"""
+
+    def note(self, **fields):
+        pass
+
+    def lazy(self, name, compute):
+        pass
+
+    def item(self, **fields):
+        return nullcontext(self)
+
+
+_NULL_LOG = _NullRequestLog()
+
+
+def current_request_log():
+    """The RequestLog of the request being served on this thread, or a no-op stand-in"""
+    log = _current.get()
+    return _NULL_LOG if log is None else log
+
+
+def _status_code(response):
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return getattr(response, 'status_code', 200)
+
+
+class RequestLogger:
+    """Writes one summary line per tracked request, sampling those that did not fail"""
+
+    def __init__(self, logger, sample_rate=1.0):
+        self.logger = logger
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+
+    def track(self, endpoint):
+        """Decorator for a Flask view: collect notes while it runs and log the summary afterwards"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                log = RequestLog(endpoint=endpoint)
+                token = _current.set(log)
+                started = time.perf_counter()
+                status_code = 500
+                try:
+                    response = view(*args, **kwargs)
+                    status_code = _status_code(response)
+                    return response
+                finally:
+                    _current.reset(token)
+                    log.note(status=status_code, duration_ms=round((time.perf_counter() - started) * 1000, 2))
+                    self.finish(log, status_code)
+            return wrapper
+        return decorator
+
+    def finish(self, log, status_code):
+        level = logging.ERROR if status_code >= 500 else logging.INFO
+        if level < logging.ERROR and random.random() >= self.sample_rate:
+            return
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, "request %s", _Summary(log.resolve()))
+
+
+class BackgroundLogHandler(logging.handlers.QueueHandler):
+    """Hands records to a listener thread that runs the real handlers.
+
+    The queue is bounded; when the writer falls behind, new records are
+    counted in ``dropped`` and discarded rather than blocking requests.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(max(1, int(queue_size))))
+        self.target_handlers = list(handlers)
+        self.dropped = 0
+        self.listener = None
+        self._start_listener()
+        if hasattr(os, 'register_at_fork'):
+            # The listener thread does not survive fork(); pre-forked workers start their own
+            os.register_at_fork(after_in_child=self._start_listener)
+
+    def _start_listener(self):
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.target_handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record):
+        # Message formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+def configure_logging(level=logging.INFO, background=False, queue_size=10000):
+    """Configure root logging; with ``background`` the existing handlers run on a listener thread"""
+    logging.basicConfig(level=level)
+    if not background:
+        return None
+    root = logging.getLogger()
+    handler = BackgroundLogHandler(root.handlers, queue_size)
+    root.handlers = [handler]
+    # Flush queued records on interpreter exit
+    atexit.register(handler.close)
+    return handler
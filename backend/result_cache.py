@@ -0,0 +1,155 @@
+"""
+Content-addressed cache of analysis results with in-flight request coalescing
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """A computation other callers with the same key wait on instead of repeating"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """LRU cache bounded in entries and bytes, with a per-entry TTL.
+
+    Entries live in a namespace (for example the fingerprint of the model
+    file); switching to a different namespace drops every cached entry so
+    results computed by an old model are never served for a new one.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=8 * 1024 * 1024, ttl_seconds=600.0, size_fn=len):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl = float(ttl_seconds)
+        self.size_fn = size_fn
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._namespace = None
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def ensure_namespace(self, namespace):
+        """Drop all entries if ``namespace`` differs from the one they were cached under"""
+        with self._lock:
+            if namespace != self._namespace:
+                if self._entries:
+                    self._invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+                self._namespace = namespace
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self._bytes -= size
+            self._expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value):
+        size = self.size_fn(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evictions += 1
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None"""
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Return the cached value for ``key``, computing it at most once across concurrent callers.
+
+        Callers that arrive while the same key is being computed wait for
+        that result instead of running ``compute`` again. Values for which
+        ``cacheable(value)`` is false are handed to the waiting callers but
+        not stored.
+        """
+        with self._lock:
+            entry = self._lookup(key, time.monotonic())
+            if entry is not None:
+                self._hits += 1
+                return entry[0]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                self._misses += 1
+                flight = _InFlight()
+                self._in_flight[key] = flight
+                namespace = self._namespace
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if (flight.error is None and namespace == self._namespace
+                        and (cacheable is None or cacheable(flight.value))):
+                    self._store(key, flight.value)
+                del self._in_flight[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'coalesced': self._coalesced,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+                'namespace': self._namespace
+            }
@@ -0,0 +1,284 @@
+"""
+Server-side alerting on the ingested sensor stream
+
+Per device and watched metric the engine keeps O(1)-per-reading rolling
+statistics: Welford mean and variance since start-up, an exponentially
+weighted mean and variance, and the min/max over a sliding time window
+(monotonic deques). Devices are rows of NumPy state arrays, so one ingest
+batch is evaluated in a single pass: the n-th reading of every device in
+the batch is folded in together, and each rule is then checked over the
+whole batch at once. Rules fire when a device enters the violating state
+and resolve when it leaves it, so a stuck reading does not repeat alerts.
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+from sensors import SENSOR_FIELDS, format_timestamp, metric_column
+
+RULE_TYPES = ('above', 'below', 'zscore', 'swing')
+
+# Typical leafy-greens ranges; override with ALERT_RULES
+DEFAULT_ALERT_RULES = (
+    {'name': 'ph_low', 'metric': 'pH', 'type': 'below', 'value': 5.5},
+    {'name': 'ph_high', 'metric': 'pH', 'type': 'above', 'value': 7.0},
+    {'name': 'ph_swing', 'metric': 'pH', 'type': 'swing', 'value': 0.8},
+    {'name': 'ph_anomaly', 'metric': 'pH', 'type': 'zscore', 'value': 4.0, 'min_std': 0.05},
+    {'name': 'tds_low', 'metric': 'tds', 'type': 'below', 'value': 300},
+    {'name': 'tds_high', 'metric': 'tds', 'type': 'above', 'value': 1500},
+    {'name': 'tds_anomaly', 'metric': 'tds', 'type': 'zscore', 'value': 4.0, 'min_std': 10.0},
+    {'name': 'do_low', 'metric': 'dissolved_oxygen_mg_l', 'type': 'below', 'value': 5.0},
+)
+
+
+class AlertRuleError(ValueError):
+    pass
+
+
+def validate_rules(rules):
+    """Check rule dicts and fill in defaults; returns a list of rules"""
+    validated = []
+    names = set()
+    for rule in rules:
+        if not isinstance(rule, dict) or rule.get('type') not in RULE_TYPES:
+            raise AlertRuleError(f"Each rule needs a type out of {', '.join(RULE_TYPES)}: {rule!r}")
+        if rule.get('metric') not in SENSOR_FIELDS:
+            raise AlertRuleError(f"Unknown metric in rule {rule!r}")
+        if isinstance(rule.get('value'), bool) or not isinstance(rule.get('value'), (int, float)):
+            raise AlertRuleError(f"Rule value must be a number: {rule!r}")
+        name = rule.get('name') or f"{rule['metric']}_{rule['type']}"
+        if name in names:
+            raise AlertRuleError(f"Duplicate rule name {name!r}")
+        names.add(name)
+        validated.append({'min_std': 1e-6, **rule, 'name': name, 'value': float(rule['value'])})
+    return validated
+
+
+class MonotonicWindow:
+    """Min and max of the readings in the last ``window_ms``, amortized O(1) per reading"""
+
+    __slots__ = ('window_ms', 'minima', 'maxima')
+
+    def __init__(self, window_ms):
+        self.window_ms = window_ms
+        self.minima = deque()  # (timestamp, value), values increasing
+        self.maxima = deque()  # (timestamp, value), values decreasing
+
+    def add(self, timestamp_ms, value):
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((timestamp_ms, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((timestamp_ms, value))
+        cutoff = timestamp_ms - self.window_ms
+        while self.minima[0][0] <= cutoff:
+            self.minima.popleft()
+        while self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+        return self.minima[0][1], self.maxima[0][1]
+
+
+class AlertEngine:
+    """Rolling statistics and rule state for every device, stored as (devices, metrics) arrays"""
+
+    def __init__(self, rules=DEFAULT_ALERT_RULES, window_seconds=600, ewma_alpha=0.05, min_samples=30,
+                 recent_alerts=500):
+        self.rules = validate_rules(rules)
+        # Only metrics some rule refers to are tracked
+        self.metrics = sorted({rule['metric'] for rule in self.rules}, key=SENSOR_FIELDS.index)
+        self.columns = [metric_column(metric) for metric in self.metrics]
+        # Sliding windows are kept only for metrics with a swing rule
+        self.windowed = sorted({self.metrics.index(rule['metric']) for rule in self.rules if rule['type'] == 'swing'})
+        self.window_ms = int(window_seconds * 1000)
+        self.alpha = float(ewma_alpha)
+        self.min_samples = int(min_samples)
+        self.recent = deque(maxlen=recent_alerts)
+        self._slots = {}
+        self._device_ids = []
+        self._windows = []
+        self._lock = threading.Lock()
+        self._allocate(64)
+
+    def _allocate(self, capacity):
+        metric_count, rule_count = len(self.metrics), len(self.rules)
+        grown = {
+            'last_ms': np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64),
+            'count': np.zeros((capacity, metric_count), dtype=np.int64),
+            'mean': np.zeros((capacity, metric_count)),
+            'm2': np.zeros((capacity, metric_count)),
+            'ewma': np.zeros((capacity, metric_count)),
+            'ewm_var': np.zeros((capacity, metric_count)),
+            'active': np.zeros((capacity, rule_count), dtype=bool),
+        }
+        for name, array in grown.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                array[:len(old)] = old
+            setattr(self, name, array)
+
+    def _slot(self, device_id):
+        slot = self._slots.get(device_id)
+        if slot is None:
+            slot = self._slots[device_id] = len(self._device_ids)
+            self._device_ids.append(device_id)
+            self._windows.append({metric: MonotonicWindow(self.window_ms) for metric in self.windowed})
+            if slot >= len(self.last_ms):
+                self._allocate(2 * len(self.last_ms))
+        return slot
+
+    def evaluate(self, batches):
+        """Fold in [(device_id, timestamps, rows)] (each device's readings oldest first) and check every rule.
+
+        Returns alert dicts for rules that started ('firing') or stopped
+        ('resolved') violating, oldest first.
+        """
+        batches = [(device_id, timestamps, rows) for device_id, timestamps, rows in batches if len(timestamps)]
+        if not batches or not self.rules:
+            return []
+        with self._lock:
+            slots = np.repeat(np.array([self._slot(device_id) for device_id, _, _ in batches], dtype=np.int64),
+                              [len(timestamps) for _, timestamps, _ in batches])
+            timestamps = np.concatenate([timestamps for _, timestamps, _ in batches]).astype(np.int64)
+            values = np.concatenate([rows for _, _, rows in batches])[:, self.columns].astype(np.float64)
+            # Readings already evaluated (e.g. a concurrent batch for the same device got here first)
+            fresh = timestamps > self.last_ms[slots]
+            slots, timestamps, values = slots[fresh], timestamps[fresh], values[fresh]
+            if len(slots) == 0:
+                return []
+            deviations, stds, swings, warm = self._update(slots, timestamps, values)
+            alerts = self._check_rules(slots, timestamps, values, deviations, stds, swings, warm)
+            self.recent.extend(alerts)
+            return alerts
+
+    def _update(self, slots, timestamps, values):
+        """Fold readings into the statistics.
+
+        Returns, per reading and metric: the deviation from the EWMA and the
+        EW standard deviation before the reading, the max - min over the
+        window including it, and whether the device had warmed up.
+        """
+        n = len(slots)
+        present = ~np.isnan(values)
+        deviations = np.zeros(values.shape)
+        stds = np.zeros(values.shape)
+        swings = np.zeros(values.shape)
+        warm = np.zeros(values.shape, dtype=bool)
+
+        # Position of each reading within its device's run; readings with the same position are updated together
+        starts = np.flatnonzero(np.concatenate(([True], slots[1:] != slots[:-1])))
+        rank = np.arange(n) - np.repeat(starts, np.diff(np.append(starts, n)))
+        for position in range(int(rank.max()) + 1):
+            rows = np.flatnonzero(rank == position)
+            device = slots[rows]
+            x, has = values[rows], present[rows]
+            count = self.count[device]
+
+            # EWMA and EW variance; z-scores compare a reading with the baseline before it
+            ewma, ewm_var = self.ewma[device], self.ewm_var[device]
+            diff = np.where(has, x - ewma, 0.0)
+            warm[rows] = has & (count >= self.min_samples)
+            deviations[rows] = diff
+            stds[rows] = np.sqrt(ewm_var)
+            increment = self.alpha * diff
+            first = has & (count == 0)
+            self.ewma[device] = np.where(first, x, ewma + increment)
+            # Readings without the metric leave its variance alone instead of decaying it towards zero
+            self.ewm_var[device] = np.where(first, 0.0, np.where(has, (1 - self.alpha) * (ewm_var + diff * increment), ewm_var))
+
+            # Welford
+            new_count = count + has
+            delta = np.where(has, x - self.mean[device], 0.0)
+            mean = self.mean[device] + np.where(has, delta / np.maximum(new_count, 1), 0.0)
+            self.m2[device] += np.where(has, delta * (np.where(has, x, 0.0) - mean), 0.0)
+            self.mean[device] = mean
+            self.count[device] = new_count
+            self.last_ms[device] = timestamps[rows]
+
+        # Sliding-window min/max; the deques are per device and metric
+        for metric in self.windowed:
+            rows = np.flatnonzero(present[:, metric])
+            swing = []
+            for slot, timestamp, value in zip(slots[rows].tolist(), timestamps[rows].tolist(), values[rows, metric].tolist()):
+                low, high = self._windows[slot][metric].add(timestamp, value)
+                swing.append(high - low)
+            swings[rows, metric] = swing
+        return deviations, stds, swings, warm
+
+    def _check_rules(self, slots, timestamps, values, deviations, stds, swings, warm):
+        present = ~np.isnan(values)
+        events = []
+        for rule_index, rule in enumerate(self.rules):
+            metric = self.metrics.index(rule['metric'])
+            x = values[:, metric]
+            if rule['type'] == 'above':
+                evaluated, violating, observed = present[:, metric], x > rule['value'], x
+            elif rule['type'] == 'below':
+                evaluated, violating, observed = present[:, metric], x < rule['value'], x
+            elif rule['type'] == 'swing':
+                evaluated, violating, observed = present[:, metric], swings[:, metric] > rule['value'], swings[:, metric]
+            else:
+                observed = deviations[:, metric] / np.maximum(stds[:, metric], rule['min_std'])
+                evaluated, violating = warm[:, metric], np.abs(observed) > rule['value']
+            events.extend(self._transitions(rule_index, rule, slots, timestamps, x, observed, evaluated, violating))
+        events.sort(key=lambda event: event['timestamp_ms'])
+        return events
+
+    def _transitions(self, rule_index, rule, slots, timestamps, x, observed, evaluated, violating):
+        rows = np.flatnonzero(evaluated)
+        if len(rows) == 0:
+            return []
+        device, now = slots[rows], violating[rows]
+        first_of_device = np.concatenate(([True], device[1:] != device[:-1]))
+        before = np.empty_like(now)
+        before[1:] = now[:-1]
+        before[first_of_device] = self.active[device[first_of_device], rule_index]
+        last_of_device = np.concatenate((device[1:] != device[:-1], [True]))
+        self.active[device[last_of_device], rule_index] = now[last_of_device]
+
+        changed = np.flatnonzero(now != before)
+        return [{
+            'device_id': self._device_ids[device[i]],
+            'rule': rule['name'],
+            'metric': rule['metric'],
+            'type': rule['type'],
+            'state': 'firing' if now[i] else 'resolved',
+            'value': round(float(x[rows[i]]), 4),
+            'observed': round(float(observed[rows[i]]), 4),
+            'threshold': rule['value'],
+            'timestamp': format_timestamp(int(timestamps[rows[i]])),
+            'timestamp_ms': int(timestamps[rows[i]]),
+        } for i in changed.tolist()]
+
+    def active_alerts(self, device_id=None):
+        """(device_id, rule name) of every rule currently violating"""
+        with self._lock:
+            devices, rules = np.nonzero(self.active[:len(self._device_ids)])
+            return [
+                {'device_id': self._device_ids[device], 'rule': self.rules[rule]['name'], 'metric': self.rules[rule]['metric']}
+                for device, rule in zip(devices.tolist(), rules.tolist())
+                if device_id is None or self._device_ids[device] == device_id
+            ]
+
+    def stats(self, device_id):
+        """Rolling statistics of one device per watched metric, or None for an unknown device"""
+        with self._lock:
+            slot = self._slots.get(device_id)
+            if slot is None:
+                return None
+            result = {}
+            for metric_index, metric in enumerate(self.metrics):
+                count = int(self.count[slot, metric_index])
+                window = self._windows[slot].get(metric_index)
+                result[metric] = {
+                    'count': count,
+                    'mean': round(float(self.mean[slot, metric_index]), 4) if count else None,
+                    'std': round(float(np.sqrt(self.m2[slot, metric_index] / (count - 1))), 4) if count > 1 else None,
+                    'ewma': round(float(self.ewma[slot, metric_index]), 4) if count else None,
+                    'ewm_std': round(float(np.sqrt(self.ewm_var[slot, metric_index])), 4) if count else None,
+                    'window_min': round(float(window.minima[0][1]), 4) if window and window.minima else None,
+                    'window_max': round(float(window.maxima[0][1]), 4) if window and window.maxima else None,
+                }
+            return result
@@ -0,0 +1,313 @@
+"""
+Append-only, memory-mapped columnar history of sensor readings on disk
+
+Layout, one directory per device and per segment of up to SEGMENT_ROWS
+readings::
+
+    <root>/<device>/<first timestamp ms>/timestamp.i64
+                                          pH.f32  airTemp.f32  ...  pump_status.f32
+
+Every column is a flat little-endian array, so appending a batch is one
+sequential write per file and reads are ``np.memmap`` views: a range scan
+only touches the pages it returns, and ``iter_range`` hands those views to
+the caller without copying. Each segment keeps a sparse in-memory
+index (every INDEX_STRIDE-th timestamp) so the two ends of a range are
+found by binary search without reading the timestamp column. A crash
+mid-append leaves columns of different lengths; they are truncated back to
+the shortest one when the segment is opened by the process that writes to
+the root. That process holds an exclusive flock on ``<root>/.lock``, so
+several server workers pointed at one root cannot interleave appends.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from sensors import COLUMN_COUNT, SENSOR_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Readings per segment file set (about 3.8 days at one reading per 5 s)
+SEGMENT_ROWS = 65536
+# Every INDEX_STRIDE-th timestamp of a segment is kept in memory for binary search
+INDEX_STRIDE = 1024
+
+TIMESTAMP_FILE = 'timestamp.i64'
+TIMESTAMP_DTYPE = np.dtype('<i8')
+VALUE_DTYPE = np.dtype('<f4')
+COLUMN_FILES = tuple(f"{name}.f32" for name in SENSOR_FIELDS + ('pump_status',))
+# Held (flock) by the one process allowed to append under a root
+LOCK_FILE = '.lock'
+
+
+class HistoryLockedError(RuntimeError):
+    """Another process is writing to the same history root"""
+
+
+def device_directory_name(device_id):
+    """Filesystem-safe, reversible directory name for a device id"""
+    name = quote(device_id, safe='')
+    # quote() leaves dots alone; keep '.' and '..' from meaning the current or parent directory
+    return '%2E' + name[1:] if name.startswith('.') else name
+
+
+class Segment:
+    """One directory of equally long column files, appended to in place.
+
+    ``repair`` truncates a partially written tail; only the process holding
+    the root's lock may do that, since for anyone else the tail may be an
+    append still in progress.
+    """
+
+    def __init__(self, path, repair=True):
+        self.path = path
+        self.start_ms = int(os.path.basename(path))
+        os.makedirs(path, exist_ok=True)
+        files = (TIMESTAMP_FILE,) + COLUMN_FILES
+        sizes = [os.path.getsize(self._file(name)) if os.path.exists(self._file(name)) else 0 for name in files]
+        self.count = min(sizes[0] // TIMESTAMP_DTYPE.itemsize, min(sizes[1:]) // VALUE_DTYPE.itemsize)
+        for name in files if repair else ():
+            itemsize = TIMESTAMP_DTYPE.itemsize if name == TIMESTAMP_FILE else VALUE_DTYPE.itemsize
+            with open(self._file(name), 'ab') as f:
+                if f.tell() != self.count * itemsize:
+                    logger.info(f"Truncating partially written {self._file(name)} to {self.count} readings")
+                    f.truncate(self.count * itemsize)
+        timestamps = self.view()[0]
+        self.index = timestamps[::INDEX_STRIDE].copy()
+        self.last_ms = int(timestamps[-1]) if self.count else None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def append(self, timestamps, rows):
+        """Write readings (timestamps newer than ``last_ms``, rows of COLUMN_COUNT floats) to the end of every column"""
+        timestamps = np.ascontiguousarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        rows = np.asarray(rows, dtype=VALUE_DTYPE)
+        with open(self._file(TIMESTAMP_FILE), 'ab') as f:
+            f.write(timestamps.tobytes())
+        for column, name in enumerate(COLUMN_FILES):
+            with open(self._file(name), 'ab') as f:
+                f.write(np.ascontiguousarray(rows[:, column]).tobytes())
+        first_indexed = -(-self.count // INDEX_STRIDE) * INDEX_STRIDE
+        self.index = np.concatenate((self.index, timestamps[first_indexed - self.count::INDEX_STRIDE]))
+        self.count += len(timestamps)
+        self.last_ms = int(timestamps[-1])
+
+    def view(self):
+        """Memory maps of the first ``count`` readings: (timestamps, [one array per column]).
+
+        Mapped per read rather than cached: every open map holds a file
+        descriptor, and the segment being appended to grows past its maps.
+        """
+        if self.count == 0:
+            return np.empty(0, dtype=TIMESTAMP_DTYPE), np.empty((COLUMN_COUNT, 0), dtype=VALUE_DTYPE)
+        timestamps = np.memmap(self._file(TIMESTAMP_FILE), dtype=TIMESTAMP_DTYPE, mode='r', shape=(self.count,))
+        columns = [np.memmap(self._file(name), dtype=VALUE_DTYPE, mode='r', shape=(self.count,)) for name in COLUMN_FILES]
+        return timestamps, columns
+
+    def bounds(self, view, start_ms, end_ms):
+        """Row range [lo, hi) of readings with start_ms <= timestamp <= end_ms"""
+        timestamps = view[0]
+
+        def search(value, side):
+            # The sparse index narrows the search to one stride of the mapped column
+            block = max(0, int(np.searchsorted(self.index, value, side)) - 1)
+            lo = block * INDEX_STRIDE
+            return lo + int(np.searchsorted(timestamps[lo:lo + INDEX_STRIDE + 1], value, side))
+
+        return search(start_ms, 'left'), search(end_ms, 'right')
+
+    def read(self, view, column, lo, hi):
+        """Zero-copy memmap slices of rows [lo, hi) as (timestamps, values).
+
+        ``column`` None returns values as a list of COLUMN_COUNT column
+        slices, since the columns live in separate files. The slices keep
+        their file mapped (and its descriptor open) until they are released.
+        """
+        timestamps, columns = view
+        if column is None:
+            return timestamps[lo:hi], [values[lo:hi] for values in columns]
+        return timestamps[lo:hi], columns[column][lo:hi]
+
+
+def _gather(parts, column):
+    """Copy (timestamps, values) parts from Segment.read into one pair of arrays, in a single pass"""
+    total = sum(len(timestamps) for timestamps, _ in parts)
+    timestamps_out = np.empty(total, dtype=np.int64)
+    values_out = np.empty((total,) if column is not None else (COLUMN_COUNT, total), dtype=np.float32)
+    offset = 0
+    for timestamps, values in parts:
+        end = offset + len(timestamps)
+        timestamps_out[offset:end] = timestamps
+        if column is not None:
+            values_out[offset:end] = values
+        else:
+            for index, column_values in enumerate(values):
+                values_out[index, offset:end] = column_values
+        offset = end
+    return timestamps_out, values_out
+
+
+class DeviceHistory:
+    """Ordered segments of one device; only the newest one is appended to"""
+
+    def __init__(self, path, repair=True):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        names = sorted((name for name in os.listdir(path) if name.isdigit()), key=int)
+        self.segments = [Segment(os.path.join(path, name), repair) for name in names]
+
+    @property
+    def count(self):
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def oldest_timestamp(self):
+        for segment in self.segments:
+            if segment.count:
+                return int(segment.index[0])
+        return None
+
+    @property
+    def latest_timestamp(self):
+        for segment in reversed(self.segments):
+            if segment.count:
+                return segment.last_ms
+        return None
+
+    def append(self, timestamps, rows):
+        """Append readings newer than everything stored, opening new segments as each one fills"""
+        with self._lock:
+            latest = self.latest_timestamp
+            if latest is not None:
+                newer = np.asarray(timestamps) > latest
+                timestamps, rows = np.asarray(timestamps)[newer], np.asarray(rows)[newer]
+            written = 0
+            while written < len(timestamps):
+                segment = self.segments[-1] if self.segments else None
+                if segment is None or segment.count >= SEGMENT_ROWS:
+                    segment = Segment(os.path.join(self.path, str(int(timestamps[written]))))
+                    self.segments.append(segment)
+                take = min(len(timestamps) - written, SEGMENT_ROWS - segment.count)
+                segment.append(timestamps[written:written + take], rows[written:written + take])
+                written += take
+            return written
+
+    def iter_range(self, column, start_ms, end_ms):
+        """Yield (timestamps, values) per segment for start_ms <= timestamp <= end_ms, oldest first.
+
+        The arrays are memmap views (see Segment.read); consume each segment
+        before moving on rather than holding on to them.
+        """
+        with self._lock:
+            segments = [segment for segment in self.segments
+                        if segment.count and segment.start_ms <= end_ms and segment.last_ms >= start_ms]
+        for segment in segments:
+            view = segment.view()
+            lo, hi = segment.bounds(view, start_ms, end_ms)
+            if hi > lo:
+                yield segment.read(view, column, lo, hi)
+
+    def range(self, column, start_ms, end_ms):
+        """Readings with start_ms <= timestamp <= end_ms, oldest first, as (timestamps, values) in memory.
+
+        ``column`` None returns values as (COLUMN_COUNT, n).
+        """
+        return _gather(list(self.iter_range(column, start_ms, end_ms)), column)
+
+    def tail(self, n):
+        """The newest ``n`` readings as (timestamps, values[COLUMN_COUNT, n]), oldest first, in memory"""
+        with self._lock:
+            parts = []
+            for segment in reversed(self.segments):
+                if n <= 0:
+                    break
+                take = min(n, segment.count)
+                parts.append(segment.read(segment.view(), None, segment.count - take, segment.count))
+                n -= take
+        parts.reverse()
+        return _gather(parts, None)
+
+
+class SensorHistory:
+    """Per-device on-disk history under ``root``.
+
+    Any number of processes can open a root and read it, but only one may
+    append: the first to write takes an exclusive flock on ``root/.lock``
+    and keeps it until it exits. Writes from any other process, including
+    a child forked from the owner, raise HistoryLockedError.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._lock_error_logged = False
+        os.makedirs(root, exist_ok=True)
+        # Held only while opening, so a pre-forking server's master does not keep it from its workers
+        fd = self._try_lock()
+        try:
+            self._devices = self._open_devices(repair=fd is not None)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _try_lock(self):
+        """A descriptor holding the root's lock, or None if another process holds it"""
+        fd = os.open(os.path.join(self.root, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _open_devices(self, repair):
+        devices = {}
+        for name in sorted(os.listdir(self.root)):
+            if os.path.isdir(os.path.join(self.root, name)):
+                devices[unquote(name)] = DeviceHistory(os.path.join(self.root, name), repair)
+        return devices
+
+    def ensure_writable(self):
+        """Take the root's lock for this process on its first write; raises HistoryLockedError if another process has it"""
+        if self._lock_pid == os.getpid():
+            return
+        with self._lock:
+            if self._lock_pid == os.getpid():
+                return
+            # A forked child inherits the owner's descriptor, but a fresh one only locks once the owner is gone
+            fd = self._try_lock()
+            if fd is None:
+                if not self._lock_error_logged:
+                    self._lock_error_logged = True
+                    logger.error(f"Sensor history {self.root} is locked by another process; this one will not write "
+                                 f"to it (run a single server worker when SENSOR_HISTORY_DIR is set)")
+                raise HistoryLockedError(f"Sensor history {self.root} is being written by another process")
+            self._lock_fd, self._lock_pid = fd, os.getpid()
+            # Another process may have appended since the root was opened; start from what is on disk
+            self._devices = self._open_devices(repair=True)
+
+    def device_ids(self):
+        return sorted(self._devices)
+
+    def device(self, device_id, create=False):
+        history = self._devices.get(device_id)
+        if history is None and create:
+            with self._lock:
+                history = self._devices.get(device_id)
+                if history is None:
+                    history = self._devices[device_id] = DeviceHistory(os.path.join(self.root, device_directory_name(device_id)))
+        return history
+
+    def append(self, device_id, timestamps, rows):
+        if len(timestamps) == 0:
+            return 0
+        self.ensure_writable()
+        return self.device(device_id, create=True).append(timestamps, rows)
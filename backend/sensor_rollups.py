@@ -0,0 +1,147 @@
+"""
+Incremental min/max/mean/count rollups of sensor readings, and LTTB downsampling
+
+Every appended reading is folded into per-minute, per-hour and per-day
+buckets as it arrives, so a month of history is answered from a few
+hundred pre-aggregated buckets instead of hundreds of thousands of raw
+readings. Buckets are aligned to UTC epoch boundaries and live in a ring
+addressed by bucket number, so batches may arrive in any order.
+"""
+
+import threading
+
+import numpy as np
+
+# (name, bucket width in milliseconds), finest first
+ROLLUP_RESOLUTIONS = (('1m', 60 * 1000), ('1h', 60 * 60 * 1000), ('1d', 24 * 60 * 60 * 1000))
+# Buckets kept per device: 2 days of minutes, 90 days of hours, 3 years of days
+DEFAULT_ROLLUP_CAPACITIES = {'1m': 2880, '1h': 2160, '1d': 1095}
+
+
+class RollupSeries:
+    """Fixed number of time buckets holding per-column count, sum, min and max"""
+
+    def __init__(self, bucket_ms, capacity, columns):
+        self.bucket_ms = int(bucket_ms)
+        self.capacity = max(1, int(capacity))
+        self.starts = np.full(self.capacity, -1, dtype=np.int64)
+        self.counts = np.zeros((columns, self.capacity), dtype=np.int32)
+        self.sums = np.zeros((columns, self.capacity), dtype=np.float64)
+        self.mins = np.full((columns, self.capacity), np.nan, dtype=np.float32)
+        self.maxs = np.full((columns, self.capacity), np.nan, dtype=np.float32)
+        self.latest_bucket = None
+        self._lock = threading.Lock()
+
+    def oldest_retained(self):
+        """Start of the oldest bucket the ring can still hold, given the newest one seen"""
+        if self.latest_bucket is None:
+            return None
+        return (self.latest_bucket - self.capacity + 1) * self.bucket_ms
+
+    def add(self, timestamps, rows):
+        """Fold readings (sorted by timestamp, one row of floats each, NaN = not reported) into their buckets"""
+        if len(timestamps) == 0:
+            return
+        buckets = np.asarray(timestamps, dtype=np.int64) // self.bucket_ms
+        rows = np.asarray(rows, dtype=np.float32)
+        with self._lock:
+            newest = max(int(buckets[-1]), self.latest_bucket if self.latest_bucket is not None else int(buckets[-1]))
+            # Buckets that would already have been overwritten are dropped, which also keeps slots unique below
+            keep = buckets > newest - self.capacity
+            buckets, rows = buckets[keep], rows[keep]
+            if len(buckets) == 0:
+                return
+            self.latest_bucket = newest
+
+            first = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+            unique = buckets[first]
+            slots = unique % self.capacity
+            starts = unique * self.bucket_ms
+            stale = self.starts[slots] != starts
+            if stale.any():
+                reset = slots[stale]
+                self.starts[reset] = starts[stale]
+                self.counts[:, reset] = 0
+                self.sums[:, reset] = 0.0
+                self.mins[:, reset] = np.nan
+                self.maxs[:, reset] = np.nan
+
+            reported = ~np.isnan(rows)
+            self.counts[:, slots] += np.add.reduceat(reported.astype(np.int32), first, axis=0).T
+            self.sums[:, slots] += np.add.reduceat(np.where(reported, rows, 0.0).astype(np.float64), first, axis=0).T
+            # fmin/fmax ignore NaN, so unreported metrics and empty buckets merge cleanly
+            self.mins[:, slots] = np.fmin(self.mins[:, slots], np.fmin.reduceat(rows, first, axis=0).T)
+            self.maxs[:, slots] = np.fmax(self.maxs[:, slots], np.fmax.reduceat(rows, first, axis=0).T)
+
+    def query(self, column, start_ms, end_ms):
+        """Buckets overlapping [start_ms, end_ms] with at least one value, oldest first.
+
+        Returns (bucket starts, counts, means, mins, maxs) as arrays.
+        """
+        with self._lock:
+            selected = np.flatnonzero((self.starts > start_ms - self.bucket_ms) & (self.starts <= end_ms) & (self.counts[column] > 0))
+            selected = selected[np.argsort(self.starts[selected], kind='stable')]
+            counts = self.counts[column, selected]
+            return (self.starts[selected], counts, self.sums[column, selected] / counts,
+                    self.mins[column, selected], self.maxs[column, selected])
+
+
+class DeviceRollups:
+    """The 1m/1h/1d rollups of one device"""
+
+    def __init__(self, columns, capacities=None):
+        capacities = {**DEFAULT_ROLLUP_CAPACITIES, **(capacities or {})}
+        self.series = {name: RollupSeries(bucket_ms, capacities[name], columns) for name, bucket_ms in ROLLUP_RESOLUTIONS}
+        # Readings before this were never added (e.g. older history not replayed at boot); None if none are missing
+        self.complete_from_ms = None
+
+    def add(self, timestamps, rows):
+        for series in self.series.values():
+            series.add(timestamps, rows)
+
+    def covering(self, start_ms):
+        """Finest resolution whose retained buckets reach back to ``start_ms`` (None if none does)"""
+        if self.complete_from_ms is not None and self.complete_from_ms > start_ms:
+            return None
+        for name, _ in ROLLUP_RESOLUTIONS:
+            oldest = self.series[name].oldest_retained()
+            if oldest is not None and oldest <= start_ms:
+                return name
+        return None
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points that keep the shape of (x, y).
+
+    The first and last points are always kept. Each bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the mean of the next bucket, which preserves peaks and troughs that plain
+    decimation or averaging would flatten.
+    """
+    n = len(x)
+    if threshold >= n or n < 3:
+        return np.arange(n)
+    threshold = max(3, int(threshold))
+    x = np.asarray(x, dtype=np.float64) - float(x[0])
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket i covers [edges[i], edges[i + 1]); the last one ends at the final point
+    edges = np.floor(np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    next_lo = edges[1:]
+    next_hi = np.append(edges[2:], n)
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+    widths = next_hi - next_lo
+    next_x = (x_sums[next_hi] - x_sums[next_lo]) / widths
+    next_y = (y_sums[next_hi] - y_sums[next_lo]) / widths
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
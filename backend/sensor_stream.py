@@ -0,0 +1,134 @@
+"""
+Server-sent events fan-out of new sensor readings and alerts
+
+The ingest path publishes each batch once: every reading is encoded to an
+SSE frame a single time and the same string is appended to every matching
+subscriber's bounded queue. A subscriber that falls more than its queue
+size behind is dropped (it reconnects and resumes) instead of buffering
+without limit. Recent frames are kept in a replay log so a reconnecting
+client that sends Last-Event-ID receives only the readings it missed.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+# Sent to a client whose Last-Event-ID cannot be resumed; it should refetch /data/last30
+RESET_FRAME = 'event: reset\ndata: {}\n\n'
+# Sent to a client that fell too far behind before its stream is closed
+DROPPED_FRAME = 'event: dropped\ndata: {}\n\n'
+KEEPALIVE_FRAME = ': keepalive\n\n'
+
+
+def format_event(event_id, event, payload):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    """One connected client: a bounded queue of encoded frames and a wake-up callback"""
+
+    def __init__(self, device_id, max_queue, notify):
+        self.device_id = device_id
+        self.max_queue = max(1, int(max_queue))
+        self.notify = notify
+        self.frames = deque()
+        self.dropped = False
+
+    def drain(self):
+        """Everything queued so far, joined into one chunk to write"""
+        frames = []
+        while True:
+            try:
+                frames.append(self.frames.popleft())
+            except IndexError:
+                return ''.join(frames)
+
+
+class SensorEventHub:
+    """Single-producer, many-consumer broadcaster of reading events with Last-Event-ID replay.
+
+    Event ids are ``<boot>-<sequence>``: the boot part changes on every
+    process start, so a client resuming with an id from a previous process
+    gets a reset instead of a silently incomplete replay.
+    """
+
+    def __init__(self, replay_size=1000, max_queue=256, max_subscribers=1000):
+        self.boot = format(int(time.time() * 1000), 'x')
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._sequence = 0
+        self._replay = deque(maxlen=max(1, int(replay_size)))
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.dropped_total = 0
+
+    def _parse_event_id(self, event_id):
+        boot, _, sequence = (event_id or '').partition('-')
+        if boot != self.boot or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def publish(self, records, event='reading'):
+        """Broadcast records (dicts with a device_id) as ``event`` events, oldest first; returns the number of frames queued"""
+        if not records:
+            return 0
+        queued = 0
+        with self._lock:
+            frames = []
+            for record in records:
+                self._sequence += 1
+                frame = format_event(f"{self.boot}-{self._sequence}", event, record)
+                self._replay.append((self._sequence, record.get('device_id'), frame))
+                frames.append((record.get('device_id'), frame))
+            for subscriber in list(self._subscribers):
+                matching = [frame for device_id, frame in frames
+                            if subscriber.device_id is None or subscriber.device_id == device_id]
+                if not matching:
+                    continue
+                if len(subscriber.frames) + len(matching) > subscriber.max_queue:
+                    # Slow consumer: stop feeding it; the client reconnects with Last-Event-ID
+                    subscriber.dropped = True
+                    self._subscribers.discard(subscriber)
+                    self.dropped_total += 1
+                else:
+                    subscriber.frames.extend(matching)
+                    queued += len(matching)
+                subscriber.notify()
+        return queued
+
+    def subscribe(self, device_id=None, last_event_id=None, notify=lambda: None):
+        """Register a client; returns (subscriber, initial chunk) or (None, None) when full.
+
+        The initial chunk replays every frame after ``last_event_id`` (or a
+        reset frame when that id is unknown or too old), registered under
+        the same lock as publish so no reading falls between replay and live.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None, None
+            subscriber = Subscriber(device_id, self.max_queue, notify)
+            initial = []
+            if last_event_id:
+                after = self._parse_event_id(last_event_id)
+                oldest = self._replay[0][0] if self._replay else self._sequence + 1
+                if after is None or after > self._sequence or after < oldest - 1:
+                    initial.append(RESET_FRAME)
+                else:
+                    initial.extend(frame for sequence, record_device, frame in self._replay
+                                   if sequence > after and (device_id is None or record_device == device_id))
+            self._subscribers.add(subscriber)
+            return subscriber, ''.join(initial)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'dropped_total': self.dropped_total,
+                'last_event_id': f"{self.boot}-{self._sequence}",
+                'replay_events': len(self._replay),
+            }
@@ -0,0 +1,404 @@
+"""
+In-memory sensor telemetry: NDJSON ingest into per-device columnar ring buffers
+
+Each device gets a preallocated buffer holding one int64 timestamp column
+and one float32 column per metric. Appends write into the next slots
+(wrapping around) in O(1) per reading, and latest/last-N queries gather
+straight from memory, so dashboards never touch storage.
+Every reading is also folded into 1m/1h/1d rollups (sensor_rollups.py),
+which serve long ranges after the raw buffer has wrapped, and, when a
+SensorHistory is attached, appended to disk (sensor_history.py).
+Records use the same fields and timestamp format as the dashboard's
+SensorApiService (`/data/latest`, `/data/last30`).
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from sensor_rollups import ROLLUP_RESOLUTIONS, DeviceRollups, lttb
+
+logger = logging.getLogger(__name__)
+
+# Numeric metrics, stored as float32 columns in this order
+SENSOR_FIELDS = ('pH', 'airTemp', 'waterTemp', 'tds', 'humidity', 'dissolved_oxygen_mg_l')
+# pump_status is stored as 1.0 ("on") / 0.0 ("off") in the column after the metrics
+PUMP_STATUS_COLUMN = len(SENSOR_FIELDS)
+COLUMN_COUNT = len(SENSOR_FIELDS) + 1
+
+DEFAULT_DEVICE_ID = 'default'
+# Longest device id in UTF-8 bytes; ids name directories in the on-disk history
+MAX_DEVICE_ID_BYTES = 64
+
+# Accepted timestamps: 2000-01-01 to 2100-01-01 UTC, in epoch milliseconds
+MIN_TIMESTAMP_MS = 946684800000
+MAX_TIMESTAMP_MS = 4102444800000
+
+# Timestamp format used by the upstream sensor API, e.g. "2025:01:15 14:30:05" (local time)
+TIMESTAMP_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+
+class SensorRecordError(ValueError):
+    pass
+
+
+def parse_timestamp_ms(value, default_ms):
+    """Epoch milliseconds from epoch seconds/milliseconds, the upstream format or ISO 8601"""
+    if value is None:
+        return default_ms
+    timestamp_ms = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        # Heuristic: values past ~2001-09 in milliseconds, anything smaller is seconds
+        timestamp_ms = int(value) if value > 1e12 else int(value * 1000)
+    elif isinstance(value, str):
+        for parse in (lambda text: datetime.strptime(text, TIMESTAMP_FORMAT), datetime.fromisoformat):
+            try:
+                timestamp_ms = int(parse(value.strip()).timestamp() * 1000)
+                break
+            except (ValueError, OverflowError, OSError):
+                continue
+    if timestamp_ms is None:
+        raise SensorRecordError(f"Invalid timestamp: {value!r}")
+    # Also keeps every stored timestamp well inside int64
+    if not MIN_TIMESTAMP_MS <= timestamp_ms < MAX_TIMESTAMP_MS:
+        raise SensorRecordError(f"Timestamp out of range (years 2000-2099): {value!r}")
+    return timestamp_ms
+
+
+def format_timestamp(timestamp_ms):
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(timestamp_ms / 1000.0))
+
+
+def metric_column(field):
+    """Column index of a metric name (pump_status gives the fraction of time the pump was on)"""
+    if field == 'pump_status':
+        return PUMP_STATUS_COLUMN
+    if field not in SENSOR_FIELDS:
+        raise SensorRecordError(f"Unknown metric {field!r}; expected one of {', '.join(SENSOR_FIELDS)}, pump_status")
+    return SENSOR_FIELDS.index(field)
+
+
+def parse_sensor_record(record, received_ms):
+    """Validate one decoded JSON object; returns (device_id, timestamp_ms, row of COLUMN_COUNT floats)"""
+    if not isinstance(record, dict):
+        raise SensorRecordError("Each line must be a JSON object")
+    device_id = str(record.get('device_id', DEFAULT_DEVICE_ID))
+    if not device_id or len(device_id.encode('utf-8', 'surrogatepass')) > MAX_DEVICE_ID_BYTES:
+        raise SensorRecordError(f"device_id must be 1 to {MAX_DEVICE_ID_BYTES} bytes long")
+    timestamp_ms = parse_timestamp_ms(record.get('timestamp', record.get('ts')), received_ms)
+
+    row = [float('nan')] * COLUMN_COUNT
+    present = False
+    for column, field in enumerate(SENSOR_FIELDS):
+        value = record.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise SensorRecordError(f"{field} must be a number")
+        row[column] = float(value)
+        present = True
+
+    pump_status = record.get('pump_status')
+    if pump_status is not None:
+        if pump_status not in ('on', 'off', True, False, 1, 0):
+            raise SensorRecordError("pump_status must be \"on\" or \"off\"")
+        row[PUMP_STATUS_COLUMN] = 1.0 if pump_status in ('on', True, 1) else 0.0
+        present = True
+
+    if not present:
+        raise SensorRecordError(f"No sensor fields; expected any of {', '.join(SENSOR_FIELDS)}, pump_status")
+    return device_id, timestamp_ms, row
+
+
+def parse_ndjson(body, received_ms=None):
+    """Parse an NDJSON body into per-device (timestamps, rows) plus a list of per-line errors"""
+    received_ms = int(time.time() * 1000) if received_ms is None else received_ms
+    by_device = {}
+    errors = []
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            device_id, timestamp_ms, row = parse_sensor_record(json.loads(line), received_ms)
+        except (ValueError, TypeError, OverflowError) as e:
+            errors.append({'line': line_number, 'error': str(e)})
+            continue
+        timestamps, rows = by_device.setdefault(device_id, ([], []))
+        timestamps.append(timestamp_ms)
+        rows.append(row)
+    return by_device, errors
+
+
+class SensorRingBuffer:
+    """Fixed-capacity columnar buffer of one device's readings, oldest overwritten first"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.timestamps = np.zeros(self.capacity, dtype=np.int64)
+        # Column-major: each metric's history is one contiguous row
+        self.values = np.full((COLUMN_COUNT, self.capacity), np.nan, dtype=np.float32)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def oldest_timestamp(self):
+        if self.count == 0:
+            return None
+        return int(self.timestamps[(self.count - len(self)) % self.capacity])
+
+    @property
+    def latest_timestamp(self):
+        if self.count == 0:
+            return None
+        return int(self.timestamps[(self.count - 1) % self.capacity])
+
+    def extend(self, timestamps, rows):
+        """Append readings in timestamp order, skipping any not newer than the latest stored one.
+
+        Returns the accepted (timestamps, rows), including any older than the
+        newest ``capacity`` in a large backfill (still passed on to rollups
+        and history); readings that were skipped are usually controller
+        retries of a batch that was already ingested.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.float32).reshape(len(timestamps), COLUMN_COUNT)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, rows = timestamps[order], rows[order]
+        with self._lock:
+            latest = self.latest_timestamp
+            if latest is not None:
+                newer = timestamps > latest
+                timestamps, rows = timestamps[newer], rows[newer]
+            # Within the batch, keep the first reading for each timestamp
+            if len(timestamps) > 1:
+                unique = np.concatenate(([True], timestamps[1:] != timestamps[:-1]))
+                timestamps, rows = timestamps[unique], rows[unique]
+            # Only the newest `capacity` readings can survive in the buffer; all of them are returned
+            kept_timestamps, kept_rows = timestamps[-self.capacity:], rows[-self.capacity:]
+            if len(kept_timestamps):
+                slots = (self.count + np.arange(len(kept_timestamps))) % self.capacity
+                self.timestamps[slots] = kept_timestamps
+                self.values[:, slots] = kept_rows.T
+                self.count += len(kept_timestamps)
+            return timestamps, rows
+
+    def last(self, n):
+        """The newest ``n`` readings, oldest first, as (timestamps, values[COLUMN_COUNT, n]) copies"""
+        with self._lock:
+            n = max(0, min(int(n), len(self)))
+            slots = (self.count - n + np.arange(n)) % self.capacity
+            return self.timestamps[slots], self.values[:, slots]
+
+    def range(self, column, start_ms, end_ms):
+        """Readings with start_ms <= timestamp <= end_ms, oldest first, as (timestamps, values).
+
+        ``column`` None returns every column as values[COLUMN_COUNT, n].
+        """
+        with self._lock:
+            n = len(self)
+            slots = (self.count - n + np.arange(n)) % self.capacity
+            timestamps = self.timestamps[slots]
+            lo, hi = np.searchsorted(timestamps, start_ms, 'left'), np.searchsorted(timestamps, end_ms, 'right')
+            if column is None:
+                return timestamps[lo:hi], self.values[:, slots[lo:hi]]
+            return timestamps[lo:hi], self.values[column, slots[lo:hi]]
+
+
+def records_from_columns(device_id, timestamps, values, newest_first=False):
+    """LatestMetrics-shaped dicts; metrics that were not reported are omitted"""
+    columns = [column.tolist() for column in values]
+    records = []
+    for index, timestamp_ms in enumerate(timestamps.tolist()):
+        record = {'device_id': device_id, 'timestamp': format_timestamp(timestamp_ms)}
+        for column, field in enumerate(SENSOR_FIELDS):
+            value = columns[column][index]
+            if value == value:  # not NaN
+                record[field] = round(value, 4)
+        pump = columns[PUMP_STATUS_COLUMN][index]
+        if pump == pump:
+            record['pump_status'] = 'on' if pump >= 0.5 else 'off'
+        records.append(record)
+    if newest_first:
+        records.reverse()
+    return records
+
+
+# Columns of sensor exports, with their Parquet kinds (see export.py)
+EXPORT_FIELDS = (('device_id', 'str'), ('timestamp', 'str'), ('timestamp_ms', 'int')) + \
+    tuple((field, 'float') for field in SENSOR_FIELDS) + (('pump_status', 'str'),)
+
+
+def export_batch(device_id, timestamps, values):
+    """Columnar export batch (lists with None for unreported metrics) from timestamps and COLUMN_COUNT value columns"""
+    timestamp_list = timestamps.tolist()
+    batch = {
+        'device_id': [device_id] * len(timestamp_list),
+        'timestamp': [format_timestamp(timestamp_ms) for timestamp_ms in timestamp_list],
+        'timestamp_ms': timestamp_list,
+    }
+    for column, field in enumerate(SENSOR_FIELDS):
+        rounded = np.round(values[column].astype(np.float64), 4)
+        batch[field] = np.where(np.isnan(rounded), None, rounded).tolist()
+    pump = values[PUMP_STATUS_COLUMN]
+    batch['pump_status'] = np.where(np.isnan(pump), None, np.where(pump >= 0.5, 'on', 'off')).tolist()
+    return batch
+
+
+class SensorStore:
+    """Ring buffers for every device seen, created on first ingest"""
+
+    def __init__(self, capacity_per_device=17280, max_devices=1000, rollup_capacities=None, history=None):
+        self.capacity = capacity_per_device
+        self.max_devices = max_devices
+        self.rollup_capacities = rollup_capacities
+        self.history = history
+        self._buffers = {}
+        self._rollups = {}
+        # Serializes each device's buffer, rollup and history writes so all three see batches in the same order
+        self._ingest_locks = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, device_id, create=False):
+        buffer = self._buffers.get(device_id)
+        if buffer is None and create:
+            with self._lock:
+                buffer = self._buffers.get(device_id)
+                if buffer is None:
+                    if len(self._buffers) >= self.max_devices:
+                        raise SensorRecordError(f"Device limit of {self.max_devices} reached")
+                    self._rollups[device_id] = DeviceRollups(COLUMN_COUNT, self.rollup_capacities)
+                    self._ingest_locks[device_id] = threading.Lock()
+                    buffer = self._buffers[device_id] = SensorRingBuffer(self.capacity)
+        return buffer
+
+    def ingest(self, by_device):
+        """Append parsed readings; returns ([(device_id, timestamps, rows) appended], skipped count, per-device errors).
+
+        Raises the history's HistoryLockedError, before anything is stored,
+        when another process owns the attached history.
+        """
+        if self.history is not None:
+            self.history.ensure_writable()
+        appended = []
+        skipped = 0
+        errors = []
+        for device_id, (timestamps, rows) in by_device.items():
+            try:
+                buffer = self.buffer(device_id, create=True)
+            except SensorRecordError as e:
+                errors.append({'device_id': device_id, 'error': str(e)})
+                continue
+            with self._ingest_locks[device_id]:
+                new_timestamps, new_rows = buffer.extend(timestamps, rows)
+                self._rollups[device_id].add(new_timestamps, new_rows)
+                if self.history is not None:
+                    self.history.append(device_id, new_timestamps, new_rows)
+            appended.append((device_id, new_timestamps, new_rows))
+            skipped += len(timestamps) - len(new_timestamps)
+        return appended, skipped, errors
+
+    def iter_range(self, device_id, start_ms, end_ms, chunk_rows=8192):
+        """Yield (timestamps, values) chunks of every reading in the range, oldest first.
+
+        ``values`` holds COLUMN_COUNT per-column arrays. Reads the attached
+        history when there is one, a segment at a time and without copying
+        (memmap views), otherwise the ring buffer.
+        """
+        history = self.history.device(device_id) if self.history is not None else None
+        if history is not None:
+            parts = history.iter_range(None, start_ms, end_ms)
+        else:
+            buffer = self.buffer(device_id)
+            parts = [buffer.range(None, start_ms, end_ms)] if buffer is not None else []
+        for timestamps, values in parts:
+            for offset in range(0, len(timestamps), chunk_rows):
+                yield timestamps[offset:offset + chunk_rows], [column[offset:offset + chunk_rows] for column in values]
+
+    def restore(self, rollup_replay_ms):
+        """Refill the ring buffers from the attached history, and the rollups from its last ``rollup_replay_ms``.
+
+        Returns the number of devices restored.
+        """
+        restored = 0
+        for device_id in self.history.device_ids():
+            device_history = self.history.device(device_id)
+            latest = device_history.latest_timestamp
+            if latest is None:
+                continue
+            try:
+                buffer = self.buffer(device_id, create=True)
+            except SensorRecordError as e:
+                logger.error(f"Not restoring sensor history of {device_id}: {str(e)}")
+                continue
+            timestamps, values = device_history.tail(self.capacity)
+            buffer.extend(timestamps, values.T)
+            rollups = self._rollups[device_id]
+            replay_from = latest - rollup_replay_ms
+            for timestamps, values in device_history.iter_range(None, replay_from, latest):
+                rollups.add(timestamps, np.stack(values, axis=1))
+            if device_history.oldest_timestamp < replay_from:
+                rollups.complete_from_ms = replay_from
+            restored += 1
+        return restored
+
+    def last(self, device_id, n):
+        """The newest ``n`` records of a device, newest first (None for an unknown device)"""
+        buffer = self.buffer(device_id)
+        if buffer is None:
+            return None
+        timestamps, values = buffer.last(n)
+        return records_from_columns(device_id, timestamps, values, newest_first=True)
+
+    def series(self, device_id, field, start_ms, end_ms, max_points, resolution=None):
+        """One metric over a time range, downsampled to at most ``max_points`` with LTTB.
+
+        Raw readings are used while the ring buffer still reaches back to
+        ``start_ms``; older ranges come from the finest rollup (bucket means)
+        that does, or else from raw readings in the attached history. Returns (resolution, timestamps, values, points before
+        downsampling), or None for an unknown device.
+        """
+        buffer = self.buffer(device_id)
+        if buffer is None:
+            return None
+        column = metric_column(field)
+        oldest = buffer.oldest_timestamp
+        buffer_covers = buffer.count < buffer.capacity or (oldest is not None and oldest <= start_ms)
+        history = self.history.device(device_id) if self.history is not None else None
+        if resolution is None:
+            resolution = 'raw' if buffer_covers else self._rollups[device_id].covering(start_ms)
+            if resolution is None:
+                resolution = 'raw' if history is not None else ROLLUP_RESOLUTIONS[-1][0]
+        if resolution == 'raw':
+            source = buffer if buffer_covers or history is None else history
+            timestamps, values = source.range(column, start_ms, end_ms)
+            present = ~np.isnan(values)
+            timestamps, values = timestamps[present], values[present]
+        else:
+            timestamps, _, values, _, _ = self.rollup(device_id, resolution, column, start_ms, end_ms)
+        selected = lttb(timestamps, values, max_points)
+        return resolution, timestamps[selected], values[selected], len(timestamps)
+
+    def rollup(self, device_id, resolution, column, start_ms, end_ms):
+        """(bucket starts, counts, means, mins, maxs) of one column at ``resolution`` ('1m', '1h' or '1d'), or None for an unknown device"""
+        rollups = self._rollups.get(device_id)
+        if rollups is None:
+            return None
+        series = rollups.series.get(resolution)
+        if series is None:
+            raise SensorRecordError(f"Unknown resolution {resolution!r}")
+        return series.query(column, start_ms, end_ms)
+
+    def devices(self):
+        return {
+            device_id: {'readings': len(buffer), 'latest_timestamp': format_timestamp(buffer.latest_timestamp)}
+            for device_id, buffer in sorted(self._buffers.items())
+            if buffer.count
+        }
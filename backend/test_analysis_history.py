@@ -0,0 +1,29 @@
+import json
+
+import analysis_history
+from analysis_history import AnalysisHistory
+
+
+def test_appends_from_two_writers_stay_in_timestamp_order(tmp_path, monkeypatch):
+    path = str(tmp_path / 'analyses.ndjson')
+    # Two workers appending to one log, one of them with a clock 10 s ahead
+    ahead, behind = AnalysisHistory(path), AnalysisHistory(path)
+    now = [1_760_000_000.0]
+    monkeypatch.setattr(analysis_history.time, 'time', lambda: now[0])
+    for i in range(200):
+        now[0] += 0.001
+        writer = ahead if i % 2 else behind
+        if writer is ahead:
+            now[0] += 10
+        writer.append({'outcome': 'accepted', 'index': i})
+        if writer is ahead:
+            now[0] -= 10
+
+    with open(path) as f:
+        timestamps = [json.loads(line)['timestamp_ms'] for line in f]
+    assert len(timestamps) == 200
+    assert timestamps == sorted(timestamps)
+
+    middle = timestamps[100]
+    found = [record['timestamp_ms'] for record in behind.iter_records(middle, timestamps[-1])]
+    assert found == [t for t in timestamps if t >= middle]
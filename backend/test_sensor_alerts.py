@@ -0,0 +1,30 @@
+import numpy as np
+
+from sensor_alerts import AlertEngine
+from sensors import COLUMN_COUNT, metric_column
+
+
+def readings(timestamps, **metrics):
+    rows = np.full((len(timestamps), COLUMN_COUNT), np.nan, dtype=np.float32)
+    for metric, values in metrics.items():
+        rows[:, metric_column(metric)] = values
+    return np.asarray(timestamps, dtype=np.int64), rows
+
+
+def test_sparse_metric_keeps_its_variance():
+    # pH is reported every 5 s, TDS only with every 20th reading
+    engine = AlertEngine(rules=[{'name': 'tds_anomaly', 'metric': 'tds', 'type': 'zscore', 'value': 4.0}],
+                         ewma_alpha=0.05, min_samples=30)
+    rng = np.random.default_rng(0)
+    n = 4000
+    timestamps, rows = readings(np.arange(n) * 5000, pH=6.2)
+    reported = np.arange(n) % 20 == 0
+    rows[reported, metric_column('tds')] = 800 + rng.normal(0, 5, reported.sum())
+
+    alerts = []
+    for start in range(0, n, 100):
+        alerts += engine.evaluate([('dev-1', timestamps[start:start + 100], rows[start:start + 100])])
+
+    assert alerts == []
+    std = engine.stats('dev-1')['tds']['ewm_std']
+    assert 2 < std < 10
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from sensor_history import COLUMN_FILES, HistoryLockedError, SensorHistory
+from sensors import COLUMN_COUNT
+
+START_MS = 1_760_000_000_000
+
+
+def readings(n, start_ms=START_MS):
+    return np.arange(n, dtype=np.int64) * 5000 + start_ms, np.ones((n, COLUMN_COUNT), dtype=np.float32)
+
+
+def test_second_writer_is_refused_and_leaves_the_tail_alone(tmp_path):
+    owner = SensorHistory(str(tmp_path))
+    owner.append('tank-1', *readings(10))
+    # An append in progress: one column already longer than the others
+    segment_dir = os.path.join(tmp_path, 'tank-1', str(START_MS))
+    with open(os.path.join(segment_dir, COLUMN_FILES[0]), 'ab') as f:
+        f.write(np.zeros(3, dtype='<f4').tobytes())
+
+    other = SensorHistory(str(tmp_path))
+    with pytest.raises(HistoryLockedError):
+        other.append('tank-1', *readings(5, START_MS + 60_000))
+
+    assert os.path.getsize(os.path.join(segment_dir, COLUMN_FILES[0])) == 13 * 4
+    assert other.device('tank-1').count == 10
+
+
+def test_forked_child_cannot_write_while_the_owner_holds_the_lock(tmp_path):
+    owner = SensorHistory(str(tmp_path))
+    owner.append('tank-1', *readings(10))
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            owner.append('tank-1', *readings(5, START_MS + 60_000))
+        except HistoryLockedError:
+            os._exit(0)
+        os._exit(1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert SensorHistory(str(tmp_path)).device('tank-1').count == 10
+
+
+def test_lock_is_free_after_opening_so_a_forked_worker_can_take_it(tmp_path):
+    # A pre-forking server opens the root in its master and ingests in a worker
+    history = SensorHistory(str(tmp_path))
+
+    pid = os.fork()
+    if pid == 0:
+        history.append('tank-1', *readings(10))
+        os._exit(0)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert SensorHistory(str(tmp_path)).device('tank-1').count == 10
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+
+from sensors import MAX_DEVICE_ID_BYTES, SensorStore, parse_ndjson
+
+RECEIVED_MS = 1_760_000_000_000
+
+
+def ndjson(*lines):
+    return '\n'.join(lines)
+
+
+def test_out_of_range_timestamps_are_per_line_errors():
+    body = ndjson(
+        '{"device_id": "tank-1", "ts": Infinity, "pH": 6.1}',
+        '{"device_id": "tank-1", "ts": 1e400, "pH": 6.1}',
+        '{"device_id": "tank-1", "ts": NaN, "pH": 6.1}',
+        '{"device_id": "tank-1", "ts": %d, "pH": 6.1}' % 10 ** 30,
+        '{"device_id": "tank-1", "ts": -5, "pH": 6.1}',
+        '{"device_id": "tank-1", "timestamp": "9999-12-31T23:59:59", "pH": 6.1}',
+        '{"device_id": "tank-1", "ts": 1760000000, "pH": 6.2}',
+    )
+    by_device, errors = parse_ndjson(body, RECEIVED_MS)
+
+    assert [error['line'] for error in errors] == [1, 2, 3, 4, 5, 6]
+    assert list(by_device) == ['tank-1']
+    assert by_device['tank-1'][0] == [1_760_000_000_000]
+
+
+def test_device_id_length_is_capped():
+    body = ndjson(
+        json.dumps({'device_id': 'x' * (MAX_DEVICE_ID_BYTES + 1), 'pH': 6.1}),
+        json.dumps({'device_id': 'é' * MAX_DEVICE_ID_BYTES, 'pH': 6.1}),
+        json.dumps({'device_id': '', 'pH': 6.1}),
+        json.dumps({'device_id': 'x' * MAX_DEVICE_ID_BYTES, 'pH': 6.1}),
+    )
+    by_device, errors = parse_ndjson(body, RECEIVED_MS)
+
+    assert [error['line'] for error in errors] == [1, 2, 3]
+    assert list(by_device) == ['x' * MAX_DEVICE_ID_BYTES]
+
+
+def test_accepted_timestamps_fit_the_ring_buffer():
+    by_device, errors = parse_ndjson('{"ts": 4102444799999, "pH": 6.0}', RECEIVED_MS)
+    store = SensorStore(capacity_per_device=16, max_devices=4)
+    accepted, skipped, store_errors = store.ingest(by_device)
+
+    assert errors == [] and store_errors == []
+    assert int(accepted[0][1][0]) == 4102444799999
+    assert np.asarray(accepted[0][2]).shape == (1, 7)
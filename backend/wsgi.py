@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production servers, e.g. `gunicorn -c gunicorn.conf.py wsgi:app`
+"""
+
+import os
+
+from app import create_app
+
+# gunicorn.conf.py sets PRELOAD_MODEL when the master loads the model before forking
+app = create_app(initialize_in_background=os.environ.get('PRELOAD_MODEL') != '1')
@@ -4,13 +4,247 @@ Manual TensorFlow.js conversion using older compatible versions
 """
 
 import os
+import sys
 import json
+import time
+import argparse
+import hashlib
+import tempfile
 import numpy as np
 from tensorflow.keras.models import load_model
 
-def create_tfjs_model_manually():
-    """Create TensorFlow.js model files manually"""
+QUANTIZATION_CHOICES = ["float32", "float16", "int8"]
+
+# Directory the web app loads with tf.loadLayersModel; only TF.js-readable exports may go here
+PUBLIC_MODEL_DIR = "public/models/plant_health_classifier"
+
+# Default size of each weight shard file; browsers fetch shards in parallel and cache them separately
+DEFAULT_SHARD_SIZE_MB = 4
+
+def quantize_weight(weight, quantization):
+    """Encode one weight tensor; returns (encoded array, weightsManifest quantization entry or None)
+
+    float16 uses the standard TF.js scheme. int8 stores kernels with one
+    affine scale/zero-point per output channel (last axis); TF.js in the
+    browser cannot read it, so it is meant for the Python backend. Biases
+    stay float32 under int8 since they are tiny and precision-sensitive.
+    """
+    weight = np.asarray(weight, dtype=np.float32)
+    if quantization == "float16":
+        return weight.astype(np.float16), {"dtype": "float16"}
+    if quantization == "int8" and weight.ndim > 1:
+        channels = weight.reshape(-1, weight.shape[-1])
+        # Keep 0.0 inside the range so it stays exactly representable
+        mins = np.minimum(channels.min(axis=0), 0.0)
+        maxs = np.maximum(channels.max(axis=0), 0.0)
+        scales = (maxs - mins) / 255.0
+        scales[scales == 0] = 1.0
+        zero_points = np.round(-128.0 - mins / scales)
+        # In-place steps keep the temporaries to a single float32 copy of the tensor
+        quantized = weight / scales
+        np.round(quantized, out=quantized)
+        quantized += zero_points
+        np.clip(quantized, -128, 127, out=quantized)
+        quantized = quantized.astype(np.int8)
+        return quantized, {
+            "dtype": "int8",
+            "axis": weight.ndim - 1,
+            "scales": [float(scale) for scale in scales],
+            "zeroPoints": [int(zero_point) for zero_point in zero_points]
+        }
+    return weight, None
+
+class ShardedWeightWriter:
+    """Stream weight bytes into fixed-size shard files, hashing each shard as it is written
+
+    Shards are named after their content hash, so a model update only changes
+    the URLs (and browser cache entries) of shards whose bytes changed.
+    A shard_bytes of 0 writes everything into a single shard.
+    """
+    
+    def __init__(self, output_dir, shard_bytes, group_name="group1"):
+        self.output_dir = output_dir
+        self.shard_bytes = shard_bytes
+        self.group_name = group_name
+        self.shards = []
+        self._file = None
+        self._hash = None
+        self._shard_size = 0
+        self._offset = 0
+    
+    def _open_shard(self):
+        temp_name = f".{self.group_name}-shard{len(self.shards) + 1}.partial"
+        self._file = open(os.path.join(self.output_dir, temp_name), "wb")
+        self._hash = hashlib.sha256()
+        self.shards.append({"temp_path": temp_name, "offset": self._offset})
+        self._shard_size = 0
+    
+    def _close_shard(self):
+        self._file.close()
+        self.shards[-1].update(size=self._shard_size, sha256=self._hash.hexdigest())
+        self._file = None
+    
+    def write(self, array):
+        """Append one tensor's bytes, splitting them across shard boundaries without copying"""
+        view = memoryview(np.ascontiguousarray(array)).cast("B")
+        while len(view):
+            if self._file is None:
+                self._open_shard()
+            room = self.shard_bytes - self._shard_size if self.shard_bytes else len(view)
+            chunk = view[:room]
+            self._file.write(chunk)
+            self._hash.update(chunk)
+            self._shard_size += len(chunk)
+            self._offset += len(chunk)
+            view = view[len(chunk):]
+            if self.shard_bytes and self._shard_size == self.shard_bytes:
+                self._close_shard()
+    
+    def close(self):
+        """Finish the last shard and give every shard its final content-addressed name"""
+        if self._file is not None:
+            self._close_shard()
+        count = len(self.shards)
+        for index, shard in enumerate(self.shards, 1):
+            path = f"{self.group_name}-shard{index}of{count}.{shard['sha256'][:12]}.bin"
+            os.replace(os.path.join(self.output_dir, shard.pop("temp_path")), os.path.join(self.output_dir, path))
+            shard["path"] = path
+        return self.shards
+    
+    def abort(self):
+        """Delete the partial shards of a failed export, leaving the previous model's files alone"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for shard in self.shards:
+            if "temp_path" in shard:
+                try:
+                    os.remove(os.path.join(self.output_dir, shard["temp_path"]))
+                except FileNotFoundError:
+                    pass
+
+def iter_model_weights(model):
+    """Yield weight tensors layer by layer so only one layer's weights are in memory at a time"""
+    for layer in model.layers:
+        if hasattr(layer, 'get_weights'):
+            for weight in layer.get_weights():
+                yield weight
+
+def remove_stale_weight_files(output_dir, keep):
+    """Delete weight files of earlier exports that are not listed in ``keep`` (the new manifest's paths)"""
+    for name in os.listdir(output_dir):
+        if name in keep:
+            continue
+        if name == "weights.bin" or (name.startswith("group") and "-shard" in name and name.endswith(".bin")):
+            os.remove(os.path.join(output_dir, name))
+
+def write_model_json(model_json, output_dir):
+    """Write model.json under a temporary name and swap it in, so readers never see a half-written file"""
+    model_json_path = os.path.join(output_dir, "model.json")
+    temp_path = os.path.join(output_dir, ".model.json.partial")
+    with open(temp_path, 'w') as f:
+        json.dump(model_json, f, indent=2)
+    os.replace(temp_path, model_json_path)
+    return model_json_path
+
+def write_sharded_weights(model, output_dir, manifest_group, quantization="float32", shard_bytes=DEFAULT_SHARD_SIZE_MB * 1024 * 1024):
+    """Stream every weight tensor straight to disk, filling in the manifest group; returns the parameter count
+
+    Shards have content-addressed names, so the previous export's files stay
+    in place (and loadable through its model.json) until the caller removes them.
+    """
+    writer = ShardedWeightWriter(output_dir, shard_bytes)
+    parameter_count = 0
+    try:
+        for spec, weight in zip(manifest_group["weights"], iter_model_weights(model)):
+            encoded, quantization_info = quantize_weight(weight, quantization)
+            spec.pop("quantization", None)
+            if quantization_info:
+                spec["quantization"] = quantization_info
+            writer.write(encoded)
+            parameter_count += weight.size
+        shards = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    manifest_group["paths"] = [shard["path"] for shard in shards]
+    manifest_group["shards"] = shards
+    return parameter_count
+
+def print_quantization_report(model, output_dir, quantization, float32_bytes, samples_dir=None):
+    """Compare the exported weights against the float32 Keras model: drift, size and load time"""
+    # The backend's NumPy engine dequantizes exactly as the server will at load time
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    from numpy_model import NumpyPlantHealthModel, load_tfjs_weights
+
+    model_json_path = os.path.join(output_dir, "model.json")
+    exported = NumpyPlantHealthModel.from_tfjs(model_json_path, mmap=False)
+
+    samples = load_sample_images(samples_dir) if samples_dir else None
+    if samples is None or len(samples) == 0:
+        rng = np.random.default_rng(0)
+        samples = rng.random((32, 224, 224, 3), dtype=np.float32) * 0.3 + 0.2
+        samples[..., 1] += 0.3
+    reference = model.predict(samples, verbose=0).reshape(-1)
+    predicted = exported.predict(samples).reshape(-1)
+    drift = np.abs(reference - predicted)
+    flips = int(np.sum((reference > 0.5) != (predicted > 0.5)))
+
+    exported_bytes = sum(
+        os.path.getsize(os.path.join(output_dir, name))
+        for name in os.listdir(output_dir) if name.endswith(".bin")
+    )
+
+    # Load time of the float32 export versus this one, both read fully into memory
+    with tempfile.TemporaryDirectory() as baseline_dir:
+        write_float32_baseline(model, model_json_path, baseline_dir)
+        baseline_seconds = time_weight_load(load_tfjs_weights, os.path.join(baseline_dir, "model.json"))
+    exported_seconds = time_weight_load(load_tfjs_weights, model_json_path)
+
+    print(f"\n📋 Quantization report ({quantization}, {len(samples)} samples)")
+    print(f"  Output drift: max {drift.max():.6f}, mean {drift.mean():.6f}")
+    print(f"  Healthy/Affected decisions changed: {flips}/{len(samples)}")
+    print(f"  Weights size: {exported_bytes / 1e6:.1f} MB (float32: {float32_bytes / 1e6:.1f} MB, {100 * (1 - exported_bytes / float32_bytes):.0f}% smaller)")
+    print(f"  Backend load time: {exported_seconds * 1000:.1f} ms (float32: {baseline_seconds * 1000:.1f} ms)")
+
+def load_sample_images(samples_dir):
+    """Load leaf photos from a directory as a (N, 224, 224, 3) batch scaled to 0-1"""
+    from PIL import Image
+    images = []
+    for name in sorted(os.listdir(samples_dir)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            img = Image.open(os.path.join(samples_dir, name)).convert("RGB").resize((224, 224))
+            images.append(np.asarray(img, dtype=np.float32) / 255.0)
+    return np.stack(images) if images else None
+
+def write_float32_baseline(model, model_json_path, baseline_dir):
+    with open(model_json_path, "r") as f:
+        model_json = json.load(f)
+    write_sharded_weights(model, baseline_dir, model_json["weightsManifest"][0], "float32", shard_bytes=0)
+    with open(os.path.join(baseline_dir, "model.json"), "w") as f:
+        json.dump(model_json, f)
+
+def time_weight_load(load_fn, model_json_path, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        load_fn(model_json_path, mmap=False)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def check_output_dir(output_dir, quantization):
+    """Refuse to overwrite the browser's model with int8 weights, which TF.js cannot read"""
+    if quantization == "int8" and os.path.realpath(output_dir) == os.path.realpath(PUBLIC_MODEL_DIR):
+        raise ValueError(f"int8 models cannot be loaded by TF.js; write them outside {PUBLIC_MODEL_DIR} with --output")
+
+def create_tfjs_model_manually(quantization="float32", samples_dir=None, shard_bytes=DEFAULT_SHARD_SIZE_MB * 1024 * 1024,
+                               output_dir=PUBLIC_MODEL_DIR):
+    """Create TensorFlow.js model files manually, optionally with float16 or per-channel int8 weights"""
     try:
+        if quantization not in QUANTIZATION_CHOICES:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_CHOICES}")
+        check_output_dir(output_dir, quantization)
+        
         print("🔄 Loading Keras model...")
         model = load_model("plant_health_classifier.h5")
         
@@ -19,7 +253,6 @@ def create_tfjs_model_manually():
         print(f"📊 Output shape: {model.output_shape}")
         
         # Create output directory
-        output_dir = "public/models/plant_health_classifier"
         os.makedirs(output_dir, exist_ok=True)
         
         # Create model.json with correct architecture
@@ -164,7 +397,7 @@ def create_tfjs_model_manually():
             },
             "weightsManifest": [
                 {
-                    "paths": ["weights.bin"],
+                    "paths": [],
                     "weights": [
                         {"name": "conv2d/kernel", "shape": [3, 3, 3, 32], "dtype": "float32"},
                         {"name": "conv2d/bias", "shape": [32], "dtype": "float32"},
@@ -181,31 +414,19 @@ def create_tfjs_model_manually():
             ]
         }
         
-        # Save model.json
-        model_json_path = os.path.join(output_dir, "model.json")
-        with open(model_json_path, 'w') as f:
-            json.dump(model_json, f, indent=2)
-        
-        print(f"✅ Created model.json")
+        # Stream weights to disk tensor by tensor, quantizing them if requested
+        weights_group = model_json["weightsManifest"][0]
+        parameter_count = write_sharded_weights(model, output_dir, weights_group, quantization, shard_bytes)
         
-        # Extract and save weights
-        weights_data = []
-        for layer in model.layers:
-            if hasattr(layer, 'get_weights') and layer.get_weights():
-                layer_weights = layer.get_weights()
-                for weight in layer_weights:
-                    weights_data.append(weight.flatten().astype(np.float32))
+        print(f"✅ Created {len(weights_group['paths'])} weight shard(s) ({parameter_count} parameters, {quantization})")
         
-        # Concatenate all weights
-        all_weights = np.concatenate(weights_data)
+        # Save model.json (after the weights, since it carries their quantization metadata)
+        model_json_path = write_model_json(model_json, output_dir)
         
-        # Save weights as binary file
-        weights_path = os.path.join(output_dir, "weights.bin")
-        all_weights.tobytes()
-        with open(weights_path, 'wb') as f:
-            f.write(all_weights.tobytes())
+        print(f"✅ Created model.json")
         
-        print(f"✅ Created weights.bin ({len(all_weights)} parameters)")
+        # Only now that model.json points at the new shards are the old ones unreferenced
+        remove_stale_weight_files(output_dir, set(weights_group["paths"]))
         
         # Test the model with a sample
         print("\n🧪 Testing model behavior...")
@@ -219,6 +440,9 @@ def create_tfjs_model_manually():
             pred = model.predict(sample, verbose=0)[0][0]
             print(f"  Sample {i+1}: {pred:.6f} ({'Healthy' if pred > 0.5 else 'Affected'})")
         
+        if quantization != "float32":
+            print_quantization_report(model, output_dir, quantization, parameter_count * 4, samples_dir)
+        
         print(f"\n✅ Manual conversion completed!")
         print(f"📁 Files created in: {output_dir}")
         
@@ -229,4 +453,19 @@ def create_tfjs_model_manually():
         return False
 
 if __name__ == "__main__":
-    create_tfjs_model_manually()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert plant_health_classifier.h5 to a TensorFlow.js layers-model")
+    parser.add_argument("--quantize", choices=QUANTIZATION_CHOICES, default="float32",
+                        help="weight storage format (int8 is per-channel and backend-only)")
+    parser.add_argument("--samples", help="directory of leaf photos used for the drift report (default: synthetic samples)")
+    parser.add_argument("--shard-size-mb", type=float, default=DEFAULT_SHARD_SIZE_MB,
+                        help="size of each weight shard in MB; 0 writes a single file (default: %(default)s)")
+    parser.add_argument("--output", default=PUBLIC_MODEL_DIR,
+                        help="directory to write model.json and the weight shards to (default: %(default)s, "
+                             "the web app's model; not allowed with --quantize int8)")
+    args = parser.parse_args()
+    try:
+        check_output_dir(args.output, args.quantize)
+    except ValueError as e:
+        parser.error(str(e))
+    ok = create_tfjs_model_manually(args.quantize, args.samples, int(args.shard_size_mb * 1024 * 1024), args.output)
+    sys.exit(0 if ok else 1)
\ No newline at end of file